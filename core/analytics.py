@@ -0,0 +1,285 @@
+import asyncio
+import json
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from astrbot.api import logger
+
+from ..utils.data_layout import locate_user_file
+from ..utils.scheduler import period_clock
+from ..utils.utils import (
+    PLUGIN_DATA_DIR,
+    iter_user_ids,
+    read_json_sync,
+    write_json_sync,
+)
+from .ledger import economy_ledger
+
+# 统计结果缓存时间（秒）
+CACHE_TTL = 600
+# 每个分片包含的用户数
+CHUNK_SIZE = 1000
+# 用户数达到该值时使用多进程统计，否则在线程中统计
+PROCESS_POOL_MIN_USERS = 5000
+# 保底计数分布的分桶宽度与桶数（未出五星计数）
+PITY_BUCKET = 10
+PITY_BUCKETS = 9
+# 保留的每日货币总量记录天数（用于计算通胀）
+HISTORY_DAYS = 30
+
+
+def _load(path: Path) -> Dict[str, Any]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _iter_records(
+    data_dir: str, user_ids: List[str], balances: Dict[str, int]
+) -> Iterator[Tuple[int, int, Dict[str, Any]]]:
+    """逐个读取用户文件，产出(金币, 好感度, 背包武器数据)，同一时刻只持有一个用户"""
+    for uid in user_ids:
+        user_data = _load(locate_user_file(Path(data_dir) / "user_data", uid))
+        home = user_data.get("home") or {}
+        money = balances.get(uid, home.get("money", 0))
+        backpack = _load(locate_user_file(Path(data_dir) / "user_backpack", uid))
+        yield int(money or 0), int(home.get("love", 0) or 0), backpack.get("weapon") or {}
+
+
+def _scan_chunk(
+    data_dir: str, user_ids: List[str], balances: Dict[str, int]
+) -> Dict[str, Any]:
+    """统计一个分片（可在子进程中执行，只读取文件，不依赖事件循环与全局状态）"""
+    result = {
+        "users": 0,
+        "money": [],
+        "love": [],
+        "draws": 0,
+        "fates": 0,
+        "five_stars": 0,
+        "pity": [0] * PITY_BUCKETS,
+    }
+    for money, love, weapon in _iter_records(data_dir, user_ids, balances):
+        result["users"] += 1
+        result["money"].append(money)
+        result["love"].append(love)
+        result["draws"] += int(weapon.get("总抽卡次数", 0) or 0)
+        result["fates"] += int(weapon.get("纠缠之缘", 0) or 0)
+        details = weapon.get("武器详细") or {}
+        result["five_stars"] += int((details.get("五星武器") or {}).get("数量", 0) or 0)
+        pity = int(weapon.get("未出五星计数", 0) or 0)
+        result["pity"][min(max(pity, 0) // PITY_BUCKET, PITY_BUCKETS - 1)] += 1
+    return result
+
+
+def _merge(parts: List[Dict[str, Any]]) -> Dict[str, Any]:
+    merged = _scan_chunk("", [], {})
+    for part in parts:
+        for key in ("users", "draws", "fates", "five_stars"):
+            merged[key] += part[key]
+        merged["money"].extend(part["money"])
+        merged["love"].extend(part["love"])
+        merged["pity"] = [a + b for a, b in zip(merged["pity"], part["pity"])]
+    return merged
+
+
+def percentile(sorted_values: List[int], q: float) -> float:
+    """已排序数据的q分位数（线性插值），空数据返回0"""
+    if not sorted_values:
+        return 0
+    pos = (len(sorted_values) - 1) * q
+    low = int(pos)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (pos - low)
+
+
+def gini(sorted_values: List[int]) -> float:
+    """已排序的非负数据的基尼系数，0表示完全平均，趋近1表示高度集中"""
+    n = len(sorted_values)
+    total = sum(sorted_values)
+    if n == 0 or total <= 0:
+        return 0.0
+    weighted = sum(i * v for i, v in enumerate(sorted_values, start=1))
+    return 2 * weighted / (n * total) - (n + 1) / n
+
+
+def _distribution(values: List[int]) -> Dict[str, float]:
+    values.sort()
+    return {
+        "total": sum(values),
+        "p50": percentile(values, 0.5),
+        "p90": percentile(values, 0.9),
+        "p99": percentile(values, 0.99),
+        "max": values[-1] if values else 0,
+        "gini": gini([max(v, 0) for v in values]),
+    }
+
+
+class EconomyAnalytics:
+    """
+    经济统计\n
+    - 逐个流式读取用户文件，按分片统计后合并，不在内存中保存完整的用户数据\n
+    - 用户较多时分片在多进程中并行统计\n
+    - 结果缓存CACHE_TTL秒，并按天记录货币总量以计算通胀
+    """
+
+    def __init__(self, data_dir: Optional[Path] = None):
+        self.data_dir = data_dir or PLUGIN_DATA_DIR
+        self.history_file = self.data_dir / "economy_history.json"
+        # (生成时间, 统计结果)
+        self._cache: Optional[Tuple[float, Dict[str, Any]]] = None
+        # 进行中的统计任务，并发请求共享同一次统计
+        self._running: Optional[asyncio.Task] = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _chunks(self) -> List[List[str]]:
+        """按CHUNK_SIZE切分用户id（遍历整个用户目录，在线程中执行）"""
+        ids = iter_user_ids(self.data_dir / "user_data")
+        chunks = []
+        while True:
+            chunk = list(islice(ids, CHUNK_SIZE))
+            if not chunk:
+                return chunks
+            chunks.append(chunk)
+
+    @staticmethod
+    def _balances(chunk: List[str]) -> Dict[str, int]:
+        """分片中的用户在经济账本中的余额（在事件循环中读取账本）"""
+        balances = {}
+        for uid in chunk:
+            balance = economy_ledger.balance(uid)
+            if balance is not None:
+                balances[uid] = balance
+        return balances
+
+    def _process_pool(self) -> ProcessPoolExecutor:
+        """
+        统计用的进程池，首次使用时创建并复用，在插件terminate中关闭\n
+        使用spawn启动子进程：不复制插件进程中的事件循环、线程与打开的文件
+        """
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._pool
+
+    async def close(self) -> None:
+        """关闭进程池（在插件terminate中调用，在线程中等待子进程退出）"""
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            await asyncio.get_running_loop().run_in_executor(None, pool.shutdown)
+
+    async def _collect(self) -> Dict[str, Any]:
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        chunks = [
+            (chunk, self._balances(chunk))
+            for chunk in await loop.run_in_executor(None, self._chunks)
+        ]
+        users = sum(len(chunk) for chunk, _ in chunks)
+        data_dir = str(self.data_dir)
+        if users >= PROCESS_POOL_MIN_USERS:
+            pool = self._process_pool()
+            parts = await asyncio.gather(
+                *(
+                    loop.run_in_executor(pool, _scan_chunk, data_dir, chunk, bal)
+                    for chunk, bal in chunks
+                )
+            )
+        else:
+            parts = [
+                await loop.run_in_executor(None, _scan_chunk, data_dir, chunk, bal)
+                for chunk, bal in chunks
+            ]
+        merged = _merge(parts)
+        report = {
+            "users": merged["users"],
+            "money": _distribution(merged["money"]),
+            "love": _distribution(merged["love"]),
+            "draws": merged["draws"],
+            "fates": merged["fates"],
+            "five_stars": merged["five_stars"],
+            "pity": merged["pity"],
+            "generated_at": time.time(),
+            "elapsed": time.perf_counter() - started,
+        }
+        report["inflation"] = await loop.run_in_executor(
+            None, self._record_supply, report["money"]["total"]
+        )
+        return report
+
+    def _record_supply(self, supply: int) -> Optional[float]:
+        """记录今天的货币总量，返回相对上一个记录日的变化率"""
+        history = read_json_sync(self.history_file)
+        today = period_clock.today_str
+        previous = [day for day in sorted(history) if day < today]
+        history[today] = supply
+        for day in sorted(history)[:-HISTORY_DAYS]:
+            history.pop(day)
+        write_json_sync(self.history_file, history)
+        if not previous or not history[previous[-1]]:
+            return None
+        return supply / history[previous[-1]] - 1
+
+    async def report(self, force: bool = False) -> Dict[str, Any]:
+        """获取统计结果，缓存未过期且force为False时直接返回缓存"""
+        if (
+            not force
+            and self._cache is not None
+            and time.time() - self._cache[0] < CACHE_TTL
+        ):
+            return self._cache[1]
+        if self._running is None or self._running.done():
+            self._running = asyncio.get_running_loop().create_task(self._collect())
+        report = await self._running
+        self._cache = (time.time(), report)
+        return report
+
+    async def format_report(self, force: bool = False) -> str:
+        """生成统计报告文本"""
+        try:
+            report = await self.report(force)
+        except Exception as e:
+            logger.error(f"经济统计失败: {str(e)}")
+            return "经济统计失败，请稍后再试~"
+
+        def dist(name: str, d: Dict[str, float]) -> str:
+            return (
+                f"{name}总量: {d['total']}\n"
+                f"  中位数 {d['p50']:.0f} | P90 {d['p90']:.0f} | "
+                f"P99 {d['p99']:.0f} | 最高 {d['max']}\n"
+                f"  基尼系数: {d['gini']:.3f}\n"
+            )
+
+        inflation = report["inflation"]
+        pity_lines = "\n".join(
+            f"  {i * PITY_BUCKET}"
+            f"{'+' if i == PITY_BUCKETS - 1 else f'-{i * PITY_BUCKET + PITY_BUCKET - 1}'}"
+            f": {count}人"
+            for i, count in enumerate(report["pity"])
+            if count
+        )
+        generated = time.strftime(
+            "%H:%M:%S", time.localtime(report["generated_at"])
+        )
+        return (
+            f"📊 经济统计（{report['users']}位用户）\n"
+            f"{dist('💰 金币', report['money'])}"
+            f"  较上次记录: "
+            f"{'暂无' if inflation is None else f'{inflation:+.2%}'}\n"
+            f"{dist('💕 好感度', report['love'])}"
+            f"🎰 总抽卡次数: {report['draws']} | 五星武器: {report['five_stars']}\n"
+            f"💎 纠缠之缘存量: {report['fates']}\n"
+            f"🎯 五星保底计数分布:\n{pity_lines or '  暂无数据'}\n"
+            f"⏱️ 统计于 {generated}，耗时 {report['elapsed']:.2f}秒"
+        )
+
+
+# 全局经济统计
+economy_analytics = EconomyAnalytics()
@@ -2,7 +2,7 @@ import asyncio
 import random
 import time
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 import astrbot.api.message_components as Comp
 from astrbot.api import logger
@@ -13,13 +13,17 @@ from astrbot.core.platform.sources.aiocqhttp.aiocqhttp_message_event import (
 )
 
 # 导入工具函数
+from ..utils.api_queue import api_queue
+from ..utils.config import config_service
+from ..utils.data_layout import user_path
+from ..utils.leases import lease_manager
+from ..utils.tracing import traced
 from ..utils.utils import (
     get_at_ids,
     get_nickname,
     get_user_data_and_backpack,
     read_json,
-    read_json_sync,
-    write_json,
+    save_user_data,
 )
 from .task import Task
 
@@ -71,6 +75,10 @@ challenge_self_text_list = [
     "行，成全你这场独角戏。只是别指望有人为你鼓掌，毕竟和自己打架，实在太难看了",
 ]
 
+# 锦标赛人数限制
+TOURNAMENT_MIN_PLAYERS = 3
+TOURNAMENT_MAX_PLAYERS = 64
+
 
 class Battle:
     def __init__(self):
@@ -81,25 +89,28 @@ class Battle:
         PLUGIN_DATA_DIR = Path(StarTools.get_data_dir("astrbot_plugin_akasha_terminal"))
         self.user_data_path = PLUGIN_DATA_DIR / "user_data"
         self.backpack_path = PLUGIN_DATA_DIR / "user_backpack"
-        self.config_file = (
-            PLUGIN_DATA_DIR.parent.parent
-            / "config"
-            / "astrbot_plugin_akasha_terminal_config.json"
-        )
 
         # 任务系统导入
         self.task = Task()
 
-        # 配置
-        config_data = read_json_sync(self.config_file, "utf-8-sig")
-        self.duel_cooldown: int = config_data["battle_system"].get("duel_cooldown", 10)
-        self.magnification: float = config_data["battle_system"].get(
-            "combat_effectiveness_coefficient", 2
-        )
+        # 锦标赛报名表 {group_id: {"organizer": 发起者id, "participants": [用户id, ...]}}
+        self.tournaments: Dict[str, Dict[str, Any]] = {}
+        # 锦标赛群冷却 {group_id: 下次可开赛时间}
+        self.tournament_cd: Dict[str, float] = {}
         # 确保数据目录存在
         self.user_data_path.mkdir(parents=True, exist_ok=True)
         self.backpack_path.mkdir(parents=True, exist_ok=True)
 
+    @property
+    def duel_cooldown(self) -> int:
+        """决斗冷却时间（秒），取自配置快照"""
+        return config_service.snapshot.battle.duel_cooldown
+
+    @property
+    def magnification(self) -> float:
+        """战斗力意义系数，取自配置快照"""
+        return config_service.snapshot.battle.combat_effectiveness_coefficient
+
     async def is_cooling(self, user_id: str) -> tuple[bool, float]:
         """检查用户是否在冷却中"""
         if user_id in self.duel_cd:
@@ -126,6 +137,29 @@ class Battle:
             logger.error(f"解析用户武器数据失败 {user_id}: {e}")
             return 0, 0, 0
 
+    def calc_win_prob(
+        self,
+        cha_level: int,
+        opp_level: int,
+        cha_weapons: Tuple[int, int, int],
+        opp_weapons: Tuple[int, int, int],
+    ) -> float:
+        """
+        计算挑战者的获胜概率（0~100）\n
+        cha_weapons/opp_weapons: (三星数量, 四星数量, 五星数量)
+        """
+        win_prob = (
+            50
+            + self.magnification * (cha_level - opp_level)
+            + cha_weapons[0]
+            + cha_weapons[1] * 2
+            + cha_weapons[2] * 3
+            - (opp_weapons[0] + opp_weapons[1] * 2 + opp_weapons[2] * 3)
+        )
+        # 确保概率在合理范围
+        return max(0, min(100, win_prob))
+
+    @traced()
     async def handle_duel_command(
         self, event: AiocqhttpMessageEvent, parts: list[str], admins_id: list[str]
     ) -> Optional[str]:
@@ -136,10 +170,11 @@ class Battle:
             # 决斗冷却检查
             is_cooling, remaining = await self.is_cooling(challenger_id)
             if is_cooling:
-                await event.send(
+                await api_queue.send(
+                    event,
                     event.plain_result(
                         f"你刚刚发起了一场决斗，请耐心一点，等待{remaining:.1f}秒后再发起决斗吧！"
-                    )
+                    ),
                 )
                 return
 
@@ -152,39 +187,36 @@ class Battle:
 
             if not opponent_id:
                 if not parts:
-                    await event.send(
+                    await api_queue.send(
+                        event,
                         event.plain_result(
                             "不知道你要与谁决斗哦，请@你想决斗的人~\n示例: /决斗 @用户/qq号"
-                        )
+                        ),
                     )
                     return
                 elif parts[0].isdigit():
                     opponent_id = parts[0]
                 else:
-                    await event.send(
+                    await api_queue.send(
+                        event,
                         event.plain_result(
                             "无效的用户ID，请@你想决斗的人~\n示例: /决斗 @用户/qq号"
-                        )
+                        ),
                     )
                     return
-            group_id = event.get_group_id()
             message = []
             await self.set_cooling(challenger_id)
             # 检查是否@自己
             if challenger_id == opponent_id:
                 message.append(Comp.At(qq=challenger_id))
                 try:
-                    await event.bot.set_group_ban(
-                        group_id=group_id,
-                        user_id=challenger_id,
-                        duration=60,
-                    )
+                    await api_queue.set_group_ban(event, challenger_id, 60)
                     message.append(
                         Comp.Plain(f"：\n{random.choice(challenge_self_text_list)}")
                     )
                 except Exception:
                     message.append(Comp.Plain("：\n我想禁言你一分钟，但权限不足QAQ"))
-                await event.send(event.chain_result(message))
+                await api_queue.send(event, event.chain_result(message))
                 event.stop_event()
                 return
 
@@ -193,11 +225,7 @@ class Battle:
                 message.append(Comp.At(qq=challenger_id))
                 if challenger_id not in admins_id:
                     try:
-                        await event.bot.set_group_ban(
-                            group_id=group_id,
-                            user_id=challenger_id,
-                            duration=60,
-                        )
+                        await api_queue.set_group_ban(event, challenger_id, 60)
                         message.append(
                             Comp.Plain(f"：\n{random.choice(challenge_bot_text_list)}")
                         )
@@ -205,30 +233,32 @@ class Battle:
                         message.append(
                             Comp.Plain("：\n我想禁言你一分钟，但权限不足QAQ")
                         )
-                    await event.send(event.chain_result(message))
+                    await api_queue.send(event, event.chain_result(message))
                     event.stop_event()
                     return
             # 判断双方数据文件是否存在
-            cha_file = self.user_data_path / f"{challenger_id}.json"
+            cha_file = await user_path(self.user_data_path, challenger_id)
             if not cha_file.exists():
-                await event.send(
-                    event.plain_result("你的信息不存在哦，请先进行一次签到来注册信息~")
+                await api_queue.send(
+                    event,
+                    event.plain_result("你的信息不存在哦，请先进行一次签到来注册信息~"),
                 )
                 return
-            opp_file = self.user_data_path / f"{opponent_id}.json"
+            opp_file = await user_path(self.user_data_path, opponent_id)
             if not opp_file.exists():
-                await event.send(
+                await api_queue.send(
+                    event,
                     event.plain_result(
                         "对方的信息不存在，请让他先进行一次签到来注册信息~"
-                    )
+                    ),
                 )
                 return
             # 读取用户昵称
             cha_name = await get_nickname(event, challenger_id)
             opp_name = await get_nickname(event, opponent_id)
             # 读取用户数据
-            cha_data = await read_json(self.user_data_path / f"{challenger_id}.json")
-            opp_data = await read_json(self.user_data_path / f"{opponent_id}.json")
+            cha_data = await read_json(cha_file)
+            opp_data = await read_json(opp_file)
 
             # 判定双方权限
             is_admin1 = challenger_id in admins_id or (
@@ -238,10 +268,11 @@ class Battle:
                 opp_data["battle"].get("privilege") == 1
             )
             if is_admin1 and is_admin2:
-                await event.send(
+                await api_queue.send(
+                    event,
                     event.plain_result(
                         "你们两人都是管理员或拥有特权，神仙打架，凡人遭殃，御前决斗无法进行哦！"
-                    )
+                    ),
                 )
                 return
             # 读取用户武器数量
@@ -251,16 +282,12 @@ class Battle:
             cha_level = cha_data["battle"].get("level", 0)
             opp_level = opp_data["battle"].get("level", 0)
             win_level = cha_level - opp_level
-            win_prob = (
-                50
-                + self.magnification * win_level
-                + numcha_3
-                + numcha_4 * 2
-                + numcha_5 * 3
-                - (numopp_3 + numopp_4 * 2 + numopp_5 * 3)
+            win_prob = self.calc_win_prob(
+                cha_level,
+                opp_level,
+                (numcha_3, numcha_4, numcha_5),
+                (numopp_3, numopp_4, numopp_5),
             )
-            # 确保概率在合理范围
-            win_prob = max(0, min(100, win_prob))
 
             message.append(Comp.At(qq=challenger_id))
             message_part = (
@@ -272,7 +299,7 @@ class Battle:
                 f"提示：挑战失败者将被禁言1~5分钟, 被挑战者失败将被禁言1~3分钟"
             )
             message.append(Comp.Plain(message_part))
-            await event.send(event.chain_result(message))
+            await api_queue.send(event, event.chain_result(message))
             # 模拟战斗过程，暂停3秒
             await asyncio.sleep(3)
             # 判断结果
@@ -287,11 +314,7 @@ class Battle:
                 # 自己是管理员直接胜利
                 if is_admin1:
                     message2.append(Comp.At(qq=challenger_id))
-                    await event.bot.set_group_ban(
-                        group_id=group_id,
-                        user_id=opponent_id,
-                        duration=random_time_opp,
-                    )
+                    await api_queue.set_group_ban(event, opponent_id, random_time_opp)
                     message2_part = (
                         f"：\n你使用了管理员之力获得了胜利\n"
                         f"恭喜你与 {opp_name} 决斗成功\n"
@@ -304,17 +327,13 @@ class Battle:
                         track_key="duel_wins",
                         value=1,
                     )
-                    await event.send(event.chain_result(message2))
+                    await api_queue.send(event, event.chain_result(message2))
                     event.stop_event()
 
                 # 对方是管理员直接胜利
                 elif is_admin2:
                     message2.append(Comp.At(qq=challenger_id))
-                    await event.bot.set_group_ban(
-                        group_id=group_id,
-                        user_id=challenger_id,
-                        duration=random_time_cha,
-                    )
+                    await api_queue.set_group_ban(event, challenger_id, random_time_cha)
                     message2_part = (
                         f"：\n对方不讲武德，使用了管理员之力获得了胜利\n"
                         f"你接受惩罚，已被禁言{random_time_cha / 60}分钟!"
@@ -323,16 +342,12 @@ class Battle:
                     await self.task.update_task_progress(
                         event=event, user_id=opponent_id, track_key="duel_wins", value=1
                     )
-                    await event.send(event.chain_result(message2))
+                    await api_queue.send(event, event.chain_result(message2))
                     event.stop_event()
                 # 挑战者胜利
                 elif win_prob > random_value:
                     message2.append(Comp.At(qq=challenger_id))
-                    await event.bot.set_group_ban(
-                        group_id=group_id,
-                        user_id=opponent_id,
-                        duration=random_time_opp,
-                    )
+                    await api_queue.set_group_ban(event, opponent_id, random_time_opp)
                     message2_part = (
                         f"：\n恭喜你与 {opp_name} 决斗成功\n"
                         f"{opp_name}接受惩罚，已被禁言{random_time_opp / 60}分钟！"
@@ -344,16 +359,12 @@ class Battle:
                         track_key="duel_wins",
                         value=1,
                     )
-                    await event.send(event.chain_result(message2))
+                    await api_queue.send(event, event.chain_result(message2))
                     event.stop_event()
                 # 挑战者失败
                 else:
                     message2.append(Comp.At(qq=challenger_id))
-                    await event.bot.set_group_ban(
-                        group_id=group_id,
-                        user_id=challenger_id,
-                        duration=random_time_cha,
-                    )
+                    await api_queue.set_group_ban(event, challenger_id, random_time_cha)
                     message2_part = (
                         f"：\n你与 {opp_name} 决斗失败\n"
                         f"你接受惩罚，已被禁言{random_time_cha / 60}分钟！"
@@ -362,7 +373,7 @@ class Battle:
                     await self.task.update_task_progress(
                         event=event, user_id=opponent_id, track_key="duel_wins", value=1
                     )
-                    await event.send(event.chain_result(message2))
+                    await api_queue.send(event, event.chain_result(message2))
                     event.stop_event()
 
                 # 更新任务进度（参与决斗次数+1）
@@ -374,10 +385,11 @@ class Battle:
                 )
 
             except Exception:
-                await event.send(
+                await api_queue.send(
+                    event,
                     event.chain_result(
                         "哎呀，禁言失败了，可能是权限不够或者出了点小问题"
-                    )
+                    ),
                 )
                 return
             # # 保存数据
@@ -395,31 +407,322 @@ class Battle:
         user_id = event.get_sender_id()
         try:
             if user_id not in admins_id:
-                await event.send(event.plain_result("凡人，休得僭越!"))
+                await api_queue.send(event, event.plain_result("凡人，休得僭越!"))
                 return
             if not parts:
-                await event.send(
+                await api_queue.send(
+                    event,
                     event.plain_result(
                         "请输入要设置的战斗力意义系数值\n示例: /设置战斗力意义系数 2.5"
-                    )
+                    ),
                 )
                 return
             try:
                 new_value = float(parts[0])
                 if not (1 <= new_value <= 3):
-                    await event.send(event.plain_result("战斗力意义系数必须在1到3之间"))
+                    await api_queue.send(
+                        event, event.plain_result("战斗力意义系数必须在1到3之间")
+                    )
                     return
-                await event.send(
-                    event.plain_result(f"战斗力意义系数设置成功为：{new_value}")
-                )
             except ValueError:
-                await event.send(event.plain_result("请输入有效的数字系数"))
+                await api_queue.send(event, event.plain_result("请输入有效的数字系数"))
                 return
-            # 更新配置文件
-            config_data = await read_json(self.config_file, "utf-8-sig")
-            config_data["battle_system"]["combat_effectiveness_coefficient"] = new_value
-            await write_json(self.config_file, config_data, "utf-8-sig")
+            # 更新配置快照（配置文件在后台写入）
+            config_service.update(
+                "battle_system", combat_effectiveness_coefficient=new_value
+            )
+            await api_queue.send(
+                event, event.plain_result(f"战斗力意义系数设置成功为：{new_value}")
+            )
         except Exception as e:
             logger.error(f"处理设置战斗力意义系数命令失败: {e}")
-            await event.send(event.plain_result("设置失败，请稍后再试~"))
+            await api_queue.send(event, event.plain_result("设置失败，请稍后再试~"))
+            return
+
+    async def handle_tournament_command(
+        self, event: AiocqhttpMessageEvent, parts: list[str], admins_id: list[str]
+    ):
+        """处理锦标赛命令：报名/退出/名单/开始/取消"""
+        try:
+            group_id = str(event.get_group_id() or "")
+            if not group_id:
+                await api_queue.send(
+                    event, event.plain_result("请在群聊中举办锦标赛哦~")
+                )
+                return
+            user_id = str(event.get_sender_id())
+            action = parts[0] if parts else "名单"
+            tournament = self.tournaments.get(group_id)
+
+            if action in ("报名", "加入", "参加"):
+                # 可@多人代为报名，未@则为自己报名
+                at_ids = [
+                    str(seg.qq) for seg in event.get_messages() if isinstance(seg, At)
+                ]
+                at_ids += [p for p in parts[1:] if p.isdigit()]
+                candidates = at_ids or [user_id]
+                if tournament is None:
+                    tournament = {"organizer": user_id, "participants": []}
+                    self.tournaments[group_id] = tournament
+                joined, skipped = [], []
+                for uid in dict.fromkeys(candidates):
+                    if uid == str(event.get_self_id()):
+                        skipped.append(f"{uid}(神明不参赛)")
+                    elif uid in tournament["participants"]:
+                        skipped.append(f"{uid}(已报名)")
+                    elif len(tournament["participants"]) >= TOURNAMENT_MAX_PLAYERS:
+                        skipped.append(f"{uid}(人数已满)")
+                    elif not (await user_path(self.user_data_path, uid)).exists():
+                        skipped.append(f"{uid}(未注册)")
+                    else:
+                        tournament["participants"].append(uid)
+                        joined.append(uid)
+                message = f"🏟️ 锦标赛报名：当前共{len(tournament['participants'])}人\n"
+                if joined:
+                    message += f"✅ 报名成功：{', '.join(joined)}\n"
+                if skipped:
+                    message += f"⚠️ 未报名：{', '.join(skipped)}\n"
+                message += "💡 发起者或管理员使用 /锦标赛 开始 即可开赛"
+                await api_queue.send(event, event.plain_result(message))
+                return
+
+            if action in ("退出", "退赛"):
+                if tournament and user_id in tournament["participants"]:
+                    tournament["participants"].remove(user_id)
+                    await api_queue.send(
+                        event, event.plain_result("你已退出本次锦标赛")
+                    )
+                else:
+                    await api_queue.send(
+                        event, event.plain_result("你还没有报名本次锦标赛哦~")
+                    )
+                return
+
+            if action in ("取消", "解散"):
+                if not tournament:
+                    await api_queue.send(
+                        event, event.plain_result("当前没有正在报名的锦标赛")
+                    )
+                    return
+                if user_id != tournament["organizer"] and user_id not in admins_id:
+                    await api_queue.send(
+                        event, event.plain_result("只有发起者或管理员可以取消锦标赛")
+                    )
+                    return
+                self.tournaments.pop(group_id, None)
+                await api_queue.send(event, event.plain_result("本次锦标赛已取消"))
+                return
+
+            if action in ("开始", "开赛"):
+                if not tournament:
+                    await api_queue.send(
+                        event,
+                        event.plain_result(
+                            "当前没有正在报名的锦标赛，使用 /锦标赛 报名 发起报名"
+                        ),
+                    )
+                    return
+                if user_id != tournament["organizer"] and user_id not in admins_id:
+                    await api_queue.send(
+                        event, event.plain_result("只有发起者或管理员可以宣布开赛")
+                    )
+                    return
+                if len(tournament["participants"]) < TOURNAMENT_MIN_PLAYERS:
+                    await api_queue.send(
+                        event,
+                        event.plain_result(
+                            f"参赛人数不足，至少需要{TOURNAMENT_MIN_PLAYERS}人"
+                            f"（当前{len(tournament['participants'])}人）"
+                        ),
+                    )
+                    return
+                remaining = self.tournament_cd.get(group_id, 0) - time.time()
+                if remaining > 0:
+                    await api_queue.send(
+                        event,
+                        event.plain_result(
+                            f"上一届锦标赛刚刚结束，请等待{remaining:.1f}秒后再开赛"
+                        ),
+                    )
+                    return
+                if not lease_manager.covers(tournament["participants"]):
+                    # 等待租约期间又有人报名，命令入口没有获取其租约
+                    await api_queue.send(
+                        event,
+                        event.plain_result(
+                            "报名名单刚刚有变化，请重新发送 /锦标赛 开始"
+                        ),
+                    )
+                    return
+                self.tournament_cd[group_id] = time.time() + self.duel_cooldown
+                participants = self.tournaments.pop(group_id)["participants"]
+                message = await self.run_tournament(event, participants, admins_id)
+                await api_queue.send(event, event.plain_result(message))
+                return
+
+            # 默认展示名单与帮助
+            if tournament and tournament["participants"]:
+                roster = "\n".join(
+                    f"{i}. {uid}" for i, uid in enumerate(tournament["participants"], 1)
+                )
+                message = (
+                    f"🏟️ 本群锦标赛名单（{len(tournament['participants'])}人）：\n"
+                    f"{roster}\n"
+                )
+            else:
+                message = "🏟️ 本群暂无正在报名的锦标赛\n"
+            message += (
+                "使用方法:\n"
+                "/锦标赛 报名 [@用户/qq号] —— 报名参赛\n"
+                "/锦标赛 退出 —— 退出报名\n"
+                "/锦标赛 开始 —— 一次性赛完整个淘汰赛\n"
+                "/锦标赛 取消 —— 取消本次锦标赛"
+            )
+            await api_queue.send(event, event.plain_result(message))
+        except Exception as e:
+            logger.error(f"处理锦标赛命令失败: {e}")
+            await api_queue.send(
+                event, event.plain_result("锦标赛出了点小问题，请稍后再试~")
+            )
+
+    def tournament_lease_users(self, event: AiocqhttpMessageEvent) -> List[str]:
+        """/锦标赛 开始 会写入本群全部报名者的数据，命令入口与发送者一起获取其租约"""
+        parts = event.message_str.split()
+        if len(parts) < 2 or parts[1] not in ("开始", "开赛"):
+            return []
+        tournament = self.tournaments.get(str(event.get_group_id() or ""))
+        return list(tournament["participants"]) if tournament else []
+
+    async def run_tournament(
+        self,
+        event: AiocqhttpMessageEvent,
+        participants: List[str],
+        admins_id: list[str],
+    ) -> str:
+        """
+        在内存中赛完整个单败淘汰赛，胜率沿用决斗模型\n
+        全部参赛者的租约已在命令入口获取（见tournament_lease_users），
+        赛后重新读取每人的最新数据并只合并战绩与任务进度，禁言经限速队列执行
+        """
+        # 并发读取全部参赛者的数据（用于计算胜率）与武器数量
+        files = await asyncio.gather(
+            *(user_path(self.user_data_path, uid) for uid in participants)
+        )
+        datas = await asyncio.gather(*(read_json(f) for f in files))
+        weapons = await asyncio.gather(
+            *(self.load_weapon_count(uid) for uid in participants)
+        )
+        players: Dict[str, Dict[str, Any]] = {}
+        for uid, data, weapon in zip(participants, datas, weapons):
+            if not data or "battle" not in data:
+                continue
+            players[uid] = {
+                "data": data,
+                "weapons": weapon,
+                "name": data.get("user", {}).get("nickname") or uid,
+                "privileged": uid in admins_id or data["battle"].get("privilege") == 1,
+                "played": 0,
+                "wins": 0,
+            }
+        if len(players) < TOURNAMENT_MIN_PLAYERS:
+            return f"有效参赛者不足{TOURNAMENT_MIN_PLAYERS}人，锦标赛无法进行"
+
+        alive = list(players)
+        random.shuffle(alive)
+        eliminated: List[str] = []
+        lines = [f"🏟️ 锦标赛开赛！共{len(alive)}名选手参加单败淘汰赛\n"]
+        round_no = 0
+        while len(alive) > 1:
+            round_no += 1
+            lines.append(f"【第{round_no}轮】")
+            next_alive = []
+            # 人数为奇数时最后一名选手轮空晋级
+            if len(alive) % 2 == 1:
+                bye = alive.pop()
+                next_alive.append(bye)
+                lines.append(f"🎫 {players[bye]['name']} 轮空晋级")
+            for a, b in zip(alive[::2], alive[1::2]):
+                winner, loser, prob = self._resolve_match(players[a], players[b])
+                winner_id, loser_id = (a, b) if winner is players[a] else (b, a)
+                for uid in (a, b):
+                    players[uid]["played"] += 1
+                players[winner_id]["wins"] += 1
+                next_alive.append(winner_id)
+                eliminated.append(loser_id)
+                lines.append(
+                    f"⚔️ {players[a]['name']} vs {players[b]['name']} "
+                    f"（前者胜率{prob:.0f}%）→ {winner['name']} 胜"
+                )
+            alive = next_alive
+        champion = alive[0]
+        lines.append(f"\n🏆 冠军：{players[champion]['name']}！")
+
+        # 批量持久化：写入前重新读取最新数据，只合并战绩与任务进度，不覆盖比赛期间参赛者的其他变动
+        task_data = await self.task.get_task_data()
+        await asyncio.gather(
+            *(
+                self._save_tournament_result(uid, player, task_data, uid == champion)
+                for uid, player in players.items()
+            )
+        )
+
+        # 淘汰者经限速队列禁言1~3分钟，不阻塞赛果播报
+        banned = []
+        for uid in eliminated:
+            if players[uid]["privileged"]:
+                continue
+            duration = random.randint(1, 3) * 60
+            api_queue.submit_group_ban(event, uid, duration)
+            banned.append(f"{players[uid]['name']}({duration // 60}分钟)")
+        if banned:
+            lines.append(f"🔇 淘汰者接受惩罚：{', '.join(banned)}")
+        return "\n".join(lines)
+
+    async def _save_tournament_result(
+        self,
+        uid: str,
+        player: Dict[str, Any],
+        task_data: Dict[str, Any],
+        is_champion: bool,
+    ) -> None:
+        """重新读取参赛者的最新数据，合并锦标赛战绩与任务进度后立即写回"""
+        data = await get_user_data_and_backpack(uid, "user_data")
+        if "battle" not in data:
             return
+        if "task" in data:
+            self.task.reset_expired_tasks(data)
+            self.task.apply_task_progress(
+                data, task_data, "duel_count", player["played"]
+            )
+            if player["wins"]:
+                self.task.apply_task_progress(
+                    data, task_data, "duel_wins", player["wins"]
+                )
+        battle = data["battle"]
+        battle["tournament_played"] = battle.get("tournament_played", 0) + 1
+        battle["tournament_wins"] = battle.get("tournament_wins", 0) + player["wins"]
+        if is_champion:
+            battle["tournament_titles"] = battle.get("tournament_titles", 0) + 1
+        await save_user_data(uid, data)
+
+    def _resolve_match(
+        self, player_a: Dict[str, Any], player_b: Dict[str, Any]
+    ) -> Tuple[Dict[str, Any], Dict[str, Any], float]:
+        """结算一场锦标赛对局，返回(胜者, 败者, A方胜率)"""
+        if player_a["privileged"] and not player_b["privileged"]:
+            prob = 100.0
+        elif player_b["privileged"] and not player_a["privileged"]:
+            prob = 0.0
+        elif player_a["privileged"] and player_b["privileged"]:
+            # 神仙打架，各凭天命
+            prob = 50.0
+        else:
+            prob = self.calc_win_prob(
+                player_a["data"]["battle"].get("level", 0),
+                player_b["data"]["battle"].get("level", 0),
+                player_a["weapons"],
+                player_b["weapons"],
+            )
+        if prob > random.random() * 100:
+            return player_a, player_b, prob
+        return player_b, player_a, prob
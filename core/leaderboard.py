@@ -0,0 +1,302 @@
+import asyncio
+import contextvars
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from astrbot.api import logger
+
+from ..utils.data_layout import locate_user_file, user_path
+from ..utils.group_index import group_index
+from ..utils.leases import LeaseTimeout, lease_manager
+from ..utils.rank_tree import RankTree
+from ..utils.user_index import user_index
+from ..utils.utils import PLUGIN_DATA_DIR, iter_user_ids, on_user_save
+from .ledger import economy_ledger
+
+# 排行指标：指标键 -> 显示名称
+METRICS = {
+    "money": "金币",
+    "love": "好感度",
+    "weapons": "武器",
+    "task_points": "任务点数",
+}
+# 命令中可用的指标名称
+METRIC_ALIASES = {
+    "金币": "money",
+    "金钱": "money",
+    "财富": "money",
+    "好感": "love",
+    "好感度": "love",
+    "武器": "weapons",
+    "任务点数": "task_points",
+    "点数": "task_points",
+}
+# 排行榜默认展示人数
+TOP_K = 10
+# 进入前10名后延迟更新任务进度的秒数（等待触发变动的命令写完用户文件）
+TOP10_DELAY = 1.0
+
+
+def love_score(user_data: Dict[str, Any]) -> int:
+    return int((user_data.get("home") or {}).get("love", 0) or 0)
+
+
+def weapon_score(backpack: Dict[str, Any]) -> int:
+    """持有武器总数"""
+    counts = (backpack.get("weapon") or {}).get("武器计数") or {}
+    return sum(int(count or 0) for count in counts.values())
+
+
+def _load(path: Path) -> Dict[str, Any]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _scan_scores(data_dir: Path) -> Dict[str, Dict[str, int]]:
+    """逐个读取用户文件，返回{指标: {user_id: 分数}}（在线程中执行）"""
+    scores: Dict[str, Dict[str, int]] = {metric: {} for metric in METRICS}
+    for uid in iter_user_ids(data_dir / "user_data"):
+        user_data = _load(locate_user_file(data_dir / "user_data", uid))
+        home = user_data.get("home") or {}
+        scores["money"][uid] = int(home.get("money", 0) or 0)
+        scores["love"][uid] = love_score(user_data)
+        scores["task_points"][uid] = int(
+            (user_data.get("task") or {}).get("task_points", 0) or 0
+        )
+        backpack_file = locate_user_file(data_dir / "user_backpack", uid)
+        if os.path.exists(backpack_file):
+            scores["weapons"][uid] = weapon_score(_load(backpack_file))
+    return scores
+
+
+class Leaderboards:
+    """
+    排行榜\n
+    - 每个指标一棵顺序统计树（全服），以及按群划分的树，名次查询与更新均为O(log n)\n
+    - 群成员取自群成员索引，成员加入/移出时同步更新群排行榜\n
+    - 启动时从磁盘重建；之后由经济账本与用户数据写入回调增量更新\n
+    - 用户进入全服前10名时触发 ranking_top10 任务进度
+    """
+
+    def __init__(self, data_dir: Optional[Path] = None):
+        self.data_dir = data_dir or PLUGIN_DATA_DIR
+        # {(指标, 群号或None): 排名树}
+        self._boards: Dict[Tuple[str, Optional[str]], RankTree] = {
+            (metric, None): RankTree() for metric in METRICS
+        }
+        self._ready = False
+        self._rebuild_task: Optional[asyncio.Task] = None
+        # 重建期间收到的增量更新 {(指标, user_id): 分数}，重建完成后覆盖磁盘数据
+        self._live: Dict[Tuple[str, str], int] = {}
+        # 待更新 ranking_top10 进度的用户
+        self._pending_top10: Set[str] = set()
+        self._top10_task: Optional[asyncio.Task] = None
+        # 插件的任务系统实例（start时绑定），未绑定时（如离线工具）不更新任务进度
+        self._task_system = None
+
+        economy_ledger.subscribe(self._on_balance)
+        on_user_save("user_data", self._on_user_data)
+        on_user_save("user_backpack", self._on_backpack)
+        group_index.subscribe(self.join, self.leave)
+
+    @property
+    def ready(self) -> bool:
+        return self._ready
+
+    # ---------- 重建 ----------
+    def start(self, task_system=None) -> None:
+        """
+        在后台从磁盘重建排行榜（在插件initialize中调用）\n
+        task_system: 插件的任务系统实例，用于更新进入前10名用户的 ranking_top10 进度
+        """
+        if task_system is not None:
+            self._task_system = task_system
+        if self._rebuild_task is None or self._rebuild_task.done():
+            self._rebuild_task = asyncio.get_running_loop().create_task(self.rebuild())
+
+    async def rebuild(self) -> None:
+        started = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            scores = await loop.run_in_executor(None, _scan_scores, self.data_dir)
+            # 金币与任务点数以经济账本为准
+            for metric in ("money", "task_points"):
+                for uid in scores[metric]:
+                    balance = economy_ledger.balance(uid, metric)
+                    if balance is not None:
+                        scores[metric][uid] = balance
+            for (metric, uid), score in self._live.items():
+                scores[metric][uid] = score
+            self._live.clear()
+            self._boards = {
+                (metric, None): RankTree.build(scores[metric]) for metric in METRICS
+            }
+            for group_id in group_index.groups():
+                self._build_group(group_id)
+            self._ready = True
+            logger.info(
+                f"排行榜已重建: {len(scores['love'])}个用户，"
+                f"耗时{time.perf_counter() - started:.2f}秒"
+            )
+            # 当前前10名补发任务进度（进度为直接设置，重复触发无副作用）
+            for metric in METRICS:
+                for uid, _ in self._boards[(metric, None)].top(10):
+                    self._queue_top10(uid)
+        except Exception as e:
+            logger.error(f"重建排行榜失败: {str(e)}")
+
+    def _build_group(self, group_id: str) -> None:
+        members = group_index.members(group_id)
+        for metric in METRICS:
+            board = self._boards[(metric, None)]
+            self._boards[(metric, group_id)] = RankTree.build(
+                {uid: board.score(uid) for uid in members if uid in board}
+            )
+
+    # ---------- 增量更新 ----------
+    def update(self, user_id: str, metric: str, score: int) -> None:
+        """更新用户某项指标的分数（全服及其所在群）"""
+        user_id = str(user_id)
+        if not self._ready:
+            self._live[(metric, user_id)] = score
+            return
+        board = self._boards[(metric, None)]
+        old_rank = board.rank(user_id)
+        board.update(user_id, score)
+        for group_id in group_index.groups_of(user_id):
+            group_board = self._boards.get((metric, group_id))
+            if group_board is not None:
+                group_board.update(user_id, score)
+        new_rank = board.rank(user_id)
+        if new_rank <= 10 and (old_rank is None or old_rank > 10):
+            self._queue_top10(user_id)
+
+    def join(self, group_id: str, user_id: str) -> None:
+        """成员加入群时把其分数加入群排行榜（群成员索引回调）"""
+        if not self._ready:
+            return
+        if (next(iter(METRICS)), group_id) not in self._boards:
+            self._build_group(group_id)
+            return
+        for metric in METRICS:
+            score = self._boards[(metric, None)].score(user_id)
+            if score is not None:
+                self._boards[(metric, group_id)].update(user_id, score)
+
+    def leave(self, group_id: str, user_id: str) -> None:
+        """成员移出群时从群排行榜删除（群成员索引回调）"""
+        for metric in METRICS:
+            board = self._boards.get((metric, group_id))
+            if board is not None:
+                board.remove(user_id)
+
+    def remove_user(self, user_id: str) -> None:
+        """删除用户的所有排名"""
+        user_id = str(user_id)
+        for board in self._boards.values():
+            board.remove(user_id)
+
+    def _on_balance(self, user_id: str, asset: str, balance: int) -> None:
+        self.update(user_id, asset, balance)
+
+    def _on_user_data(self, user_id: str, user_data: Dict[str, Any]) -> None:
+        if "home" in user_data:
+            self.update(user_id, "love", love_score(user_data))
+
+    def _on_backpack(self, user_id: str, backpack: Dict[str, Any]) -> None:
+        if "weapon" in backpack:
+            self.update(user_id, "weapons", weapon_score(backpack))
+
+    # ---------- ranking_top10 ----------
+    def _queue_top10(self, user_id: str) -> None:
+        if self._task_system is None:
+            return
+        self._pending_top10.add(user_id)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self._top10_task is None or self._top10_task.done():
+            # 在空白上下文中创建，不继承触发命令已持有的租约与耗时统计归属
+            self._top10_task = contextvars.Context().run(
+                loop.create_task, self._award_top10()
+            )
+
+    async def _award_top10(self) -> None:
+        while self._pending_top10:
+            await asyncio.sleep(TOP10_DELAY)
+            retry = set()
+            while self._pending_top10:
+                user_id = self._pending_top10.pop()
+                try:
+                    # 与命令一样持有该用户的租约后再读写用户文件，不覆盖其他实例的并发写入
+                    async with lease_manager.hold([user_id]):
+                        user_file = await user_path(
+                            self.data_dir / "user_data", user_id
+                        )
+                        if not user_file.exists():
+                            continue
+                        await self._task_system.update_task_progress(
+                            None, user_id, "ranking_top10", 1, is_direct_set=True
+                        )
+                except LeaseTimeout:
+                    retry.add(user_id)
+            # 租约被其他实例占用的用户下一轮重试
+            self._pending_top10 |= retry
+
+    # ---------- 查询 ----------
+    def board(self, metric: str, group_id: Optional[str] = None) -> RankTree:
+        return self._boards.get((metric, group_id)) or RankTree()
+
+    def format_board(
+        self, metric: str, user_id: str, group_id: Optional[str] = None, k: int = TOP_K
+    ) -> str:
+        """生成排行榜文本：前k名与调用者的名次"""
+        board = self.board(metric, group_id)
+        scope = "本群" if group_id else "全服"
+        if not board:
+            return f"{scope}{METRICS[metric]}排行榜暂无数据"
+        lines = [f"🏆 {scope}{METRICS[metric]}排行榜（共{len(board)}人）"]
+        medals = {1: "🥇", 2: "🥈", 3: "🥉"}
+        for rank, (uid, score) in enumerate(board.top(k), start=1):
+            entry = user_index.get(uid) or {}
+            name = entry.get("nickname") or uid
+            lines.append(f"{medals.get(rank, f'{rank}.')} {name}：{score}")
+        rank = board.rank(str(user_id))
+        if rank is None:
+            lines.append("你还没有上榜哦~")
+        else:
+            lines.append(f"📍 你的排名: 第{rank}名（{board.score(str(user_id))}）")
+        return "\n".join(lines)
+
+    async def handle_rank_command(self, event, parts: List[str]) -> str:
+        """处理 /排行榜 [指标] [本群] 命令"""
+        user_id = str(event.get_sender_id())
+        group_id = str(event.get_group_id() or "")
+        metric = "money"
+        local = False
+        for part in parts:
+            if part in METRIC_ALIASES:
+                metric = METRIC_ALIASES[part]
+            elif part in ("本群", "群"):
+                local = True
+            else:
+                return (
+                    f"未知的排行指标「{part}」\n"
+                    f"使用方法: /排行榜 [{'|'.join(METRICS.values())}] [本群]"
+                )
+        if not self._ready:
+            return "排行榜正在加载，请稍后再试~"
+        if local and not group_id:
+            return "本群排行榜只能在群聊中查看"
+        return self.format_board(metric, user_id, group_id if local else None)
+
+
+# 全局排行榜
+leaderboards = Leaderboards()
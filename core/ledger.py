@@ -0,0 +1,466 @@
+import asyncio
+import os
+import struct
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from astrbot.api import logger
+
+from ..utils.config import config_service
+from ..utils.io_executor import io_executor
+from ..utils.leases import shard_of
+from ..utils.tracing import traced
+from ..utils.utils import PLUGIN_DATA_DIR, read_json_sync, write_json_sync
+
+# 记账资产：资产名 -> (记录中的编号, 用户数据中的镜像位置)
+ASSETS = {
+    "money": (1, ("home", "money")),
+    "task_points": (2, ("task", "task_points")),
+}
+_ASSET_NAMES = {code: name for name, (code, _) in ASSETS.items()}
+
+# 单条记录定长64字节：序号、时间戳、用户id、资产编号、变动量、变动后余额、原因标签 + CRC32
+_BODY = struct.Struct("<QI24sBqq7s")
+_CRC = struct.Struct("<I")
+RECORD_SIZE = _BODY.size + _CRC.size
+
+# 单个段文件的最大大小，超过后切换到新段
+SEGMENT_MAX_BYTES = 4 * 1024 * 1024
+# 自上次快照以来累计多少条记录后在后台写入新快照
+COMPACT_EVERY = 10000
+
+
+def _encode(
+    seq: int, user_id: str, asset: str, delta: int, balance: int, reason: str
+) -> bytes:
+    """编码一条流水记录，用户id超过24字节时抛出ValueError"""
+    uid = user_id.encode("utf-8")
+    if len(uid) > 24:
+        raise ValueError(f"用户id过长: {user_id}")
+    body = _BODY.pack(
+        seq,
+        int(time.time()),
+        uid,
+        ASSETS[asset][0],
+        delta,
+        balance,
+        reason.encode("ascii", "ignore")[:7],
+    )
+    return body + _CRC.pack(zlib.crc32(body))
+
+
+def _decode(raw: bytes) -> Optional[Dict[str, Any]]:
+    """解码一条流水记录，长度不足或校验失败返回None"""
+    if len(raw) != RECORD_SIZE:
+        return None
+    body = raw[: _BODY.size]
+    if _CRC.unpack(raw[_BODY.size :])[0] != zlib.crc32(body):
+        return None
+    seq, ts, uid, code, delta, balance, reason = _BODY.unpack(body)
+    if code not in _ASSET_NAMES:
+        return None
+    return {
+        "seq": seq,
+        "time": ts,
+        "user_id": uid.rstrip(b"\0").decode("utf-8"),
+        "asset": _ASSET_NAMES[code],
+        "delta": delta,
+        "balance": balance,
+        "reason": reason.rstrip(b"\0").decode("ascii"),
+    }
+
+
+def _read_records(path: Path) -> Tuple[List[Dict[str, Any]], int]:
+    """读取段文件中的有效记录，返回(记录列表, 有效字节数)，遇到损坏记录即停止"""
+    data = path.read_bytes()
+    records = []
+    for offset in range(0, len(data), RECORD_SIZE):
+        record = _decode(data[offset : offset + RECORD_SIZE])
+        if record is None:
+            return records, offset
+        records.append(record)
+    return records, len(data)
+
+
+class EconomyLedger:
+    """
+    经济流水账本（金币、任务点数）\n
+    - 每次余额变动向段文件追加一条定长记录，同一时间段内的变动共享一次fsync（组提交）\n
+    - 余额常驻内存，由最近的快照加上快照之后的日志尾部恢复，读取无需访问磁盘\n
+    - 后台定期写入余额快照，已被快照覆盖的段文件移入归档目录（保留用于审计）\n
+    - 用户数据文件中的余额字段只是镜像，用户首次出现时以镜像中的余额作为初始值
+    """
+
+    def __init__(self, data_dir: Optional[Path] = None):
+        self.data_dir = data_dir or PLUGIN_DATA_DIR / "ledger"
+        self.archive_dir = self.data_dir / "archive"
+        self.snapshot_file = self.data_dir / "snapshot.json"
+        # {user_id: {资产名: 余额}}
+        self._balances: Dict[str, Dict[str, int]] = {}
+        # 最后分配的记录序号与最近快照覆盖到的序号
+        self._seq = 0
+        self._snapshot_seq = 0
+        # 当前写入的段编号与文件句柄（仅在写入线程中使用）
+        self._segment = 1
+        self._fh = None
+        # 待写入的记录与等待落盘的调用方
+        self._pending: List[bytes] = []
+        self._waiters: List[asyncio.Future] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        self._compacting = False
+        self._loaded = False
+        # 余额变动回调 callback(user_id, 资产名, 变动后余额)
+        self._listeners: List[Callable[[str, str, int], Any]] = []
+        # 多实例共享数据目录时：各段文件已读取到的字节数、磁盘上的最新余额 {分片: {user_id: {资产名: 余额}}}、
+        # 目录中最新的段编号（其他进程可能已切换到新段）
+        self._offsets: Dict[int, int] = {}
+        self._durable: Dict[int, Dict[str, Dict[str, int]]] = {}
+        self._latest_segment = 0
+
+    @property
+    def shared(self) -> bool:
+        """是否与其他进程共享账本（多实例部署）"""
+        return config_service.snapshot.cluster.enabled
+
+    # ---------- 加载与恢复 ----------
+    def _segments(self, directory: Optional[Path] = None) -> List[Tuple[int, Path]]:
+        """按编号排序的段文件列表"""
+        directory = directory or self.data_dir
+        segments = []
+        for path in directory.glob("segment_*.log"):
+            try:
+                segments.append((int(path.stem.split("_")[1]), path))
+            except (IndexError, ValueError):
+                continue
+        return sorted(segments)
+
+    def _segment_path(self, index: int) -> Path:
+        return self.data_dir / f"segment_{index:06d}.log"
+
+    def _recover(self) -> Dict[str, Any]:
+        """从快照与日志尾部恢复余额（只读取文件，不修改实例状态，可在线程中执行）"""
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        snapshot = read_json_sync(self.snapshot_file)
+        snapshot_seq = seq = int(snapshot.get("seq", 0))
+        balances = {
+            uid: {asset: int(value) for asset, value in assets.items()}
+            for uid, assets in snapshot.get("balances", {}).items()
+        }
+        offsets: Dict[int, int] = {}
+        replayed = 0
+        segments = self._segments()
+        for index, path in segments:
+            records, valid = _read_records(path)
+            # 共享账本的尾部可能是其他进程正在写入的记录，不能截断
+            if valid < path.stat().st_size and not self.shared:
+                # 进程在写入中途退出会留下不完整的尾部记录
+                logger.warning(f"经济流水 {path.name} 尾部记录损坏，已截断到 {valid} 字节")
+                with open(path, "r+b") as f:
+                    f.truncate(valid)
+            offsets[index] = valid
+            for record in records:
+                if record["seq"] <= snapshot_seq:
+                    continue
+                balances.setdefault(record["user_id"], {})[record["asset"]] = (
+                    record["balance"]
+                )
+                seq = max(seq, record["seq"])
+                replayed += 1
+        segment = segments[-1][0] if segments else 1
+        durable: Dict[int, Dict[str, Dict[str, int]]] = {}
+        for uid, assets in balances.items():
+            durable.setdefault(shard_of(uid), {})[uid] = dict(assets)
+        return {
+            "seq": seq,
+            "snapshot_seq": snapshot_seq,
+            "balances": balances,
+            "offsets": offsets,
+            "durable": durable,
+            "segment": segment,
+            "fh": open(self._segment_path(segment), "ab"),
+            "replayed": replayed,
+        }
+
+    def _install(self, state: Dict[str, Any]) -> None:
+        self._loaded = True
+        self._seq = state["seq"]
+        self._snapshot_seq = state["snapshot_seq"]
+        self._balances = state["balances"]
+        self._offsets = state["offsets"]
+        self._durable = state["durable"]
+        self._segment = self._latest_segment = state["segment"]
+        self._fh = state["fh"]
+        logger.info(
+            f"经济账本已加载: {len(self._balances)}个用户，重放{state['replayed']}条流水"
+        )
+
+    async def load(self) -> None:
+        """在读写线程池中加载账本（在插件initialize中调用，避免首个命令在事件循环中重放日志）"""
+        if self._loaded:
+            return
+        state = await asyncio.get_running_loop().run_in_executor(io_executor, self._recover)
+        if self._loaded:
+            # 加载期间已有调用同步加载过
+            state["fh"].close()
+            return
+        self._install(state)
+
+    def _ensure_loaded(self) -> None:
+        """未经load()加载时（如离线工具中）在首次使用时同步加载"""
+        if not self._loaded:
+            self._install(self._recover())
+
+    # ---------- 余额读写 ----------
+    def _current(
+        self, user_id: str, asset: str, user_data: Optional[Dict[str, Any]]
+    ) -> int:
+        """当前余额，用户首次出现时以user_data中的镜像余额为初始值"""
+        assets = self._balances.setdefault(user_id, {})
+        if asset not in assets:
+            section, key = ASSETS[asset][1]
+            seed = 0
+            if user_data is not None:
+                seed = int((user_data.get(section) or {}).get(key, 0) or 0)
+            assets[asset] = seed
+            if seed:
+                self._append(user_id, asset, seed, seed, "seed")
+        return assets[asset]
+
+    def balance(self, user_id: str, asset: str = "money") -> Optional[int]:
+        """账本中的余额，尚未记录的用户返回None"""
+        self._ensure_loaded()
+        return self._balances.get(str(user_id), {}).get(asset)
+
+    def attach(self, user_id: str, user_data: Dict[str, Any]) -> Dict[str, Any]:
+        """用账本余额刷新user_data中的余额镜像（只更新已存在的分组）"""
+        self._ensure_loaded()
+        user_id = str(user_id)
+        for asset, (_, (section, key)) in ASSETS.items():
+            value = self._current(user_id, asset, user_data)
+            if isinstance(user_data.get(section), dict):
+                user_data[section][key] = value
+        return user_data
+
+    def apply(
+        self,
+        user_id: str,
+        asset: str,
+        delta: int,
+        reason: str,
+        user_data: Optional[Dict[str, Any]] = None,
+        require_funds: bool = False,
+    ) -> Tuple[bool, int]:
+        """
+        变动余额并追加一条流水，返回(是否成功, 变动后余额/失败时的当前余额)\n
+        检查与扣减在同一次同步调用中完成，并发扣款不会透支\n
+        require_funds为True且余额不足时不做任何变动\n
+        user_data不为None时同步更新其中的余额镜像；落盘需await commit()
+        """
+        self._ensure_loaded()
+        user_id = str(user_id)
+        delta = int(delta)
+        current = self._current(user_id, asset, user_data)
+        if require_funds and current + delta < 0:
+            return False, current
+        self._balances[user_id][asset] = current + delta
+        self._append(user_id, asset, delta, current + delta, reason)
+        if user_data is not None:
+            section, key = ASSETS[asset][1]
+            user_data.setdefault(section, {})[key] = current + delta
+        return True, current + delta
+
+    def _append(
+        self, user_id: str, asset: str, delta: int, balance: int, reason: str
+    ) -> None:
+        self._seq += 1
+        self._pending.append(_encode(self._seq, user_id, asset, delta, balance, reason))
+        self._schedule_flush()
+        for listener in self._listeners:
+            try:
+                listener(user_id, asset, balance)
+            except Exception as e:
+                logger.error(f"执行余额变动回调失败: {str(e)}")
+
+    def subscribe(self, listener: Callable[[str, str, int], Any]) -> None:
+        """订阅余额变动（在apply中同步调用），重复订阅只保留一次"""
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    # ---------- 组提交 ----------
+    def _schedule_flush(self) -> None:
+        """安排后台写入，无事件循环时立即同步写入"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            batch, self._pending = self._pending, []
+            self._write(b"".join(batch))
+            return
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = loop.create_task(self._flush_loop())
+
+    def _write(self, data: bytes) -> None:
+        """写入一批记录并fsync（在写入线程中执行），段文件写满后切换到新段"""
+        if not data:
+            return
+        if self._latest_segment > self._segment:
+            # 其他进程已切换到新段，跟随写入，保证段内与段间的记录顺序一致
+            self._switch_segment(self._latest_segment)
+        self._fh.write(data)
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+        if self._fh.tell() >= SEGMENT_MAX_BYTES:
+            segment = self._segment + 1
+            if self.shared:
+                # 其他进程可能已先切换
+                segment = max([segment] + [index for index, _ in self._segments()])
+            self._switch_segment(segment)
+
+    def _switch_segment(self, segment: int) -> None:
+        self._fh.close()
+        self._segment = self._latest_segment = segment
+        self._fh = open(self._segment_path(segment), "ab")
+
+    async def _flush_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        # 写入期间新到达的记录会在下一轮合并为一批
+        while self._pending or self._waiters:
+            batch, self._pending = self._pending, []
+            waiters, self._waiters = self._waiters, []
+            try:
+                await loop.run_in_executor(io_executor, self._write, b"".join(batch))
+            except Exception as e:
+                logger.error(f"写入经济流水失败: {str(e)}")
+                # 保留未写入的记录，下次变动时重试
+                self._pending[:0] = batch
+                self._release(waiters)
+                return
+            self._release(waiters)
+            if self._seq - self._snapshot_seq >= COMPACT_EVERY:
+                await self.compact()
+
+    # ---------- 多实例 ----------
+    def _read_new(self) -> int:
+        """读取各段文件中新追加的记录（含其他进程写入的），更新磁盘余额，返回其中的最大序号"""
+        max_seq = 0
+        segments = self._segments()
+        for index, path in segments:
+            offset = self._offsets.get(index, 0)
+            with open(path, "rb") as f:
+                f.seek(offset)
+                data = f.read()
+            valid = 0
+            # 遇到不完整的记录（正在写入）即停止，下次从此处继续
+            for start in range(0, len(data) - RECORD_SIZE + 1, RECORD_SIZE):
+                record = _decode(data[start : start + RECORD_SIZE])
+                if record is None:
+                    break
+                uid = record["user_id"]
+                self._durable.setdefault(shard_of(uid), {}).setdefault(uid, {})[
+                    record["asset"]
+                ] = record["balance"]
+                max_seq = max(max_seq, record["seq"])
+                valid = start + RECORD_SIZE
+            self._offsets[index] = offset + valid
+        if segments:
+            self._latest_segment = max(self._latest_segment, segments[-1][0])
+        return max_seq
+
+    async def catch_up(self, shard: int) -> None:
+        """
+        其他进程持有过该分片的租约（租约接手回调）：读取日志中新追加的记录，
+        以磁盘上的余额覆盖该分片用户的内存余额
+        """
+        self._ensure_loaded()
+        max_seq = await asyncio.get_running_loop().run_in_executor(io_executor, self._read_new)
+        self._seq = max(self._seq, max_seq)
+        for uid, assets in self._durable.get(shard, {}).items():
+            self._balances[uid] = dict(assets)
+
+    @staticmethod
+    def _release(waiters: List[asyncio.Future]) -> None:
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    @traced()
+    async def commit(self) -> None:
+        """等待此前的所有流水落盘，并发调用方共享同一次fsync"""
+        if not self._pending and (self._flush_task is None or self._flush_task.done()):
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._schedule_flush()
+        await waiter
+
+    # ---------- 快照与审计 ----------
+    async def compact(self) -> None:
+        """写入余额快照，并把已被快照覆盖的段文件移入归档目录"""
+        self._ensure_loaded()
+        # 共享账本时各进程的序号会交错，且其他进程可能仍在写入旧段，不做快照与归档
+        if self.shared or self._compacting or self._seq == self._snapshot_seq:
+            return
+        self._compacting = True
+        try:
+            # 在事件循环中取快照，保证余额与序号一致
+            seq, segment = self._seq, self._segment
+            data = {
+                "seq": seq,
+                "created_at": time.time(),
+                "balances": {uid: dict(assets) for uid, assets in self._balances.items()},
+            }
+            loop = asyncio.get_running_loop()
+            if not await loop.run_in_executor(
+                io_executor, write_json_sync, self.snapshot_file, data
+            ):
+                return
+            self._snapshot_seq = seq
+            # 编号小于当前段的段文件中的记录都已写入且被快照覆盖
+            await loop.run_in_executor(io_executor, self._archive, segment)
+            logger.info(f"经济账本快照已更新（序号 {seq}）")
+        except Exception as e:
+            logger.error(f"压缩经济账本失败: {str(e)}")
+        finally:
+            self._compacting = False
+
+    def _archive(self, segment: int) -> None:
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        for index, path in self._segments():
+            if index < segment:
+                os.replace(path, self.archive_dir / path.name)
+
+    async def history(self, user_id: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """查询用户最近的流水（含归档段），按时间倒序"""
+        self._ensure_loaded()
+        await self.commit()
+        user_id = str(user_id)
+
+        def scan() -> List[Dict[str, Any]]:
+            found: List[Dict[str, Any]] = []
+            segments = self._segments(self.archive_dir) + self._segments()
+            for _, path in reversed(segments):
+                records = [
+                    r for r in _read_records(path)[0] if r["user_id"] == user_id
+                ]
+                found.extend(reversed(records))
+                if len(found) >= limit:
+                    break
+            return found[:limit]
+
+        return await asyncio.get_running_loop().run_in_executor(io_executor, scan)
+
+    async def close(self) -> None:
+        """写入所有流水与最终快照并关闭段文件（插件卸载时调用）"""
+        if not self._loaded:
+            return
+        await self.commit()
+        await self.compact()
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+        self._loaded = False
+
+
+# 全局经济账本：用户、商店、签到、任务系统共享
+economy_ledger = EconomyLedger()
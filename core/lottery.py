@@ -1,28 +1,32 @@
 import json
 import random
-from datetime import datetime, timedelta
+import time
 from pathlib import Path
-from zoneinfo import ZoneInfo
 
 from astrbot.api import logger
 from astrbot.api.star import StarTools
-from astrbot.core import AstrBotConfig
 from astrbot.core.platform.sources.aiocqhttp.aiocqhttp_message_event import (
     AiocqhttpMessageEvent,
 )
 
+from ..utils.config import config_service
+from ..utils.scheduler import period_clock
+from ..utils.tracing import span
 from ..utils.utils import (
     get_at_ids,
     get_user_data_and_backpack,
     read_json,
+    save_user_backpack,
+    save_user_data,
     seconds_to_duration,
-    write_json,
 )
+from .ledger import economy_ledger
+from .shop_catalog import shop_catalog
 from .task import Task
 
 
 class Lottery:
-    def __init__(self, config: AstrBotConfig):
+    def __init__(self):
         """初始化抽奖系统，设置路径和概率参数"""
         # 设置文件路径
         PLUGIN_DATA_DIR = Path(StarTools.get_data_dir("astrbot_plugin_akasha_terminal"))
@@ -31,16 +35,10 @@ class Lottery:
         self.user_data_path = PLUGIN_DATA_DIR / "user_data"
         self.weapon_file = PLUGIN_DIR / "data" / "weapon.json"
         self.image_base_path = PLUGIN_DIR / "resources" / "weapon_image"
-        self.shop_data_file = PLUGIN_DIR / "data" / "shop_data.json"
 
         # 导入任务系统更新任务进度
         self.task = Task()
 
-        # 从配置接收抽卡冷却时间
-        self.draw_card_cooldown = config.get("other_system", {}).get(
-            "draw_card_cooldown", 10
-        )  # 默认10秒
-
         # 存储群冷却时间
         self.group_cooldowns = {}  # {group_id: 下次可抽卡时间}
 
@@ -54,12 +52,17 @@ class Lottery:
             100 - self.five_star_prob - self.four_star_prob
         )  # 三星武器基础概率94%
 
+    @property
+    def draw_card_cooldown(self) -> int:
+        """抽卡冷却时间（秒），取自配置快照"""
+        return config_service.snapshot.other.draw_card_cooldown
+
     def check_group_cooldown(self, group_id: str) -> int:
         """检查群冷却时间，返回剩余冷却秒数，0表示无冷却"""
         if not group_id:
             return 0  # 私聊无冷却
 
-        current_time = datetime.now(ZoneInfo("Asia/Shanghai")).timestamp()
+        current_time = time.time()
         next_available_time = self.group_cooldowns.get(group_id, 0)
         remaining = next_available_time - current_time
         return max(remaining, 0)
@@ -69,7 +72,7 @@ class Lottery:
         if not group_id or self.draw_card_cooldown <= 0:
             return
 
-        current_time = datetime.now(ZoneInfo("Asia/Shanghai")).timestamp()
+        current_time = time.time()
         self.group_cooldowns[group_id] = current_time + self.draw_card_cooldown
 
     def load_weapon_data(self):
@@ -146,8 +149,9 @@ class Lottery:
                 weapon_detail["详细信息"].append(weapon_info)
 
             # 保存数据
-            await write_json(self.user_data_path / f"{user_id}.json", user_data)
-            await write_json(self.backpack_path / f"{user_id}.json", user_backpack)
+            with span("lottery.persist", weapon=target_weapon_id):
+                await save_user_data(user_id, user_data)
+                await save_user_backpack(user_id, user_backpack)
             return True
         except Exception as e:
             logger.error(f"更新用户数据失败: {str(e)}")
@@ -221,11 +225,13 @@ class Lottery:
             weapon_image = f"{weapon_name}.png"
             weapon_image_path = self.image_base_path / weapon_star / weapon_image
             # 检查文件是否存在
-            if not weapon_image_path.exists():
-                logger.error(f"武器图片不存在：{weapon_image_path}")
-                weapon_image_path = None  # 标记为无效
-            else:
-                weapon_image_path = str(weapon_image_path)
+            with span("lottery.resolve_image", image=weapon_image) as image_span:
+                if not weapon_image_path.exists():
+                    logger.error(f"武器图片不存在：{weapon_image_path}")
+                    weapon_image_path = None  # 标记为无效
+                else:
+                    weapon_image_path = str(weapon_image_path)
+                image_span.set(found=weapon_image_path is not None)
             return (
                 {
                     "star": weapon_star,
@@ -247,7 +253,8 @@ class Lottery:
             group_id = event.get_group_id() or None
             if not group_id:
                 return "请在群聊中使用抽武器功能哦~", None
-            remaining_time = self.check_group_cooldown(group_id)
+            with span("lottery.cooldown", group=group_id):
+                remaining_time = self.check_group_cooldown(group_id)
             if remaining_time > 0:
                 return (
                     f"抽卡冷却中，还剩{seconds_to_duration(remaining_time)}",
@@ -279,16 +286,18 @@ class Lottery:
             self.update_group_cooldown(group_id)
 
             # 处理多次抽卡
-            for _ in range(count):
-                (
-                    result,
-                    five_star_miss,
-                    four_star_miss,
-                    current_five_star_prob,
-                    weapon_image_path,
-                ) = await self.handle_single_draw(
-                    user_id, user_data, user_backpack, five_star_miss, four_star_miss
-                )
+            for index in range(count):
+                with span("lottery.draw", index=index) as draw_span:
+                    (
+                        result,
+                        five_star_miss,
+                        four_star_miss,
+                        current_five_star_prob,
+                        weapon_image_path,
+                    ) = await self.handle_single_draw(
+                        user_id, user_data, user_backpack, five_star_miss, four_star_miss
+                    )
+                    draw_span.set(star=result["star"] if result else None)
                 next_five_star_prob = (
                     int(current_five_star_prob) + 6.5
                     if five_star_miss >= 64
@@ -365,15 +374,12 @@ class Lottery:
         self, user_data, user_backpack, base_reward, money_reward
     ):
         """计算签到奖励及加成"""
-        CN_TIMEZONE = ZoneInfo("Asia/Shanghai")
         last_sign = user_backpack["sign_info"].get("last_sign", "")
         streak_count = user_backpack["sign_info"].get("streak_days", 0)
         money_reward += 200 + int(random.random() * 300)
         money_msg = ""
         # 连续签到逻辑
-        if last_sign == (datetime.now(CN_TIMEZONE).date() - timedelta(days=1)).strftime(
-            "%Y-%m-%d"
-        ):
+        if last_sign == period_clock.yesterday_str:
             streak_count += 1
         else:
             streak_count = 1
@@ -445,10 +451,8 @@ class Lottery:
         """处理每日签到逻辑"""
         try:
             user_id = str(event.get_sender_id())
-            CN_TIMEZONE = ZoneInfo("Asia/Shanghai")
-            shop_data = await read_json(self.shop_data_file)
             user_data, user_backpack = await get_user_data_and_backpack(user_id)
-            today = datetime.now(CN_TIMEZONE).date().strftime("%Y-%m-%d")
+            today = period_clock.today_str
 
             # 初始化签到信息
             judge_new_user = False
@@ -481,7 +485,9 @@ class Lottery:
             user_backpack["weapon"]["纠缠之缘"] += total_reward
 
             # 更新金钱数量
-            user_data["home"]["money"] += reward_data["money_reward"]
+            economy_ledger.apply(
+                user_id, "money", reward_data["money_reward"], "signin", user_data
+            )
 
             # 构建消息
             message = ""
@@ -506,7 +512,7 @@ class Lottery:
                     f"🎁 幸运奖励：额外获得{reward_data['lucky_reward']}颗纠缠之缘！"
                 )
             if item_reward:
-                message += f"\n额外获得:{shop_data['items'][item_reward]['name']} x1！"
+                message += f"\n额外获得:{shop_catalog.get(item_reward)['name']} x1！"
             try:
                 # 加成信息
                 bonus_messages = "\n\n"
@@ -526,8 +532,9 @@ class Lottery:
                 message += bonus_messages
 
             # 保存数据
-            await write_json(self.backpack_path / f"{user_id}.json", user_backpack)
-            await write_json(self.user_data_path / f"{user_id}.json", user_data)
+            # 签到只变动余额（已由经济账本记录）与背包，无需重写用户文件
+            await economy_ledger.commit()
+            await save_user_backpack(user_id, user_backpack)
 
             # 更新用户进度
             await self.task.update_task_progress(
@@ -718,7 +725,7 @@ class Lottery:
                 to_user_id, only_data_or_backpack="user_backpack"
             )
             user_backpack["weapon"]["纠缠之缘"] += amount
-            await write_json(self.backpack_path / f"{to_user_id}.json", user_backpack)
+            await save_user_backpack(to_user_id, user_backpack)
             return (
                 True,
                 f"成功为用户{to_user_id}增加 {amount} 颗纠缠之缘\n"
@@ -1,9 +1,8 @@
 import json
 import random
-from collections import Counter
-from datetime import datetime
+from collections import Counter, OrderedDict
 from pathlib import Path
-from typing import Any, Dict, Optional, Tuple
+from typing import Any, Dict, Mapping, Optional, Tuple
 from zoneinfo import ZoneInfo
 
 import astrbot.api.message_components as Comp
@@ -13,23 +12,31 @@ from astrbot.core.platform.sources.aiocqhttp.aiocqhttp_message_event import (
     AiocqhttpMessageEvent,
 )
 
+from ..utils.api_queue import api_queue
+from ..utils.config import config_service
+from ..utils.data_layout import user_path
+from ..utils.leases import LeaseTimeout, lease_manager
 from ..utils.text_formatter import TextFormatter
+from ..utils.tracing import traced
 from ..utils.utils import (
     get_at_ids,
+    get_backpack_version,
     read_json,
-    read_json_sync,
-    write_json,
-    write_json_sync,
+    save_user_backpack,
+    save_user_data,
 )
+from .ledger import economy_ledger
+from .shop_catalog import shop_catalog, stock_ledger
 from .task import Task
 
+# 背包展示缓存的最大用户数
+BACKPACK_VIEW_CACHE_SIZE = 256
+
 
 class Shop:
     def __init__(self):
         """初始化商店系统，设置数据目录和文件路径"""
         PLUGIN_DATA_DIR = Path(StarTools.get_data_dir("astrbot_plugin_akasha_terminal"))
-        self.data_dir = Path(__file__).resolve().parent.parent / "data"
-        self.shop_data_path = self.data_dir / "shop_data.json"
         self.backpack_path = PLUGIN_DATA_DIR / "user_backpack"
         self.user_data_path = PLUGIN_DATA_DIR / "user_data"
         self.config_path = (
@@ -37,7 +44,6 @@ class Shop:
             / "config"
             / "astrbot_plugin_akasha_terminal_config.json"
         )
-        self.data_dir.mkdir(parents=True, exist_ok=True)  # 确保数据目录存在
         self._init_default_data()
 
         # 导入用户系统获取金钱
@@ -47,119 +53,32 @@ class Shop:
         # 导入任务系统更新任务进度
         self.task = Task()
 
+        # 商店列表缓存 ((目录版本, 库存版本), 文本)
+        self._shop_view: Optional[Tuple[Tuple[int, int], str]] = None
+        # 背包展示缓存（LRU） {user_id: ((背包版本, 目录版本), 文本)}
+        self._backpack_views: "OrderedDict[str, Tuple[Tuple[int, int], str]]" = (
+            OrderedDict()
+        )
+
     def _init_default_data(self) -> None:
-        """初始化默认商店数据和用户背包（仅当文件不存在时）"""
+        """初始化用户背包目录（仅当不存在时）"""
         # 设置「中国标准时间」
         self.CN_TIMEZONE = ZoneInfo("Asia/Shanghai")
-        # 初始化商店数据
-        shop_default_data = read_json_sync(self.shop_data_path)
-        self.default_shop = {
-            "items": {
-                "爱心巧克力": {
-                    "id": 1,
-                    "name": "爱心巧克力",
-                    "description": "增加与伴侣的好感度 +200",
-                    "price": 500,
-                    "type": "consumable",
-                    "effect": {"love": 200},
-                    "rarity": "common",
-                    "stock": -1,  # -1表示无限库存
-                },
-                "幸运符": {
-                    "id": 2,
-                    "name": "幸运符",
-                    "description": "提高娶伴侣成功率 +20%（持续3次使用）",
-                    "price": 1000,
-                    "type": "buff",
-                    "effect": {"luck_boost": 20, "luck_streak": 3},
-                    "rarity": "rare",
-                    "stock": 10,
-                },
-                "金币袋": {
-                    "id": 3,
-                    "name": "金币袋",
-                    "description": "直接获得1000-3000金币",
-                    "price": 800,
-                    "type": "consumable",
-                    "effect": {"money_min": 1000, "money_max": 3000},
-                    "rarity": "common",
-                    "stock": -1,
-                },
-                "冷却重置卡": {
-                    "id": 4,
-                    "name": "冷却重置卡",
-                    "description": "重置所有技能冷却时间",
-                    "price": 1500,
-                    "type": "consumable",
-                    "effect": {"reset_cooldown": True},
-                    "rarity": "epic",
-                    "stock": 5,
-                },
-                "保护符": {
-                    "id": 5,
-                    "name": "保护符",
-                    "description": "免疫一次抢伴侣失败的惩罚",
-                    "price": 2000,
-                    "type": "consumable",
-                    "effect": {"protection": True, "imm_num": 1},
-                    "rarity": "epic",
-                    "stock": 3,
-                },
-                "双倍经验卡": {
-                    "id": 6,
-                    "name": "双倍经验卡",
-                    "description": "打工收入翻倍（持续5次）",
-                    "price": 1200,
-                    "type": "buff",
-                    "effect": {"work_boost": 2, "dbl_exp_num": 5},
-                    "rarity": "rare",
-                    "stock": 8,
-                },
-                "神秘礼盒": {
-                    "id": 7,
-                    "name": "神秘礼盒",
-                    "description": "随机获得一个道具",
-                    "price": 2500,
-                    "type": "mystery",
-                    "effect": {"mystery_box": True},
-                    "rarity": "legendary",
-                    "stock": 2,
-                },
-            },
-            "daily_items": [
-                "爱心巧克力",
-                "幸运符",
-                "金币袋",
-                "双倍经验卡",
-            ],  # 每日刷新的商品ID
-            "last_refresh": datetime.now(self.CN_TIMEZONE).strftime("%Y-%m-%d"),
-        }
-        if not self.shop_data_path.exists() or not shop_default_data.get("items"):
-            write_json_sync(self.shop_data_path, self.default_shop)
         # 初始化用户背包路径文件
         if not self.backpack_path.exists():
             self.backpack_path.mkdir(parents=True, exist_ok=True)
 
-    async def get_shop_items(self) -> Dict[str, Any]:
-        """获取商店物品列表，自动处理每日刷新"""
-        shop_data = await read_json(self.shop_data_path)
-        today = datetime.now(self.CN_TIMEZONE).strftime("%Y-%m-%d")
+    async def get_shop_items(self) -> Mapping[str, Mapping[str, Any]]:
+        """获取商店物品列表（只读商品目录，库存见stock_ledger）"""
+        return shop_catalog.items
 
-        # 检查并执行每日刷新
-        if shop_data["last_refresh"] != today:
-            # 刷新每日商品
-            shop_data = self.default_shop
-            await write_json(self.shop_data_path, shop_data)
-        return shop_data["items"]
-
-    async def get_item_detail(self, item_name: str) -> Optional[Dict[str, Any]]:
+    async def get_item_detail(self, item_name: str) -> Optional[Mapping[str, Any]]:
         """获取指定物品的详细信息"""
-        items = await self.get_shop_items()
-        return items.get(item_name)
+        return shop_catalog.get(item_name)
 
     async def get_user_backpack(self, user_id: str) -> Dict[str, int]:
         """获取用户背包物品列表"""
-        file_path = self.backpack_path / f"{user_id}.json"
+        file_path = await user_path(self.backpack_path, user_id)
         backpack = await read_json(file_path)
         return backpack or {}
 
@@ -188,7 +107,6 @@ class Shop:
                 return False, "数量必须为整数，请重新输入"
             if quantity <= 0:
                 return False, "使用数量必须为正整数"
-            file_path = self.backpack_path / f"{user_id}.json"
             backpack = await self.get_user_backpack(user_id)
             # 物品存在性与数量校验
             if item_name not in backpack:
@@ -208,7 +126,7 @@ class Shop:
             backpack[item_name] -= quantity
             if backpack[item_name] == 0:
                 del backpack[item_name]
-            await write_json(file_path, backpack)
+            await save_user_backpack(user_id, backpack)
 
             # 执行道具效果
             result = await self.execute_item_effect(
@@ -221,12 +139,13 @@ class Shop:
             logger.error(f"使用物品失败: {str(e)}")
             return False, "使用物品失败，请稍后再试~"
 
+    @traced()
     async def execute_item_effect(
         self, event: AiocqhttpMessageEvent, item, user_id, backpack, quantity
     ) -> Dict[str, Any]:
         """执行道具效果，返回执行结果"""
         try:
-            target_user_data_path = self.user_data_path / f"{user_id}.json"
+            target_user_data_path = await user_path(self.user_data_path, user_id)
             user_data = await read_json(target_user_data_path)
             if "other" not in user_data:
                 user_data["other"] = {}
@@ -241,7 +160,7 @@ class Shop:
 
                     up_love = item["effect"]["love"] * quantity
                     user_data["home"]["love"] = user_data["home"]["love"] + up_love
-                    await write_json(target_user_data_path, user_data)
+                    await save_user_data(user_id, user_data)
 
                     # 更新任务进度
                     await self.task.update_task_progress(
@@ -260,10 +179,9 @@ class Shop:
                         money += random.randint(
                             item["effect"]["money_min"], item["effect"]["money_max"]
                         )
-                    user_data["home"]["money"] = (
-                        user_data["home"].get("money", 0) + money
-                    )
-                    await write_json(target_user_data_path, user_data)
+                    # 只变动余额，由经济账本记录，无需重写用户文件
+                    economy_ledger.apply(user_id, "money", money, "coinbag", user_data)
+                    await economy_ledger.commit()
 
                     # 更新任务进度
                     await self.task.update_task_progress(
@@ -292,8 +210,9 @@ class Shop:
 
                 # 保护符道具
                 elif "protection" in item["effect"] and item["effect"]["protection"]:
-                    config_data = read_json_sync(self.config_path, "utf-8-sig")
-                    protection_duration = config_data.get("protection_duration", 86400)
+                    protection_duration = (
+                        config_service.snapshot.shop.protection_duration
+                    )
                     if user_data["other"].get("imm_num", 0) == 0:
                         user_data["other"]["protection"] = user_data["other"].get(
                             "protection", 0
@@ -302,7 +221,7 @@ class Shop:
                         user_data["other"].get("imm_num", 0)
                         + item["effect"]["imm_num"] * quantity
                     )
-                    await write_json(target_user_data_path, user_data)
+                    await save_user_data(user_id, user_data)
                     return {
                         "success": True,
                         "message": f"🛡️ 获得{int(protection_duration / 3600)}小时保护，免疫{user_data['other']['imm_num']}次失败惩罚！",
@@ -319,7 +238,7 @@ class Shop:
                         user_data["other"].get("luck_streak", 0)
                         + int(item["effect"]["luck_streak"]) * quantity
                     )
-                    await write_json(target_user_data_path, user_data)
+                    await save_user_data(user_id, user_data)
                     return {
                         "success": True,
                         "message": f"🍀 获得幸运加成 +{item['effect']['luck_boost']}%，持续{item['effect']['luck_streak'] * quantity}次使用",
@@ -335,19 +254,18 @@ class Shop:
                         user_data["other"].get("dbl_exp_num", 0)
                         + int(item["effect"]["dbl_exp_num"]) * quantity
                     )
-                    await write_json(target_user_data_path, user_data)
+                    await save_user_data(user_id, user_data)
                     return {
                         "success": True,
                         "message": f"💼 获得打工加成 +{item['effect']['work_boost']}%，持续{item['effect']['dbl_exp_num'] * quantity}次使用",
                     }
             # 神秘礼盒道具
             elif item["type"] == "mystery" and item["effect"]["mystery_box"]:
-                shop_data = await read_json(self.shop_data_path)
                 current_item_name = str(item["name"])
                 # 构建名称到详情的映射（排除当前物品），用于快速查询
                 name_to_detail = {
                     name: detail
-                    for name, detail in shop_data["items"].items()
+                    for name, detail in shop_catalog.items.items()
                     if name != current_item_name
                 }
                 # 可用物品名称列表（即映射的键）
@@ -364,7 +282,7 @@ class Shop:
                     # 收集消息片段
                     message_parts.append(f"{rarity_emoji} {target_name} x {count}")
                 message = "\n".join(message_parts)
-                await write_json(self.backpack_path / f"{user_id}.json", backpack)
+                await save_user_backpack(user_id, backpack)
                 return {
                     "success": True,
                     "message": f"🎁 神秘礼盒开启！获得: \n{message}",
@@ -404,6 +322,7 @@ class Shop:
         except Exception as e:
             return False, f"购买失败: {str(e)}"
 
+    @traced()
     async def buy_item(
         self,
         event: AiocqhttpMessageEvent,
@@ -416,48 +335,63 @@ class Shop:
         购买物品（支持批量购买）
         :param user_id: 用户ID
         :param item_name: 物品名称
-        :param user_money: 用户当前金币数
+        :param home_data: 用户家园数据（其中的余额镜像会同步更新）
         :param quantity: 购买数量（默认1）
         :return: (是否成功, 结果消息)
         """
-        user_money = home_data.get("money", 0)
-        # 加载数据
-        shop_data = await read_json(self.shop_data_path)
-        items = shop_data["items"]
-        file_path = self.backpack_path / f"{user_id}.json"
-        backpack = await self.get_user_backpack(user_id)
-
         # 基础校验
-        if item_name not in items:
+        target_item = shop_catalog.get(item_name)
+        if not target_item:
             return False, "物品不存在"
         if quantity <= 0:
             return False, "购买数量必须为正整数"
 
-        target_item = items[item_name]
         total_price = target_item["price"] * quantity
 
-        # 库存与金钱校验
-        if target_item["stock"] != -1 and target_item["stock"] < quantity:
-            return False, f"物品库存不足，当前库存: {target_item['stock']}"
-        if user_money < total_price:
-            return (
-                False,
-                f"购买{target_item['name']} x {quantity}所需的金币不足\n"
-                f"需要{total_price}金币，您当前拥有{user_money}金币",
-            )
-        # 更新金钱
-        home_data["money"] -= total_price
-        await self.user.update_home_data(user_id, home_data)
-        # 更新库存
-        if target_item["stock"] != -1:
-            target_item["stock"] -= quantity
-            await write_json(self.shop_data_path, shop_data)
-
-        # 更新背包
-        if item_name not in backpack:
-            backpack[item_name] = 0
-        backpack[item_name] += quantity
-        await write_json(file_path, backpack)
+        # 库存与金钱校验（扣减库存为同步操作，并发购买不会超卖；多实例时持有库存租约）
+        try:
+            async with lease_manager.hold((), resources=("shop_stock",)):
+                taken, stock = stock_ledger.take(item_name, quantity)
+                if not taken:
+                    return False, f"物品库存不足，当前库存: {stock}"
+                # 扣除金钱（余额检查与扣减同样是同步操作）
+                paid, user_money = economy_ledger.apply(
+                    user_id,
+                    "money",
+                    -total_price,
+                    "shop",
+                    home_data,
+                    require_funds=True,
+                )
+                if not paid:
+                    stock_ledger.give_back(item_name, quantity)
+                    return (
+                        False,
+                        f"购买{target_item['name']} x {quantity}所需的金币不足\n"
+                        f"需要{total_price}金币，您当前拥有{user_money}金币",
+                    )
+        except LeaseTimeout:
+            return False, "商城库存正被其他实例使用，请稍后再试"
+
+        # 更新背包（先写背包再确认扣款）
+        try:
+            backpack = await self.get_user_backpack(user_id)
+            if item_name not in backpack:
+                backpack[item_name] = 0
+            backpack[item_name] += quantity
+            if not await save_user_backpack(user_id, backpack):
+                raise OSError(f"写入用户 {user_id} 的背包失败")
+        except Exception as e:
+            logger.error(f"购买物品入包失败: {str(e)}")
+            # 物品未能到账，退还金币与库存
+            economy_ledger.apply(user_id, "money", total_price, "refund", home_data)
+            try:
+                async with lease_manager.hold((), resources=("shop_stock",)):
+                    stock_ledger.give_back(item_name, quantity)
+            except LeaseTimeout:
+                logger.warning(f"退还商品 {item_name} 的库存失败：库存租约超时")
+            return False, "购买失败，金币已退还，请稍后再试"
+        await economy_ledger.commit()
         # 更新任务进度
         await self.task.update_task_progress(event, user_id, "shop_count", quantity)
         await self.task.update_task_progress(event, user_id, "interaction_count", 1)
@@ -515,8 +449,6 @@ class Shop:
         from_user_id = str(event.get_sender_id())
         if from_user_id == to_user_id:
             return False, "不能赠送物品给自己"
-        from_file_path = self.backpack_path / f"{from_user_id}.json"
-        to_file_path = self.backpack_path / f"{to_user_id}.json"
         from_backpack = await self.get_user_backpack(from_user_id)
         to_backpack = await self.get_user_backpack(to_user_id)
 
@@ -531,43 +463,68 @@ class Shop:
         # 增加接收者物品
         to_backpack[item_name] = to_backpack.get(item_name, 0) + amount
 
-        await write_json(from_file_path, from_backpack)
-        await write_json(to_file_path, to_backpack)
+        await save_user_backpack(from_user_id, from_backpack)
+        await save_user_backpack(to_user_id, to_backpack)
         return True, f"成功给用户{to_user_id}：\n赠送{item_name} x {amount}"
 
     async def format_shop_items(self) -> str:
-        """格式化商店物品列表为展示文本"""
+        """格式化商店物品列表为展示文本（按目录与库存版本缓存）"""
         try:
+            stock_ledger.ensure_fresh()
+            key = (shop_catalog.version, stock_ledger.version)
+            if self._shop_view is not None and self._shop_view[0] == key:
+                return self._shop_view[1]
             items = await self.get_shop_items()
             if not items:
                 return "商店暂无商品"
-            message = "📦 虚空商城\n"
+            lines = ["📦 虚空商城"]
             for item_name, item in items.items():
-                stock = "无限" if item["stock"] == -1 else item["stock"]
-                message += f"[{item['id']}] {item_name}：{item['price']}金币\n"
-                message += f"描述: {item['description']}\n(库存: {stock})\n"
+                available = stock_ledger.available(item_name)
+                stock = "无限" if available == -1 else available
+                lines.append(f"[{item['id']}] {item_name}：{item['price']}金币")
+                lines.append(f"描述: {item['description']}\n(库存: {stock})")
+            message = "\n".join(lines) + "\n"
+            self._shop_view = (key, message)
             return message
         except Exception as e:
             logger.error(f"格式化商店物品失败: {str(e)}")
             return "获取商店物品失败，请稍后再试~"
 
     async def format_backpack(self, event: AiocqhttpMessageEvent) -> str:
-        """格式化用户背包为展示文本"""
+        """格式化用户背包为展示文本（按用户背包版本缓存）"""
         try:
-            user_backpack = await self.get_user_backpack(event.get_sender_id())
+            user_id = str(event.get_sender_id())
+            # 读取前记录版本号，读取期间若背包被修改，缓存会在下次查看时失效
+            key = (get_backpack_version(user_id), shop_catalog.version)
+            cached = self._backpack_views.get(user_id)
+            if cached is not None and cached[0] == key:
+                self._backpack_views.move_to_end(user_id)
+                return cached[1]
+
+            user_backpack = await self.get_user_backpack(user_id)
             if not user_backpack:
-                return "你的背包是空的，快去商城购买道具吧！"
-
-            message = "🎒 我的背包 🎒\n━━━━━━━━━━━━━\n"
-            for item_name, count in user_backpack.items():
-                target_item = await self.get_item_detail(item_name)
-                if target_item:
-                    rarity_emoji = TextFormatter.get_rarity_emoji(target_item["rarity"])
-                    message += f"{rarity_emoji} [{target_item['name']}] x {count}\n"
-                    message += f"📝 {target_item['description']}\n"
-                    message += "━━━━━━━━━━━━━\n"
-            message += "💡 使用 “#使用道具 物品名称” 来使用道具\n"
-            message += "💡 使用 “#赠送道具 物品名称 @用户/qq号” 来赠送道具"
+                message = "你的背包是空的，快去商城购买道具吧！"
+            else:
+                parts = ["🎒 我的背包 🎒\n━━━━━━━━━━━━━\n"]
+                for item_name, count in user_backpack.items():
+                    target_item = shop_catalog.get(item_name)
+                    if target_item:
+                        rarity_emoji = TextFormatter.get_rarity_emoji(
+                            target_item["rarity"]
+                        )
+                        parts.append(
+                            f"{rarity_emoji} [{target_item['name']}] x {count}\n"
+                            f"📝 {target_item['description']}\n"
+                            "━━━━━━━━━━━━━\n"
+                        )
+                parts.append("💡 使用 “#使用道具 物品名称” 来使用道具\n")
+                parts.append("💡 使用 “#赠送道具 物品名称 @用户/qq号” 来赠送道具")
+                message = "".join(parts)
+
+            self._backpack_views[user_id] = (key, message)
+            self._backpack_views.move_to_end(user_id)
+            while len(self._backpack_views) > BACKPACK_VIEW_CACHE_SIZE:
+                self._backpack_views.popitem(last=False)
             return message
         except Exception as e:
             logger.error(f"格式化背包失败: {str(e)}")
@@ -576,8 +533,8 @@ class Shop:
     async def refresh_shop_manually(self) -> str:
         """管理员手动刷新商店"""
         try:
-            shop_data = self.default_shop
-            await write_json(self.shop_data_path, shop_data)
+            async with lease_manager.hold((), resources=("shop_stock",)):
+                stock_ledger.restock()
             return "🔄 商城已手动刷新！"
         except Exception as e:
             logger.error(f"手动刷新商店失败: {str(e)}")
@@ -601,7 +558,8 @@ class Shop:
             }
             rarity_emoji = TextFormatter.get_rarity_emoji(item["rarity"])
             rarity_name = rarity_map.get(item["rarity"].lower(), "未知")
-            stock_text = "无限" if item["stock"] == -1 else str(item["stock"])
+            available = stock_ledger.available(item_name)
+            stock_text = "无限" if available == -1 else str(available)
             detail_msg = [
                 f"{rarity_emoji} {item['name']}",
                 "━━━━━━━━━━━━━",
@@ -626,7 +584,9 @@ class Shop:
             # message.append(Comp.Plain("：\n测试换行\n测试成功！"))
             # await event.send(event.chain_result(message))
             message = str(self.config_path)
-            await event.send(event.plain_result(message))
+            await api_queue.send(event, event.plain_result(message))
         except Exception as e:
             logger.error(f"测试用例执行失败: {str(e)}")
-            await event.send("测试用例执行失败，请稍后再试~")
+            await api_queue.send(
+                event, event.plain_result("测试用例执行失败，请稍后再试~")
+            )
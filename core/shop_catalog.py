@@ -0,0 +1,293 @@
+import asyncio
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Dict, Iterator, Mapping, Optional, Tuple
+
+from astrbot.api import logger
+
+from ..utils.io_executor import io_executor
+from ..utils.leases import RESOURCE_SHARDS, LeaseTimeout, lease_manager
+from ..utils.scheduler import date_to_day_epoch, period_clock
+from ..utils.utils import PLUGIN_DATA_DIR, BatchedJsonStore, read_json, read_json_sync
+
+# 商品目录文件（运营方可自定义商品），其中的 items 为商品定义
+CATALOG_FILE = Path(__file__).resolve().parent.parent / "data" / "shop_data.json"
+
+# 目录文件缺失或没有商品时使用的内置商品定义（库存字段为每日刷新后的初始库存，-1表示无限库存）
+DEFAULT_SHOP_ITEMS = {
+    "爱心巧克力": {
+        "id": 1,
+        "name": "爱心巧克力",
+        "description": "增加与伴侣的好感度 +200",
+        "price": 500,
+        "type": "consumable",
+        "effect": {"love": 200},
+        "rarity": "common",
+        "stock": -1,  # -1表示无限库存
+    },
+    "幸运符": {
+        "id": 2,
+        "name": "幸运符",
+        "description": "提高娶伴侣成功率 +20%（持续3次使用）",
+        "price": 1000,
+        "type": "buff",
+        "effect": {"luck_boost": 20, "luck_streak": 3},
+        "rarity": "rare",
+        "stock": 10,
+    },
+    "金币袋": {
+        "id": 3,
+        "name": "金币袋",
+        "description": "直接获得1000-3000金币",
+        "price": 800,
+        "type": "consumable",
+        "effect": {"money_min": 1000, "money_max": 3000},
+        "rarity": "common",
+        "stock": -1,
+    },
+    "冷却重置卡": {
+        "id": 4,
+        "name": "冷却重置卡",
+        "description": "重置所有技能冷却时间",
+        "price": 1500,
+        "type": "consumable",
+        "effect": {"reset_cooldown": True},
+        "rarity": "epic",
+        "stock": 5,
+    },
+    "保护符": {
+        "id": 5,
+        "name": "保护符",
+        "description": "免疫一次抢伴侣失败的惩罚",
+        "price": 2000,
+        "type": "consumable",
+        "effect": {"protection": True, "imm_num": 1},
+        "rarity": "epic",
+        "stock": 3,
+    },
+    "双倍经验卡": {
+        "id": 6,
+        "name": "双倍经验卡",
+        "description": "打工收入翻倍（持续5次）",
+        "price": 1200,
+        "type": "buff",
+        "effect": {"work_boost": 2, "dbl_exp_num": 5},
+        "rarity": "rare",
+        "stock": 8,
+    },
+    "神秘礼盒": {
+        "id": 7,
+        "name": "神秘礼盒",
+        "description": "随机获得一个道具",
+        "price": 2500,
+        "type": "mystery",
+        "effect": {"mystery_box": True},
+        "rarity": "legendary",
+        "stock": 2,
+    },
+}
+
+
+def _freeze(value: Any) -> Any:
+    """递归地把dict/list转换为只读的MappingProxyType/tuple"""
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+class ShopCatalog:
+    """
+    商品目录（只读）\n
+    从商品目录文件加载时编译一次，各子系统共享同一份，任何修改都会抛出TypeError
+    """
+
+    def __init__(self, file_path: Optional[Path] = None):
+        self.file_path = file_path or CATALOG_FILE
+        self._items: Mapping[str, Mapping[str, Any]] = MappingProxyType({})
+        # 商品id（字符串）到商品的索引
+        self._by_id: Mapping[str, Mapping[str, Any]] = MappingProxyType({})
+        self._loaded = False
+        # 目录版本号，目录内容变化时递增（用于展示缓存失效）
+        self.version = 0
+
+    def _read(self) -> Dict[str, Any]:
+        """读取商品目录文件中的商品定义，文件缺失或没有商品时使用内置商品"""
+        data = read_json_sync(self.file_path)
+        items = data.get("items") if isinstance(data, dict) else None
+        if not isinstance(items, dict) or not items:
+            logger.warning(
+                f"商品目录文件 {self.file_path} 缺失或没有商品，使用内置商品"
+            )
+            return DEFAULT_SHOP_ITEMS
+        return items
+
+    def _install(self, items: Dict[str, Dict[str, Any]]) -> None:
+        self._loaded = True
+        self._items = _freeze(items)
+        self._by_id = MappingProxyType(
+            {str(item["id"]): item for item in self._items.values() if "id" in item}
+        )
+        self.version += 1
+        logger.info(f"商品目录已加载: {len(self._items)}件商品")
+
+    async def load(self) -> None:
+        """在读写线程池中读取商品目录文件（在插件initialize中调用）"""
+        if self._loaded:
+            return
+        items = await asyncio.get_running_loop().run_in_executor(
+            io_executor, self._read
+        )
+        if not self._loaded:
+            self._install(items)
+
+    def _ensure_loaded(self) -> None:
+        """未经load()加载时（如离线工具中）在首次使用时同步加载"""
+        if not self._loaded:
+            self._install(self._read())
+
+    @property
+    def items(self) -> Mapping[str, Mapping[str, Any]]:
+        self._ensure_loaded()
+        return self._items
+
+    def get(self, item_name: str) -> Optional[Mapping[str, Any]]:
+        """按名称获取商品"""
+        return self.items.get(item_name)
+
+    def get_by_id(self, item_id: Any) -> Optional[Mapping[str, Any]]:
+        """按商品id获取商品"""
+        self._ensure_loaded()
+        return self._by_id.get(str(item_id))
+
+    def initial_stock(self, item_name: str) -> int:
+        """每日刷新后的初始库存，-1表示无限"""
+        item = self.items.get(item_name)
+        return item.get("stock", -1) if item else 0
+
+    def __contains__(self, item_name: str) -> bool:
+        return item_name in self.items
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.items)
+
+
+class StockLedger:
+    """
+    商品库存账本\n
+    - 只记录有限库存商品的当前余量与刷新日期，与商品目录分离\n
+    - take()在同一次同步调用中完成“检查并扣减”，并发购买不会超卖\n
+    - 修改后合并延迟写入 shop_stock.json，不再重写整个商品文件\n
+    - 多实例时修改库存前持有库存专用分片的租约，从其他进程接手时重新读取库存文件
+    """
+
+    def __init__(self, catalog: ShopCatalog, file_path=None):
+        self.catalog = catalog
+        self.file_path = file_path or PLUGIN_DATA_DIR / "shop_stock.json"
+        # {商品名称: 剩余库存}（无限库存商品不记录）
+        self._stock: Dict[str, int] = {}
+        self._last_refresh = ""
+        # 上次补货的日序号
+        self._day_epoch: Optional[int] = None
+        self._loaded = False
+        # 库存版本号，每次库存变化时递增（用于展示缓存失效）
+        self.version = 0
+        self._store = BatchedJsonStore(self.file_path, self._dump)
+
+    def _dump(self) -> Dict[str, Any]:
+        return {"last_refresh": self._last_refresh, "stock": self._stock}
+
+    def _install(self, data: Dict[str, Any]) -> None:
+        self._loaded = True
+        self._last_refresh = data.get("last_refresh", "")
+        self._day_epoch = date_to_day_epoch(self._last_refresh)
+        stock = data.get("stock", {})
+        self._stock = {
+            name: int(stock.get(name, self.catalog.initial_stock(name)))
+            for name in self.catalog
+            if self.catalog.initial_stock(name) != -1
+        }
+        self.version += 1
+
+    async def load(self) -> None:
+        """在读写线程池中读取商品目录与库存文件（在插件initialize中调用，避免首次购买在事件循环中读文件）"""
+        await self.catalog.load()
+        if self._loaded:
+            return
+        data = await read_json(self.file_path)
+        if not self._loaded:
+            self._install(data)
+
+    def ensure_fresh(self) -> None:
+        """未经load()加载时（如离线工具中）同步读取库存文件，跨日时自动补货（后台调度器会在零点主动补货）"""
+        if not self._loaded:
+            self._install(read_json_sync(self.file_path))
+        if self._day_epoch != period_clock.day_epoch:
+            self.restock()
+
+    async def on_transfer(self, shard: int) -> None:
+        """租约接手回调：库存分片上一个持有者是其他进程时，重新读取其写入的库存文件"""
+        if shard == RESOURCE_SHARDS["shop_stock"]:
+            self._install(await read_json(self.file_path))
+
+    async def daily_restock(self) -> None:
+        """零点补货（多实例时持有库存租约，其他进程今天已补过货则不再重复补货）"""
+        try:
+            async with lease_manager.hold((), resources=("shop_stock",)):
+                self.ensure_fresh()
+        except LeaseTimeout as e:
+            logger.warning(f"商城补货失败: {str(e)}")
+
+    def restock(self) -> None:
+        """把所有有限库存商品恢复到初始库存"""
+        self._loaded = True
+        self._day_epoch = period_clock.day_epoch
+        self._last_refresh = period_clock.today_str
+        self._stock = {
+            name: self.catalog.initial_stock(name)
+            for name in self.catalog
+            if self.catalog.initial_stock(name) != -1
+        }
+        self.version += 1
+        self._store.mark_dirty()
+        logger.info("商城库存已刷新")
+
+    def available(self, item_name: str) -> int:
+        """当前库存，-1表示无限，不存在的商品返回0"""
+        self.ensure_fresh()
+        if item_name not in self.catalog:
+            return 0
+        return self._stock.get(item_name, -1)
+
+    def take(self, item_name: str, quantity: int) -> Tuple[bool, int]:
+        """
+        库存充足时扣减quantity个\n
+        返回(是否成功, 扣减后的库存/失败时的当前库存)，无限库存商品始终成功并返回-1
+        """
+        current = self.available(item_name)
+        if current == -1:
+            return True, -1
+        if current < quantity:
+            return False, current
+        self._stock[item_name] = current - quantity
+        self.version += 1
+        self._store.mark_dirty()
+        return True, current - quantity
+
+    def give_back(self, item_name: str, quantity: int) -> None:
+        """归还已扣减的库存（购买未完成时调用）"""
+        if item_name not in self._stock:
+            return
+        self._stock[item_name] += quantity
+        self.version += 1
+        self._store.mark_dirty()
+
+    async def flush(self) -> None:
+        """立即写入未保存的库存"""
+        await self._store.flush()
+
+
+# 全局商品目录与库存账本：商店、抽奖、合成系统共享
+shop_catalog = ShopCatalog()
+stock_ledger = StockLedger(shop_catalog)
@@ -15,7 +15,10 @@ from astrbot.core.platform.sources.aiocqhttp.aiocqhttp_message_event import (
     AiocqhttpMessageEvent,
 )
 
+from ..utils.data_layout import user_path
+from ..utils.file_index import file_index
 from ..utils.text_formatter import TextFormatter
+from ..utils.tracing import traced
 from ..utils.utils import (
     get_at_ids,
     read_json,
@@ -23,6 +26,7 @@ from ..utils.utils import (
     write_json,
     write_json_sync,
 )
+from .shop_catalog import shop_catalog
 from .task import Task
 
 
@@ -32,7 +36,6 @@ class Synthesis:
         PLUGIN_DATA_DIR = Path(StarTools.get_data_dir("astrbot_plugin_akasha_terminal"))
         self.data_dir = Path(__file__).resolve().parent.parent / "data"
         self.synthesis_recipes_path = self.data_dir / "synthesis_recipes.json"
-        self.shop_data_path = self.data_dir / "shop_data.json"
         self.user_workshop_path = PLUGIN_DATA_DIR / "user_workshop"
         self.user_inventory_path = PLUGIN_DATA_DIR / "user_inventory"
         # 内存缓存（用于 Redis 不可用时的冷却等短期存储）
@@ -196,20 +199,15 @@ class Synthesis:
         recipes = await self.load_json_data(self.synthesis_recipes_path, {})
         return recipes
 
-    async def get_shop_data(self) -> Dict[str, Any]:
-        """获取商店数据"""
-        shop_data = await self.load_json_data(self.shop_data_path, {})
-        return shop_data
-
     async def get_user_workshop(self, user_id: str, group_id: str) -> Dict[str, Any]:
         """获取用户工坊数据"""
-        file_path = self.user_workshop_path / f"{user_id}_{group_id}.json"
+        file_path = await user_path(self.user_workshop_path, user_id, group_id)
         workshop = await self.load_json_data(file_path, {})
         return workshop
 
     async def get_user_inventory(self, user_id: str, group_id: str) -> Dict[str, int]:
         """获取用户库存数据"""
-        file_path = self.user_inventory_path / f"{user_id}_{group_id}.json"
+        file_path = await user_path(self.user_inventory_path, user_id, group_id)
         inventory = await self.load_json_data(file_path, {})
         return inventory
 
@@ -268,16 +266,14 @@ class Synthesis:
             if not materials or not isinstance(materials, dict):
                 return (False, f"❌ 配方 {item_name} 的材料数据异常！")
 
-            shop_data = await self.get_shop_data()
             missing_materials = []
 
             for item_id, need_count in materials.items():
                 have_count = inventory.get(item_id, 0)
                 if have_count < need_count:
+                    shop_item = shop_catalog.get_by_id(item_id)
                     item_display_name = (
-                        shop_data.get("items", {})
-                        .get(item_id, {})
-                        .get("name", f"道具{item_id}")
+                        shop_item["name"] if shop_item else f"道具{item_id}"
                     )
                     missing_materials.append(
                         f"{item_display_name} (需要{need_count}个，拥有{have_count}个)"
@@ -331,6 +327,7 @@ class Synthesis:
 
         return None
 
+    @traced()
     async def execute_synthesis(
         self,
         user_id: str,
@@ -424,9 +421,10 @@ class Synthesis:
             return default
 
     async def save_user_workshop(self, user_id: str, group_id: str, data: dict) -> bool:
-        file_path = self.user_workshop_path / f"{user_id}_{group_id}.json"
+        file_path = await user_path(self.user_workshop_path, user_id, group_id)
         try:
             await write_json(file_path, data)
+            file_index.add(user_id, file_path)
             return True
         except Exception as e:
             logger.error(f"保存工坊数据失败: {e}")
@@ -435,9 +433,10 @@ class Synthesis:
     async def save_user_inventory(
         self, user_id: str, group_id: str, data: dict
     ) -> bool:
-        file_path = self.user_inventory_path / f"{user_id}_{group_id}.json"
+        file_path = await user_path(self.user_inventory_path, user_id, group_id)
         try:
             await write_json(file_path, data)
+            file_index.add(user_id, file_path)
             return True
         except Exception as e:
             logger.error(f"保存背包数据失败: {e}")
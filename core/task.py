@@ -1,6 +1,6 @@
 import math
 import random
-from datetime import datetime, timedelta
+from bisect import bisect_right
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple, Union
 from zoneinfo import ZoneInfo
@@ -13,12 +13,80 @@ from astrbot.core.platform.sources.aiocqhttp.aiocqhttp_message_event import (
     AiocqhttpMessageEvent,
 )
 
+from ..utils.api_queue import api_queue
+from ..utils.data_layout import user_path
+from ..utils.scheduler import date_to_day_epoch, day_to_week_epoch, period_clock
+from ..utils.tracing import traced
 from ..utils.utils import (
     get_nickname,
     get_user_data_and_backpack,
     read_json,
-    write_json,
+    save_user_backpack,
+    save_user_data,
 )
+from .ledger import economy_ledger
+
+# 用户任务类别与 task.json 中任务定义分组的对应关系
+TASK_CATEGORIES = {
+    "daily": "daily_tasks",
+    "weekly": "weekly_tasks",
+    "special": "special_tasks",
+}
+
+
+class TaskIndex:
+    """任务定义索引：按(类别, 任务名称)、追踪键O(1)查找任务定义"""
+
+    def __init__(self, task_data: Dict[str, Any]):
+        self.data = task_data
+        # {(类别, 任务名称): 任务定义}，不同类别可能存在同名任务（如周常与特殊任务「社交达人」）
+        self.by_name: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        # {追踪键: [(类别, 任务定义), ...]}
+        self.by_track_key: Dict[str, List[Tuple[str, Dict[str, Any]]]] = {}
+        for category, data_key in TASK_CATEGORIES.items():
+            for task in task_data.get(data_key, {}).values():
+                self.by_name.setdefault((category, task["name"]), task)
+                track_key = task.get("track_key")
+                if track_key:
+                    self.by_track_key.setdefault(track_key, []).append((category, task))
+        # 成就定义，以及按统计指标预先排序的阈值表 {指标: ([阈值升序], [对应成就])}
+        self.achievements: List[Dict[str, Any]] = list(
+            task_data.get("achievements", [])
+        )
+        self.thresholds: Dict[str, Tuple[List[int], List[Dict[str, Any]]]] = {}
+        for ach in sorted(self.achievements, key=lambda a: a["target"]):
+            targets, achs = self.thresholds.setdefault(ach["metric"], ([], []))
+            targets.append(ach["target"])
+            achs.append(ach)
+
+    def find_user_task(
+        self, user_tasks: Dict[str, Any], task_name: str
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """在用户持有的任务类别中按名称查找(用户任务, 任务定义)，同名任务优先取可领取的一项"""
+        candidates = [
+            (user_tasks[category][task_name], self.by_name[(category, task_name)])
+            for category in TASK_CATEGORIES
+            if task_name in user_tasks.get(category, {})
+            and (category, task_name) in self.by_name
+        ]
+        for user_task, task in candidates:
+            if user_task.get("completed") and not user_task.get("claimed"):
+                return user_task, task
+        return candidates[0] if candidates else (None, None)
+
+    def crossed_achievements(
+        self, metric: str, old: int, new: int
+    ) -> List[Dict[str, Any]]:
+        """指标从old增长到new时跨过的成就（old < 阈值 <= new）"""
+        table = self.thresholds.get(metric)
+        if not table or new <= old:
+            return []
+        targets, achs = table
+        return achs[bisect_right(targets, old) : bisect_right(targets, new)]
+
+
+# 任务定义只在首次使用时加载一次，所有Task实例共享（只读）
+_task_index: Optional[TaskIndex] = None
 
 
 class Task:
@@ -50,67 +118,47 @@ class Task:
                 reward_texts += f"，{item_name}×{count}"
         return reward_texts
 
+    def _format_unlocked(self, unlocked: List[Dict[str, Any]]) -> str:
+        """格式化新解锁的成就提示（无则为空字符串）"""
+        if not unlocked:
+            return ""
+        return "\n" + "\n".join(
+            f"🏅 解锁成就「{ach['name']}」：{ach['description']}" for ach in unlocked
+        )
+
     def _status_of(self, state: Dict[str, Any]) -> str:
         """获取任务状态符号"""
         return (
             "✅" if state.get("claimed") else ("🎁" if state.get("completed") else "⏳")
         )
 
-    # 判断记录的数据和今天是否在同一周
-    def is_same_week(self, date_str: str) -> bool:
-        """判断给定日期是否在本周"""
-        date = datetime.strptime(date_str, "%Y-%m-%d").replace(tzinfo=self.CN_TIMEZONE)
-        today = datetime.now(self.CN_TIMEZONE)
-        return (
-            date.isocalendar()[1] == today.isocalendar()[1] and date.year == today.year
-        )
-
     def get_refresh_time(self) -> str:
         """获取每日任务刷新剩余时间（到明天零点）"""
-        now = datetime.now(self.CN_TIMEZONE)
-        # 计算明天零点
-        next_reset = datetime(
-            now.year, now.month, now.day, tzinfo=self.CN_TIMEZONE
-        ) + timedelta(days=1)
-        diff = next_reset - now
+        seconds = int(period_clock.seconds_until_next_day())
         # 格式化：小时+分钟
-        hours = diff.seconds // 3600
-        minutes = (diff.seconds % 3600) // 60
+        hours = seconds // 3600
+        minutes = (seconds % 3600) // 60
         return f"{hours}h {minutes}m"
 
     def get_weekly_refresh_time(self) -> str:
         """获取周常任务刷新剩余时间（到下周一零点）"""
-        now = datetime.now(self.CN_TIMEZONE)
-        current_weekday = now.weekday()  # 0=周一，6=周日
-        days_until_monday = (7 - current_weekday) % 7
-        # 计算下周一零点
-        next_reset = datetime(
-            now.year, now.month, now.day, tzinfo=self.CN_TIMEZONE
-        ) + timedelta(days=days_until_monday)
-        diff = next_reset - now
+        seconds = int(period_clock.seconds_until_next_week())
         # 格式化：天+小时（无天则只显示小时）
-        days, hours = diff.days, diff.seconds // 3600
+        days, hours = seconds // 86400, (seconds % 86400) // 3600
         return f"{days}d {hours}h" if days > 0 else f"{hours}h"
 
+    async def get_task_index(self) -> TaskIndex:
+        """获取任务定义索引（首次调用时加载task.json）"""
+        global _task_index
+        if _task_index is None:
+            task_data = await read_json(self.task_file)
+            _task_index = TaskIndex(task_data or {})
+        return _task_index
+
     async def get_task_data(self) -> Dict[str, Any]:
-        """获取任务数据，确保数据完整性"""
+        """获取任务定义数据（只读，请勿修改）"""
         try:
-            task_data = await read_json(self.task_file)
-            # 检查数据完整性
-            is_data_complete = task_data and task_data["system_initialized"]
-
-            # 如果数据不完整，尝试重新初始化
-            if not is_data_complete:
-                task_data = await read_json(self.task_file)
-                task_data["last_daily_refresh"] = datetime.now(
-                    self.CN_TIMEZONE
-                ).strftime("%Y-%m-%d")
-                task_data["last_weekly_refresh"] = datetime.now(
-                    self.CN_TIMEZONE
-                ).strftime("%Y-%m-%d")
-                task_data["system_initialized"] = True
-                await write_json(self.task_file, task_data)
-            return task_data
+            return (await self.get_task_index()).data
         except Exception as e:
             logger.error(f"获取任务数据失败: {str(e)}")
 
@@ -124,23 +172,17 @@ class Task:
         如果is_return_user_data为True，则返回(user_data["task"]、user_data)元组\n
         否则默认仅返回user_data["task"]
         """
-        if not (self.user_data_path / f"{user_id}.json").exists():
-            await event.send(
-                event.plain_result("你的信息不存在，请先进行一次签到来注册信息~")
+        if not (await user_path(self.user_data_path, user_id)).exists():
+            await api_queue.send(
+                event, event.plain_result("你的信息不存在，请先进行一次签到来注册信息~")
             )
             return
-        today = datetime.now(self.CN_TIMEZONE).strftime("%Y-%m-%d")
-        user_data = await read_json(self.user_data_path / f"{user_id}.json")
-        if (
-            not user_data["task"]["last_daily_refresh"]
-            or not user_data["task"]["last_weekly_refresh"]
-        ):
-            user_data["task"]["last_daily_refresh"] = today
-            user_data["task"]["last_weekly_refresh"] = today
-            await write_json(self.user_data_path / f"{user_id}.json", user_data)
+        user_data = await read_json(await user_path(self.user_data_path, user_id))
+        # 余额以经济账本为准
+        economy_ledger.attach(user_id, user_data)
 
         # 检查是否需要重置
-        new_data = await self.check_task_reset(user_id, user_data, today)
+        new_data = await self.check_task_reset(user_id, user_data)
         if new_data:
             user_data = new_data
 
@@ -153,97 +195,111 @@ class Task:
         self,
         user_id: str,
         user_data: Dict[str, Any],
-        today: str,
     ) -> Optional[Dict[str, Any]]:
         """检查并重置过期任务"""
-        reset = False
-        # 重置每日任务
-        if user_data["task"].get("last_daily_refresh") != today:
-            user_data["task"]["daily"] = {}
-            user_data["task"]["last_daily_refresh"] = today
-            reset = True
-
-        # 重置周常任务
-        if not self.is_same_week(user_data["task"].get("last_weekly_refresh")):
-            user_data["task"]["weekly"] = {}
-            user_data["task"]["last_weekly_refresh"] = today
-            reset = True
         # 保存更新后的任务数据
-        if reset:
-            await write_json(self.user_data_path / f"{user_id}.json", user_data)
+        if self.reset_expired_tasks(user_data):
+            await save_user_data(user_id, user_data)
             return user_data
         return None
 
-    async def get_completed_tasks(
-        self, user_task_data: Dict[str, Any]
-    ) -> Dict[str, int]:
-        """获取已完成任务统计"""
-        # 初始化变量为0
-        daily_completed = 0
-        weekly_completed = 0
-        special_completed = 0
-
-        # 统计每日任务已完成数量：收集所有任务的claimed状态，再求和
-        daily_tasks = user_task_data.get("daily", {}).values()
-        daily_completed = sum(1 for task in daily_tasks if task.get("claimed", False))
-
-        # 统计周常任务已完成数量
-        weekly_tasks = user_task_data.get("weekly", {}).values()
-        weekly_completed = sum(1 for task in weekly_tasks if task.get("claimed", False))
-
-        # 统计特殊任务已完成数量
-        special_tasks = user_task_data.get("special", {}).values()
-        special_completed = sum(
-            1 for task in special_tasks if task.get("claimed", False)
-        )
+    def reset_expired_tasks(self, user_data: Dict[str, Any]) -> bool:
+        """
+        在内存中重置过期的每日/周常任务，返回任务数据是否有变化（不写文件）\n
+        只比较整数周期；旧数据仅有日期字符串时换算一次周期号，空记录视为本期
+        """
+        task = user_data["task"]
+        day, week = period_clock.day_epoch, period_clock.week_epoch
+        changed = False
+
+        daily_epoch = task.get("daily_epoch")
+        if daily_epoch is None:
+            daily_epoch = date_to_day_epoch(task.get("last_daily_refresh")) or day
+            task["daily_epoch"] = daily_epoch
+            changed = True
+        weekly_epoch = task.get("weekly_epoch")
+        if weekly_epoch is None:
+            last_weekly = date_to_day_epoch(task.get("last_weekly_refresh"))
+            weekly_epoch = day_to_week_epoch(last_weekly) if last_weekly else week
+            task["weekly_epoch"] = weekly_epoch
+            changed = True
+
+        # 重置每日任务（同时保留日期字符串，便于人工查看数据文件）
+        if daily_epoch != day:
+            task["daily"] = {}
+            task["daily_epoch"] = day
+            task["last_daily_refresh"] = period_clock.today_str
+            changed = True
+        # 重置周常任务
+        if weekly_epoch != week:
+            task["weekly"] = {}
+            task["weekly_epoch"] = week
+            task["last_weekly_refresh"] = period_clock.today_str
+            changed = True
+        return changed
+
+    def _ensure_task_stats(
+        self, user_tasks: Dict[str, Any], index: TaskIndex
+    ) -> Dict[str, Any]:
+        """
+        获取用户的任务累计统计（不随每日/周常重置清空）\n
+        旧数据没有统计时，按现有的领取记录与任务点数补建一次
+        """
+        stats = user_tasks.get("stats")
+        if stats is None:
+            claimed = sum(
+                1
+                for category in TASK_CATEGORIES
+                for state in user_tasks.get(category, {}).values()
+                if state.get("claimed")
+            )
+            points = user_tasks.get("task_points", 0)
+            stats = {
+                "total_claimed": claimed,
+                "points_earned": points,
+                "achievements": [],
+            }
+            for metric in ("total_claimed", "points_earned"):
+                stats["achievements"] += [
+                    ach["id"]
+                    for ach in index.crossed_achievements(metric, 0, stats[metric])
+                ]
+            user_tasks["stats"] = stats
+        return stats
 
-        return {
-            "daily": daily_completed,
-            "weekly": weekly_completed,
-            "special": special_completed,
-            "total": daily_completed + weekly_completed + special_completed,
-        }
+    def _record_claim(
+        self, user_data: Dict[str, Any], index: TaskIndex, task_points: int
+    ) -> List[Dict[str, Any]]:
+        """领取一个任务后在内存中累加统计，返回本次新解锁的成就"""
+        stats = self._ensure_task_stats(user_data["task"], index)
+        unlocked = []
+        for metric, delta in (("total_claimed", 1), ("points_earned", task_points)):
+            old = stats.get(metric, 0)
+            stats[metric] = old + delta
+            for ach in index.crossed_achievements(metric, old, old + delta):
+                if ach["id"] not in stats["achievements"]:
+                    stats["achievements"].append(ach["id"])
+                    unlocked.append(ach)
+        return unlocked
 
     async def get_user_achievements(
         self, user_task_data: Dict[str, Any]
-    ) -> List[Dict[str, Any]]:
-        """获取用户成就"""
-        completed_tasks = await self.get_completed_tasks(user_task_data)
-
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """获取用户成就（成就定义见task.json的achievements），返回(成就列表, 累计统计)"""
+        index = await self.get_task_index()
+        stats = self._ensure_task_stats(user_task_data, index)
+        unlocked = set(stats["achievements"])
         return [
             {
-                "name": "任务新手",
-                "description": "完成第一个任务",
-                "target": 1,
-                "progress": min(1, completed_tasks["total"]),
-                "unlocked": completed_tasks["total"] >= 1,
-                "type": "count",
-            },
-            {
-                "name": "勤劳工作者",
-                "description": "完成10个任务",
-                "target": 10,
-                "progress": min(10, completed_tasks["total"]),
-                "unlocked": completed_tasks["total"] >= 10,
-                "type": "count",
-            },
-            {
-                "name": "任务大师",
-                "description": "完成50个任务",
-                "target": 50,
-                "progress": min(50, completed_tasks["total"]),
-                "unlocked": completed_tasks["total"] >= 50,
+                "name": ach["name"],
+                "description": ach["description"],
+                "target": ach["target"],
+                "progress": min(ach["target"], stats.get(ach["metric"], 0)),
+                "unlocked": ach["id"] in unlocked,
                 "type": "count",
-            },
-            {
-                "name": "点数收集者",
-                "description": "累计获得1000任务点数",
-                "target": 1000,
-                "progress": min(1000, user_task_data.get("task_points", 0)),
-                "unlocked": (user_task_data.get("task_points", 0) >= 1000),
-                "type": "count",
-            },
-        ], completed_tasks
+            }
+            for ach in index.achievements
+        ], stats
 
     async def format_user_tasks(self, event: AiocqhttpMessageEvent) -> str:
         """格式化用户任务信息"""
@@ -251,7 +307,7 @@ class Task:
         try:
             user_tasks = await self.get_user_tasks(event, user_id)
             task_data = await self.get_task_data()
-            achievements, completed_tasks = await self.get_user_achievements(user_tasks)
+            achievements, task_stats = await self.get_user_achievements(user_tasks)
 
             # 确保task_data有正确的结构
             daily_tasks = task_data.get("daily_tasks", {})
@@ -306,7 +362,7 @@ class Task:
                 "daily_tasks": [],
                 "weekly_tasks": [],
                 "special_tasks": [],
-                "completed_tasks": completed_tasks,
+                "completed_tasks": task_stats["total_claimed"],
                 "task_shop": [],
                 "achievements": [],
             }
@@ -358,7 +414,9 @@ class Task:
                 ]
             except Exception as e:
                 logger.error(f"格式化任务数据失败: {str(e)}")
-                await event.send(event.plain_result("处理任务数据时出错，请稍后重试"))
+                await api_queue.send(
+                    event, event.plain_result("处理任务数据时出错，请稍后重试")
+                )
                 return
 
             try:
@@ -383,8 +441,8 @@ class Task:
                 )
             except Exception as e:
                 logger.error(f"计算任务统计数据失败: {str(e)}")
-                await event.send(
-                    event.plain_result("计算任务统计数据时出错，请稍后重试")
+                await api_queue.send(
+                    event, event.plain_result("计算任务统计数据时出错，请稍后重试")
                 )
                 return
 
@@ -414,15 +472,19 @@ class Task:
                 message += f"🔄 每日任务刷新: {daily_refresh}\n"
                 message += f"🔄 周常任务刷新: {weekly_refresh}\n"
 
-                await event.send(event.plain_result(message))
+                await api_queue.send(event, event.plain_result(message))
                 return
             except Exception as e:
                 logger.error(f"构建任务消息失败: {str(e)}")
-                await event.send(event.plain_result("构建任务消息时出错，请稍后重试"))
+                await api_queue.send(
+                    event, event.plain_result("构建任务消息时出错，请稍后重试")
+                )
                 return
         except Exception as e:
             logger.error(f"获取用户任务失败: {str(e)}")
-            await event.send(event.plain_result("获取用户任务信息失败，请稍后重试"))
+            await api_queue.send(
+                event, event.plain_result("获取用户任务信息失败，请稍后重试")
+            )
             return
 
     async def format_user_daily_tasks(self, event: AiocqhttpMessageEvent):
@@ -458,11 +520,13 @@ class Task:
 
             # 显示刷新时间
             message += f"\n🔄 任务将在 {self.get_refresh_time()} 后刷新"
-            await event.send(event.plain_result(message))
+            await api_queue.send(event, event.plain_result(message))
 
         except Exception as e:
             logger.error(f"显示每日任务失败: {str(e)}")
-            await event.send(event.plain_result("每日任务暂时无法访问，请稍后再试"))
+            await api_queue.send(
+                event, event.plain_result("每日任务暂时无法访问，请稍后再试")
+            )
 
     async def format_user_weekly_tasks(self, event: AiocqhttpMessageEvent):
         """格式化用户周常任务信息"""
@@ -499,10 +563,12 @@ class Task:
 
             # 显示刷新时间
             message += f"\n🔄 任务将在 {self.get_weekly_refresh_time()} 后刷新"
-            await event.send(event.plain_result(message))
+            await api_queue.send(event, event.plain_result(message))
         except Exception as e:
             logger.error(f"显示周常任务失败: {str(e)}")
-            await event.send(event.plain_result("周常任务暂时无法访问，请稍后再试"))
+            await api_queue.send(
+                event, event.plain_result("周常任务暂时无法访问，请稍后再试")
+            )
 
     async def format_user_special_tasks(self, event: AiocqhttpMessageEvent):
         """格式化用户特殊任务信息"""
@@ -542,113 +608,115 @@ class Task:
                     message += f"   💡 使用 #领取奖励 {task['name']} 领取奖励\n"
 
                 message += "───────────────\n"
-            await event.send(event.plain_result(message))
+            await api_queue.send(event, event.plain_result(message))
 
         except Exception as e:
             logger.error(f"显示特殊任务失败: {str(e)}")
-            await event.send(event.plain_result("特殊任务暂时无法访问，请稍后再试"))
+            await api_queue.send(
+                event, event.plain_result("特殊任务暂时无法访问，请稍后再试")
+            )
+
+    def _grant_rewards(
+        self,
+        user_id: str,
+        user_data: Dict[str, Any],
+        backpack: Dict[str, Any],
+        rewards: Dict[str, Any],
+    ) -> str:
+        """在内存中发放一个任务的奖励（不写文件，余额变动记入经济账本），返回奖励描述文本"""
+        text = ""
+        # 金币奖励
+        if "money" in rewards:
+            economy_ledger.apply(user_id, "money", rewards["money"], "task", user_data)
+            text += f"💰 {rewards['money']} 金币\n"
+        # 好感度奖励
+        if "love" in rewards:
+            user_data["home"]["love"] = (
+                user_data["home"].get("love", 0) + rewards["love"]
+            )
+            text += f"❤️ {rewards['love']} 好感度\n"
+        # 道具奖励
+        if "items" in rewards:
+            for item_name, count in rewards["items"].items():
+                text += f"{item_name} ×{count}\n"
+                backpack[item_name] = backpack.get(item_name, 0) + count
+        # 任务点数奖励
+        if "task_points" in rewards:
+            economy_ledger.apply(
+                user_id, "task_points", rewards["task_points"], "task", user_data
+            )
+            text += f"🏆 {rewards['task_points']} 任务点数\n"
+        return text
 
     async def handle_claim_reward(self, event: AiocqhttpMessageEvent, parts: list[str]):
         """处理用户领取任务奖励请求"""
         user_id = str(event.get_sender_id())
         try:
             if not parts:
-                await event.send(
+                await api_queue.send(
+                    event,
                     event.plain_result(
                         "请指定要领取奖励的任务名称！\n使用方法: #领取奖励 [任务名称]"
-                    )
+                    ),
                 )
                 return
             task_name = parts[0]
             try:
-                user_tasks, user_data = await self.get_user_tasks(
+                result = await self.get_user_tasks(
                     event, user_id, is_return_user_data=True
                 )
-                backpack = await get_user_data_and_backpack(user_id, "user_backpack")
-                task_data = await self.get_task_data()
-
-                # 查找任务
-                task = None
-                task_type = None
-                user_task = None  # 初始化变量为None
-                found = False  # 标志位：是否找到任务
-
-                # 检查所有任务类型
-                task_type_mapping = {
-                    "daily_tasks": "daily",
-                    "weekly_tasks": "weekly",
-                    "special_tasks": "special",
-                }
-                # 检查所有任务类型（使用带_tasks的键访问访问task_data）
-                for task_data_key, task_type in task_type_mapping.items():
-                    # 遍历用户任务（用户任务的键是不带_tasks的，如"weekly"）
-                    for user_task_name, user_task in user_tasks.get(
-                        task_type, {}
-                    ).items():
-                        if user_task_name == task_name:
-                            # 从task_data中获取对应类型的任务定义（用带_tasks的键）
-                            for task_item in task_data.get(task_data_key, {}).values():
-                                if task_item["name"] == task_name:
-                                    task = task_item  # 找到对应任务定义
-                                    found = True  # 标记找到任务
-                                    break  # 跳出内层循环
-                            if found:
-                                break  # 跳出次内层循环
-                    if found:
-                        break  # 找到任务后跳出外层循环
+                if not result:
+                    return
+                user_tasks, user_data = result
+                index = await self.get_task_index()
 
+                # 在用户持有的任务类别中按名称查找任务定义
+                user_task, task = index.find_user_task(user_tasks, task_name)
                 if not user_task:
-                    await event.send(
-                        event.plain_result(f"你没有名为「{task_name}」的任务！")
+                    await api_queue.send(
+                        event, event.plain_result(f"你没有名为「{task_name}」的任务！")
                     )
                     return
                 if user_task["claimed"]:
-                    await event.send(
-                        event.plain_result(f"你已经领取过「{task_name}」的奖励！")
+                    await api_queue.send(
+                        event,
+                        event.plain_result(f"你已经领取过「{task_name}」的奖励！"),
                     )
                     return
                 if not user_task["completed"]:
-                    await event.send(
-                        event.plain_result(f"任务 {task_name} 尚未完成，无法领取奖励！")
+                    await api_queue.send(
+                        event,
+                        event.plain_result(
+                            f"任务 {task_name} 尚未完成，无法领取奖励！"
+                        ),
                     )
                     return
             except Exception as e:
                 logger.error(f"查找任务失败: {str(e)}")
-                await event.send(event.plain_result("查找任务失败，请稍后再试"))
+                await api_queue.send(
+                    event, event.plain_result("查找任务失败，请稍后再试")
+                )
                 return
 
             try:
-                # 处理奖励发放
-                rewards = ""
-                # 金币奖励
-                if "money" in task["rewards"]:
-                    user_data["home"]["money"] = (
-                        user_data["home"].get("money", 0) + task["rewards"]["money"]
-                    )
-                    rewards += f"💰 {task['rewards']['money']} 金币\n"
+                # 处理奖励发放并标记为已领取
+                backpack = await get_user_data_and_backpack(user_id, "user_backpack")
+                # 旧数据先按发放前的领取记录补建统计，避免本次领取被补建与累加重复计入
+                self._ensure_task_stats(user_tasks, index)
+                rewards = self._grant_rewards(
+                    user_id, user_data, backpack, task["rewards"]
+                )
+                user_task["claimed"] = True
+                unlocked = self._record_claim(
+                    user_data, index, task["rewards"].get("task_points", 0)
+                )
 
-                # 好感度奖励
-                if "love" in task["rewards"]:
-                    user_data["home"]["love"] = (
-                        user_data["home"].get("love", 0) + task["rewards"]["love"]
-                    )
-                    rewards += f"❤️ {task['rewards']['love']} 好感度\n"
-
-                # 道具奖励
-                if "items" in task["rewards"]:
-                    for item_name, count in task["rewards"]["items"].items():
-                        rewards += f"{item_name} ×{count}\n"
-                        backpack[item_name] = backpack.get(item_name, 0) + count
-
-                # 任务点数奖励
-                if "task_points" in task["rewards"]:
-                    user_tasks["task_points"] = (
-                        user_tasks.get("task_points", 0)
-                        + task["rewards"]["task_points"]
-                    )
-                    rewards += f"🏆 {task['rewards']['task_points']} 任务点数\n"
-                # 构建奖励消息
+                # 保存数据
+                await economy_ledger.commit()
+                await save_user_data(user_id, user_data)
+                await save_user_backpack(user_id, backpack)
 
+                # 构建奖励消息
                 message = [
                     Comp.At(qq=user_id),
                     Comp.Plain(
@@ -656,26 +724,99 @@ class Task:
                         f"📋 {task_name}\n"
                         "🎁 获得奖励:\n"
                         f"{rewards}\n"
-                        f"💰 当前金币: {user_data.get('money', 0)}\n"
+                        f"💰 当前金币: {user_data['home'].get('money', 0)}\n"
                         f"🏆 任务点数: {user_tasks.get('task_points', 0)}"
+                        + self._format_unlocked(unlocked)
                     ),
                 ]
-                await event.send(event.chain_result(message))
-
-                # 标记为已领取
-                user_data["task"][task_type][task["name"]]["claimed"] = True
-
-                # 保存数据
-                await write_json(self.user_data_path / f"{user_id}.json", user_data)
-                await write_json(self.backpack_path / f"{user_id}.json", backpack)
-
+                await api_queue.send(event, event.chain_result(message))
             except Exception as e:
                 logger.error(f"发放任务奖励失败: {str(e)}")
-                await event.send(event.plain_result("发放任务奖励失败，请稍后再试"))
+                await api_queue.send(
+                    event, event.plain_result("发放任务奖励失败，请稍后再试")
+                )
                 return
         except Exception as e:
             logger.error(f"领取奖励失败: {str(e)}")
-            await event.send(event.plain_result("领取奖励失败，请稍后再试"))
+            await api_queue.send(event, event.plain_result("领取奖励失败，请稍后再试"))
+
+    async def handle_claim_all_rewards(self, event: AiocqhttpMessageEvent):
+        """一键领取所有已完成未领取的每日/周常/特殊任务奖励（一次读取、一次写入、一条消息）"""
+        user_id = str(event.get_sender_id())
+        try:
+            result = await self.get_user_tasks(event, user_id, is_return_user_data=True)
+            if not result:
+                return
+            user_tasks, user_data = result
+            index = await self.get_task_index()
+
+            # 收集可领取的任务
+            claimable = []
+            for category in TASK_CATEGORIES:
+                for task_name, user_task in user_tasks.get(category, {}).items():
+                    if not user_task.get("completed") or user_task.get("claimed"):
+                        continue
+                    task = index.by_name.get((category, task_name))
+                    if task:
+                        claimable.append((user_task, task))
+            if not claimable:
+                await api_queue.send(
+                    event, event.plain_result("暂无可领取的任务奖励，继续努力吧~")
+                )
+                return
+
+            # 在内存中合并发放，最后统一写入
+            backpack = await get_user_data_and_backpack(user_id, "user_backpack")
+            total: Dict[str, Any] = {
+                "money": 0,
+                "love": 0,
+                "task_points": 0,
+                "items": {},
+            }
+            unlocked = []
+            # 旧数据先按发放前的领取记录补建统计，避免本次领取被补建与累加重复计入
+            self._ensure_task_stats(user_tasks, index)
+            for user_task, task in claimable:
+                rewards = task.get("rewards", {})
+                self._grant_rewards(user_id, user_data, backpack, rewards)
+                user_task["claimed"] = True
+                unlocked += self._record_claim(
+                    user_data, index, rewards.get("task_points", 0)
+                )
+                for key in ("money", "love", "task_points"):
+                    total[key] += rewards.get(key, 0)
+                for item_name, count in rewards.get("items", {}).items():
+                    total["items"][item_name] = total["items"].get(item_name, 0) + count
+
+            await economy_ledger.commit()
+            await save_user_data(user_id, user_data)
+            await save_user_backpack(user_id, backpack)
+
+            reward_lines = []
+            if total["money"]:
+                reward_lines.append(f"💰 {total['money']} 金币")
+            if total["love"]:
+                reward_lines.append(f"❤️ {total['love']} 好感度")
+            for item_name, count in total["items"].items():
+                reward_lines.append(f"{item_name} ×{count}")
+            if total["task_points"]:
+                reward_lines.append(f"🏆 {total['task_points']} 任务点数")
+            task_names = "、".join(task["name"] for _, task in claimable)
+            message = [
+                Comp.At(qq=user_id),
+                Comp.Plain(
+                    f"：\n🎉 一键领取成功！共{len(claimable)}个任务\n"
+                    f"📋 {task_names}\n"
+                    "🎁 获得奖励:\n" + "\n".join(reward_lines) + "\n\n"
+                    f"💰 当前金币: {user_data['home'].get('money', 0)}\n"
+                    f"🏆 任务点数: {user_tasks.get('task_points', 0)}"
+                    + self._format_unlocked(unlocked)
+                ),
+            ]
+            await api_queue.send(event, event.chain_result(message))
+        except Exception as e:
+            logger.error(f"一键领取奖励失败: {str(e)}")
+            await api_queue.send(event, event.plain_result("一键领取失败，请稍后再试"))
 
     async def format_task_shop_items(self, event: AiocqhttpMessageEvent):
         """格式化任务商店物品列表"""
@@ -705,10 +846,12 @@ class Task:
                         f"   ────────────────\n"
                     )
                 )
-            await event.send(event.chain_result(message))
+            await api_queue.send(event, event.chain_result(message))
         except Exception as e:
             logger.error(f"显示任务商店失败: {str(e)}")
-            await event.send(event.plain_result("任务商店暂时无法访问，请稍后再试"))
+            await api_queue.send(
+                event, event.plain_result("任务商店暂时无法访问，请稍后再试")
+            )
 
     async def handle_task_shop_purchase(
         self, event: AiocqhttpMessageEvent, parts: list[str]
@@ -717,10 +860,11 @@ class Task:
         user_id = str(event.get_sender_id())
         try:
             if not parts:
-                await event.send(
+                await api_queue.send(
+                    event,
                     event.plain_result(
                         "请指定要兑换的物品名称！\n使用方法: /虚空兑换 [物品名称]"
-                    )
+                    ),
                 )
                 return
 
@@ -730,13 +874,16 @@ class Task:
             if len(parts) >= 2 and parts[1].isdigit():
                 quantity = int(parts[1])
                 if quantity <= 0:
-                    await event.send(event.plain_result("兑换数量必须为正整数！"))
+                    await api_queue.send(
+                        event, event.plain_result("兑换数量必须为正整数！")
+                    )
                     return
             else:
-                await event.send(
+                await api_queue.send(
+                    event,
                     event.plain_result(
                         "请指定要兑换的物品数量！\n使用方法: /虚空兑换 [物品名称] [数量]"
-                    )
+                    ),
                 )
                 return
             try:
@@ -749,50 +896,71 @@ class Task:
                 item = task_shop.get(item_name, {})
 
                 if not item:
-                    await event.send(
-                        event.plain_result(f"任务商店中没有名为「{item_name}」的物品！")
+                    await api_queue.send(
+                        event,
+                        event.plain_result(
+                            f"任务商店中没有名为「{item_name}」的物品！"
+                        ),
                     )
                     return
 
                 price = item.get("task_point_price", 0)
-                if user_tasks.get("task_points", 0) < price * quantity:
-                    await event.send(
+                # 扣除任务点数（余额检查与扣减为同步操作，并发兑换不会透支）
+                paid, points = economy_ledger.apply(
+                    user_id,
+                    "task_points",
+                    -price * quantity,
+                    "tshop",
+                    user_data,
+                    require_funds=True,
+                )
+                if not paid:
+                    await api_queue.send(
+                        event,
                         event.plain_result(
-                            f"你的任务点数不足！需要 {price * quantity} 点，你只有 {user_tasks['task_points']} 点"
-                        )
+                            f"你的任务点数不足！需要 {price * quantity} 点，你只有 {points} 点"
+                        ),
                     )
                     return
             except Exception as e:
                 logger.error(f"查找商店物品失败: {str(e)}")
-                await event.send(event.plain_result("查找商店物品失败，请稍后再试"))
+                await api_queue.send(
+                    event, event.plain_result("查找商店物品失败，请稍后再试")
+                )
                 return
 
             try:
-                # 扣除任务点数
-                user_data["task"]["task_points"] -= price * quantity
-                # 添加物品到背包
+                # 添加物品到背包（先写背包再确认扣款）
                 backpack[item_name] = backpack.get(item_name, 0) + quantity
-
-                message = [
-                    Comp.At(qq=user_id),
-                    Comp.Plain(
-                        f"🛍️ 兑换成功！\n"
-                        f"🎁 你获得了: {item_name} × {quantity}\n"
-                        f"商品描述：{item['description']}\n"
-                        f"💎 消耗: {price} 任务点数\n"
-                        f"🏆 剩余任务点数: {user_tasks.get('task_points', 0)}"
-                    ),
-                ]
-                await write_json(self.user_data_path / f"{user_id}.json", user_data)
-                await write_json(self.backpack_path / f"{user_id}.json", backpack)
-                await event.send(event.chain_result(message))
+                if not await save_user_backpack(user_id, backpack):
+                    raise OSError(f"写入用户 {user_id} 的背包失败")
             except Exception as e:
                 logger.error(f"处理兑换失败: {str(e)}")
-                await event.send(event.plain_result("处理兑换失败，请稍后再试"))
+                # 物品未能到账，退还已扣除的任务点数
+                economy_ledger.apply(
+                    user_id, "task_points", price * quantity, "refund", user_data
+                )
+                await api_queue.send(
+                    event,
+                    event.plain_result("处理兑换失败，任务点数已退还，请稍后再试"),
+                )
                 return
+
+            message = [
+                Comp.At(qq=user_id),
+                Comp.Plain(
+                    f"🛍️ 兑换成功！\n"
+                    f"🎁 你获得了: {item_name} × {quantity}\n"
+                    f"商品描述：{item['description']}\n"
+                    f"💎 消耗: {price} 任务点数\n"
+                    f"🏆 剩余任务点数: {user_tasks.get('task_points', 0)}"
+                ),
+            ]
+            await economy_ledger.commit()
+            await api_queue.send(event, event.chain_result(message))
         except Exception as e:
             logger.error(f"兑换物品失败: {str(e)}")
-            await event.send(event.plain_result("兑换物品失败，请稍后再试"))
+            await api_queue.send(event, event.plain_result("兑换物品失败，请稍后再试"))
 
     async def handle_reset_tasks(self, event: AiocqhttpMessageEvent):
         """重置用户任务"""
@@ -803,19 +971,23 @@ class Task:
             user_tasks, user_data = await self.get_user_tasks(
                 event, user_id, is_return_user_data=True
             )
-            if user_data.get("money", 0) < refresh_cost:
-                await event.send(
+            paid, _ = economy_ledger.apply(
+                user_id, "money", -refresh_cost, "reset", user_data, require_funds=True
+            )
+            if not paid:
+                await api_queue.send(
+                    event,
                     event.plain_result(
                         f"刷新每日任务需要 {refresh_cost} 金币，你的金币不足"
-                    )
+                    ),
                 )
                 return
-            user_data["money"] -= refresh_cost
             # 重置每日任务
-            today = datetime.now(self.CN_TIMEZONE).strftime("%Y-%m-%d")
             user_data["task"]["daily"] = {}
-            user_data["task"]["last_daily_refresh"] = today
-            await write_json(self.user_data_path / f"{user_id}.json", user_data)
+            user_data["task"]["daily_epoch"] = period_clock.day_epoch
+            user_data["task"]["last_daily_refresh"] = period_clock.today_str
+            await economy_ledger.commit()
+            await save_user_data(user_id, user_data)
 
             message = [
                 Comp.at(qq=user_id),
@@ -827,12 +999,15 @@ class Task:
                     "💡 使用 /任务列表 查看新任务"
                 ),
             ]
-            await event.send(event.chain_result(message))
+            await api_queue.send(event, event.chain_result(message))
         except Exception as e:
             logger.error(f"获取刷新冷却时间失败: {str(e)}")
-            await event.send(event.plain_result("获取刷新冷却时间失败，请稍后再试"))
+            await api_queue.send(
+                event, event.plain_result("获取刷新冷却时间失败，请稍后再试")
+            )
             return
 
+    @traced()
     async def update_task_progress(
         self,
         event: AiocqhttpMessageEvent,
@@ -855,48 +1030,55 @@ class Task:
                 event, user_id, is_return_user_data=True
             )
             task_data = await self.get_task_data()
-
-            # 确保task_data有正确的结构
-            tasks_categories = {
-                "daily": task_data.get("daily_tasks", {}),
-                "weekly": task_data.get("weekly_tasks", {}),
-                "special": task_data.get("special_tasks", {}),
-            }
-            updated = False
-            for task_category, tasks in tasks_categories.items():
-                for task_id, task in tasks.items():
-                    if track_key == task.get("track_key"):
-                        if task_category not in user_tasks:
-                            user_tasks[task_category] = {}
-                        if task["name"] not in user_tasks[task_category]:
-                            user_tasks[task_category][task["name"]] = {
-                                "progress": 0,
-                                "completed": False,
-                                "claimed": False,
-                            }
-
-                        user_task = user_tasks[task_category][task["name"]]
-                        if not user_task.get("completed"):
-                            if is_direct_set:
-                                # 直接设置进度值
-                                user_task["progress"] = value
-                            elif is_increment:
-                                # 增量更新
-                                user_task["progress"] += value
-                            else:
-                                # 设置为最大值（原逻辑）
-                                user_task["progress"] = max(
-                                    tasks[task_id].get("target", 0), value
-                                )
-
-                            if user_task["progress"] >= tasks[task_id].get(
-                                "target", float("inf")
-                            ):
-                                user_task["completed"] = True
-                            updated = True
-            user_data["task"] = user_tasks
+            updated = self.apply_task_progress(
+                user_data, task_data, track_key, value, is_increment, is_direct_set
+            )
             # 写回用户数据文件
-            await write_json(self.user_data_path / f"{user_id}.json", user_data)
+            await save_user_data(user_id, user_data)
             return updated
         except Exception as e:
             logger.error(f"更新用户 {user_id} 任务进度失败: {str(e)}")
+
+    def apply_task_progress(
+        self,
+        user_data: Dict[str, Any],
+        task_data: Dict[str, Any],
+        track_key: str,
+        value: int = 1,
+        is_increment: bool = True,
+        is_direct_set: bool = False,
+    ) -> bool:
+        """在内存中更新user_data的任务进度（不写文件），参数含义同update_task_progress"""
+        user_tasks = user_data["task"]
+        index = (
+            _task_index
+            if _task_index is not None and _task_index.data is task_data
+            else TaskIndex(task_data)
+        )
+        updated = False
+        for task_category, task in index.by_track_key.get(track_key, ()):
+            if task_category not in user_tasks:
+                user_tasks[task_category] = {}
+            if task["name"] not in user_tasks[task_category]:
+                user_tasks[task_category][task["name"]] = {
+                    "progress": 0,
+                    "completed": False,
+                    "claimed": False,
+                }
+
+            user_task = user_tasks[task_category][task["name"]]
+            if not user_task.get("completed"):
+                if is_direct_set:
+                    # 直接设置进度值
+                    user_task["progress"] = value
+                elif is_increment:
+                    # 增量更新
+                    user_task["progress"] += value
+                else:
+                    # 设置为最大值（原逻辑）
+                    user_task["progress"] = max(task.get("target", 0), value)
+
+                if user_task["progress"] >= task.get("target", float("inf")):
+                    user_task["completed"] = True
+                updated = True
+        return updated
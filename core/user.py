@@ -1,6 +1,9 @@
+import asyncio
+import json
+import os
 import time
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 from astrbot.api import logger
 from astrbot.api.star import StarTools
@@ -9,9 +12,40 @@ from astrbot.core.platform.sources.aiocqhttp.aiocqhttp_message_event import (
 )
 
 # 导入工具函数
-from ..utils.utils import get_at_ids, get_nickname, read_json, write_json
+from ..utils.data_layout import user_path
+from ..utils.file_index import file_index
+from ..utils.group_index import group_index
+from ..utils.user_index import SORT_KEYS, user_index
+from ..utils.utils import (
+    get_at_ids,
+    get_nickname,
+    invalidate_backpack,
+    iter_user_ids,
+    read_json,
+    read_json_sync,
+    save_user_data,
+)
+from .leaderboard import leaderboards
+from .ledger import ASSETS, economy_ledger
 from .task import Task
 
+# 用户列表每页显示的人数
+USER_LIST_PAGE_SIZE = 20
+# 删除/导出用户文件时同时进行的文件操作数
+FILE_OP_CONCURRENCY = 8
+
+
+def _unlink(path: Path) -> None:
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def _append_lines(path: Path, lines: List[str]) -> None:
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("".join(line + "\n" for line in lines))
+
 
 class User:
     def __init__(self):
@@ -89,14 +123,16 @@ class User:
             raise ValueError(f"不支持的数据类型: {data_type}")
 
         # 所有数据都存储在用户id的独立文件中
-        file_path = self.user_data_path / f"{user_id}.json"
+        file_path = await user_path(self.user_data_path, user_id)
         user_data = await read_json(file_path) or {}
 
         # 初始化该类型数据（如果不存在）
         if data_type not in user_data:
             user_data[data_type] = config["default"](user_id)
-            await write_json(file_path, user_data)
+            await save_user_data(user_id, user_data)
 
+        # 余额以经济账本为准
+        economy_ledger.attach(user_id, user_data)
         return user_data[data_type]
 
     async def _update_data(
@@ -119,7 +155,7 @@ class User:
             raise ValueError(f"不支持的数据类型: {data_type}")
 
         try:
-            file_path = self.user_data_path / f"{user_id}.json"
+            file_path = await user_path(self.user_data_path, user_id)
             user_data = await read_json(file_path) or {}
 
             # 确保基础数据存在
@@ -128,7 +164,7 @@ class User:
 
             # 更新数据
             user_data[data_type].update(new_data)
-            return await write_json(file_path, user_data)
+            return await save_user_data(user_id, user_data)
         except Exception as e:
             logger.error(f"更新{data_type}数据失败: {str(e)}")
             return False
@@ -173,24 +209,154 @@ class User:
         return await self._update_data("task", user_id, data)
 
     async def delete_user(self, user_id: str) -> bool:
-        """删除用户所有数据"""
+        """删除用户所有数据（用户文件、背包、各群的工坊与库存，以及账本余额和各类索引）"""
+        deleted = await self.delete_users([user_id])
+        return bool(deleted)
+
+    async def delete_users(self, user_ids: Iterable[str]) -> List[str]:
+        """批量删除用户，文件删除的并发数不超过FILE_OP_CONCURRENCY，返回已删除的用户id"""
+        semaphore = asyncio.Semaphore(FILE_OP_CONCURRENCY)
+        results = await asyncio.gather(
+            *(self._delete_one(str(uid), semaphore) for uid in dict.fromkeys(user_ids))
+        )
+        deleted = [uid for uid in results if uid]
+        if deleted:
+            # 清零余额的流水一次性落盘
+            await economy_ledger.commit()
+        return deleted
+
+    async def _delete_one(
+        self, user_id: str, semaphore: asyncio.Semaphore
+    ) -> Optional[str]:
         try:
-            # 删除对应用户id文件
-            user_file = self.user_data_path / f"{user_id}.json"
-            if user_file.exists():
-                user_file.unlink()
-                logger.info(f"用户 {user_id} 数据已删除")
-                return True
-            logger.warning(f"用户 {user_id} 数据文件不存在")
-            return False
+            files = await file_index.files_of(user_id)
+            if not files:
+                logger.warning(f"用户 {user_id} 数据文件不存在")
+                return None
+            loop = asyncio.get_running_loop()
+
+            async def remove(path: Path) -> None:
+                async with semaphore:
+                    await loop.run_in_executor(None, _unlink, path)
+
+            await asyncio.gather(*(remove(path) for path in files))
+            file_index.forget(user_id)
+            invalidate_backpack(user_id)
+            # 先清零账本余额，再移出排行榜（余额变动会回调更新排行榜）
+            for asset in ASSETS:
+                balance = economy_ledger.balance(user_id, asset)
+                if balance:
+                    economy_ledger.apply(user_id, asset, -balance, "delete")
+            user_index.remove(user_id)
+            leaderboards.remove_user(user_id)
+            group_index.remove_user(user_id)
+            logger.info(f"用户 {user_id} 数据已删除（{len(files)}个文件）")
+            return user_id
         except Exception as e:
             logger.error(f"删除用户 {user_id} 数据失败: {str(e)}")
-            return False
+            return None
+
+    async def export_users(self, user_ids: Iterable[str]) -> Tuple[Path, int]:
+        """
+        导出用户数据为NDJSON，每行一个文件：{"user_id", "file", "data"}，
+        另有一行账本余额：{"user_id", "ledger"}\n
+        读取并发数不超过FILE_OP_CONCURRENCY，同一用户的行连续写入；返回(导出文件, 导出用户数)
+        """
+        export_dir = self.data_dir / "exports"
+        export_dir.mkdir(parents=True, exist_ok=True)
+        export_file = export_dir / f"users_{time.strftime('%Y%m%d_%H%M%S')}.ndjson"
+        semaphore = asyncio.Semaphore(FILE_OP_CONCURRENCY)
+        write_lock = asyncio.Lock()
+        loop = asyncio.get_running_loop()
+
+        async def read(path: Path, uid: str) -> Optional[str]:
+            async with semaphore:
+                if not await loop.run_in_executor(None, os.path.exists, path):
+                    return None
+                data = await loop.run_in_executor(None, read_json_sync, path)
+            relative = path.relative_to(self.data_dir).as_posix()
+            return json.dumps(
+                {"user_id": uid, "file": relative, "data": data},
+                ensure_ascii=False,
+            )
+
+        async def export_one(uid: str) -> bool:
+            files = await file_index.files_of(uid)
+            if not files:
+                return False
+            lines = [
+                line
+                for line in await asyncio.gather(*(read(path, uid) for path in files))
+                if line
+            ]
+            ledger = {asset: economy_ledger.balance(uid, asset) for asset in ASSETS}
+            lines.append(
+                json.dumps({"user_id": uid, "ledger": ledger}, ensure_ascii=False)
+            )
+            async with write_lock:
+                await loop.run_in_executor(None, _append_lines, export_file, lines)
+            return True
+
+        exported = await asyncio.gather(
+            *(export_one(str(uid)) for uid in dict.fromkeys(user_ids))
+        )
+        return export_file, sum(exported)
+
+    def _resolve_targets(
+        self, event: AiocqhttpMessageEvent, parts: list[str]
+    ) -> Tuple[Optional[List[str]], str]:
+        """解析 @用户/qq号... 或 不活跃 天数，返回(用户id列表, 范围说明)，参数无效时列表为None"""
+        if parts and parts[0] == "不活跃":
+            if len(parts) < 2 or not parts[1].isdigit() or int(parts[1]) <= 0:
+                return None, ""
+            days = int(parts[1])
+            return self.inactive_users(days), f"超过{days}天未活跃的用户"
+        user_ids = get_at_ids(event) + [part for part in parts if part.isdigit()]
+        return list(dict.fromkeys(user_ids)) or None, "指定用户"
+
+    async def handle_delete_command(
+        self, event: AiocqhttpMessageEvent, parts: list[str]
+    ) -> str:
+        """处理 /删除用户 @用户/qq号... | 不活跃 天数"""
+        try:
+            user_ids, scope = self._resolve_targets(event, parts)
+            if user_ids is None:
+                return "使用方法: /删除用户 @用户/qq号...\n或：/删除用户 不活跃 天数"
+            if not user_ids:
+                return f"没有{scope}"
+            deleted = await self.delete_users(user_ids)
+            return f"已删除{scope} {len(deleted)}/{len(user_ids)} 人的全部数据"
+        except Exception as e:
+            logger.error(f"删除用户失败: {str(e)}")
+            return "删除用户失败，请稍后再试~"
+
+    async def handle_export_command(
+        self, event: AiocqhttpMessageEvent, parts: list[str]
+    ) -> str:
+        """处理 /导出用户 @用户/qq号... | 不活跃 天数"""
+        try:
+            user_ids, scope = self._resolve_targets(event, parts)
+            if user_ids is None:
+                return "使用方法: /导出用户 @用户/qq号...\n或：/导出用户 不活跃 天数"
+            if not user_ids:
+                return f"没有{scope}"
+            export_file, count = await self.export_users(user_ids)
+            if not count:
+                return "指定的用户没有可导出的数据"
+            return f"已导出{scope} {count} 人的数据到:\n{export_file}"
+        except Exception as e:
+            logger.error(f"导出用户数据失败: {str(e)}")
+            return "导出用户数据失败，请稍后再试~"
+
+    @staticmethod
+    def inactive_users(days: int) -> List[str]:
+        """超过days天未活跃的用户id"""
+        return user_index.inactive_since(time.time() - days * 86400)
 
     async def get_user_list(self) -> list[str]:
         """获取所有用户ID列表"""
         try:
-            return [f.stem for f in self.user_data_path.glob("*.json") if f.is_file()]
+            return list(iter_user_ids(self.user_data_path))
         except Exception as e:
             logger.error(f"获取用户列表失败: {str(e)}")
             return []
@@ -212,7 +378,7 @@ class User:
                 user_id = str(event.get_sender_id())
             nickname = await get_nickname(event, user_id)
             if user_id != str(event.get_sender_id()):
-                he_data = self.user_data_path / f"{user_id}.json"
+                he_data = await user_path(self.user_data_path, user_id)
                 if not he_data.exists():
                     return f"{nickname}还没有注册用户信息哦，请让他先进行一次签到来注册信息~"
             user_data = await self.get_user(user_id, nickname)
@@ -277,32 +443,48 @@ class User:
             if amount <= 0:
                 return False, "增加的金额必须为正整数"
 
-            home_data = await self.get_home_data(to_user_id)
-            home_data["money"] = home_data.get("money", 0) + amount
-            await self.update_home_data(to_user_id, home_data)
+            # 确保用户数据存在，并以文件中的余额初始化账本
+            await self.get_home_data(to_user_id)
+            _, balance = economy_ledger.apply(to_user_id, "money", amount, "admin")
+            await economy_ledger.commit()
             return (
                 True,
                 f"成功为用户{to_user_id}增加 {amount} 金钱\n"
-                f"当前金钱: {home_data['money']}",
+                f"当前金钱: {balance}",
             )
         except Exception as e:
             logger.error(f"增加用户金钱失败: {str(e)}")
             return False, "增加用户金钱失败，请稍后再试~"
 
-    async def get_all_users_info(self) -> str:
-        """获取所有用户详细信息列表"""
+    async def get_all_users_info(self, parts: list[str]) -> str:
+        """分页获取用户列表（读取用户索引，不逐个读取用户文件）\n
+        使用方法: /用户列表 [页码] [注册|活跃|昵称|id]"""
         try:
-            user_list = await self.get_user_list()
-            if not user_list:
-                return "暂无用户数据"
+            page = 1
+            sort = "注册"
+            for part in parts:
+                if part.isdigit():
+                    page = int(part)
+                elif part in SORT_KEYS:
+                    sort = part
+                else:
+                    return f"未知的排序方式「{part}」，可选: {'、'.join(SORT_KEYS)}"
 
-            message = "用户列表:\n"
-            for user_id in user_list:
-                user_data = await self.get_user(user_id)
-                nickname = user_data.get("nickname", "未设置")
-                message += f"- {nickname}：ID({user_id})\n"
+            entries, pages = user_index.page(page, USER_LIST_PAGE_SIZE, sort)
+            if not entries:
+                return "暂无用户数据"
 
-            return message
+            page = min(max(page, 1), pages)
+            message = f"用户列表（按{sort}排序，第{page}/{pages}页，共{len(user_index)}人）:\n"
+            for user_id, entry in entries:
+                nickname = entry.get("nickname") or "未设置"
+                active = time.strftime(
+                    "%Y-%m-%d", time.localtime(entry.get("last_active", 0))
+                )
+                message += f"- {nickname}：ID({user_id}) 最近活跃 {active}\n"
+            if page < pages:
+                message += f"发送 /用户列表 {page + 1} {sort} 查看下一页"
+            return message.rstrip("\n")
         except Exception as e:
             logger.error(f"获取所有用户信息失败: {str(e)}")
             return "获取用户列表失败，请稍后再试~"
@@ -1,3 +1,4 @@
+import asyncio
 import re
 import traceback
 from pathlib import Path
@@ -13,13 +14,32 @@ from astrbot.core.platform.sources.aiocqhttp.aiocqhttp_message_event import (
     AiocqhttpMessageEvent,
 )
 
+from .core.analytics import economy_analytics
 from .core.battle import Battle
+from .core.leaderboard import leaderboards
+from .core.ledger import economy_ledger
 from .core.lottery import Lottery
 from .core.shop import Shop
+from .core.shop_catalog import stock_ledger
 from .core.synthesis import Synthesis
 from .core.task import Task
 from .core.user import User
-from .utils.utils import get_cmd_info, logo_AATP
+from .utils.admission import admission_control
+from .utils.api_queue import api_queue
+from .utils.command_hooks import register_lease_users, tracked_command
+from .utils.config import config_service
+from .utils.data_layout import data_layout
+from .utils.file_index import file_index
+from .utils.group_index import group_index
+from .utils.leases import lease_manager
+from .utils.metrics import command_metrics
+from .utils.profiler import command_profiler
+from .utils.scheduler import period_clock
+from .utils.singleflight import single_flight
+from .utils.tracing import tracer
+from .utils.user_index import user_index
+from .utils.utils import get_cmd_info, invalidate_shard, logo_AATP
+from .utils.watchdog import loop_watchdog
 
 
 @register(
@@ -32,6 +52,8 @@ class AkashaTerminal(Star):
     def __init__(self, context: Context, config: AstrBotConfig):
         super().__init__(context)
         self.config = config
+        # 加载配置快照，各子系统从快照读取配置
+        config_service.load(config)
         # 读取抽卡冷却配置
         try:
             self.admins_id: list[str] = context.get_config().get("admins_id", [])
@@ -51,7 +73,7 @@ class AkashaTerminal(Star):
             # 合成系统
             self.synthesis = Synthesis()
             # 抽奖系统
-            self.lottery = Lottery(self.config)
+            self.lottery = Lottery()
             # 战斗系统
             self.battle = Battle()
             logger.info("Akasha Terminal插件初始化完成")
@@ -62,8 +84,43 @@ class AkashaTerminal(Star):
     async def initialize(self):
         """可选择实现异步的插件初始化方法，当实例化该插件类之后会自动调用该方法。"""
         logo_AATP()
+        # 在读写线程池中加载经济账本（快照与日志重放）、商品目录与库存，以及各索引（索引文件缺失时扫描用户目录重建）
+        await asyncio.gather(
+            economy_ledger.load(),
+            stock_ledger.load(),
+            user_index.load(),
+            group_index.load(),
+            file_index.load(),
+        )
+        # 零点补货商城库存；用户任务在访问时按周期号惰性重置
+        period_clock.on_day(stock_ledger.daily_restock)
+        # 每天零点写入一次经济账本快照
+        period_clock.on_day(economy_ledger.compact)
+        # 每天清理长期未出现的群成员
+        period_clock.on_day(group_index.prune)
+        period_clock.start()
+        # 后台把平铺的用户文件迁移到分层目录
+        data_layout.start()
+        # 后台从磁盘重建排行榜，前10名的任务进度由插件的任务系统更新
+        leaderboards.start(self.task)
+        # 事件循环延迟与读写线程池监控
+        loop_watchdog.start()
+        command_metrics.add_section(single_flight.format_summary)
+        command_metrics.add_section(admission_control.format_summary)
+        command_metrics.add_section(api_queue.format_summary)
+        # 多实例部署：从其他进程接手分片时重新读取账本并丢弃背包缓存，释放分片前落盘流水
+        lease_manager.on_transfer(economy_ledger.catch_up)
+        lease_manager.on_transfer(invalidate_shard)
+        lease_manager.before_release(economy_ledger.commit)
+        lease_manager.on_transfer(stock_ledger.on_transfer)
+        lease_manager.before_release(stock_ledger.flush)
+        # 锦标赛开赛时在命令入口一次性获取全部参赛者的租约
+        register_lease_users("tournament", self.battle.tournament_lease_users)
+        command_metrics.add_section(lease_manager.format_summary)
+        command_metrics.add_section(data_layout.format_summary)
 
     @filter.command("我的信息", alias={"个人信息", "查看信息"})
+    @tracked_command
     async def get_user_info(self, event: AiocqhttpMessageEvent):
         """查看个人信息，使用方法: /我的信息 @用户/qq号"""
         parts = await get_cmd_info(event)
@@ -72,6 +129,7 @@ class AkashaTerminal(Star):
 
     @filter.permission_type(filter.PermissionType.ADMIN)
     @filter.command("增加金钱", alias=["添加金钱", "加钱"])
+    @tracked_command
     async def add_user_money(self, event: AiocqhttpMessageEvent):
         """增加用户金钱，使用方法: /增加金钱 金额"""
         parts = await get_cmd_info(event)
@@ -80,37 +138,115 @@ class AkashaTerminal(Star):
 
     @filter.permission_type(filter.PermissionType.ADMIN)
     @filter.command("用户列表")
+    @tracked_command
     async def list_all_users(self, event: AiocqhttpMessageEvent):
-        """获取所有用户列表"""
-        message = await self.user.get_all_users_info()
+        """获取用户列表，使用方法: /用户列表 [页码] [注册|活跃|昵称|id]"""
+        parts = await get_cmd_info(event)
+        message = await self.user.get_all_users_info(parts)
+        yield event.plain_result(message)
+
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @filter.command("删除用户")
+    @tracked_command
+    async def delete_users(self, event: AiocqhttpMessageEvent):
+        """删除用户全部数据，使用方法: /删除用户 @用户/qq号... 或 /删除用户 不活跃 天数"""
+        parts = await get_cmd_info(event)
+        message = await self.user.handle_delete_command(event, parts)
+        yield event.plain_result(message)
+
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @filter.command("导出用户", alias={"导出用户数据"})
+    @tracked_command
+    async def export_users(self, event: AiocqhttpMessageEvent):
+        """导出用户数据为NDJSON，使用方法: /导出用户 @用户/qq号... 或 /导出用户 不活跃 天数"""
+        parts = await get_cmd_info(event)
+        message = await self.user.handle_export_command(event, parts)
+        yield event.plain_result(message)
+
+    @filter.command("排行榜", alias={"排名", "富豪榜"})
+    @tracked_command
+    async def leaderboard(self, event: AiocqhttpMessageEvent):
+        """查看排行榜，使用方法: /排行榜 [金币|好感度|武器|任务点数] [本群]"""
+        parts = await get_cmd_info(event)
+        message = await leaderboards.handle_rank_command(event, parts)
         yield event.plain_result(message)
 
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @filter.command("经济统计", alias={"经济报告"})
+    @tracked_command
+    async def economy_report(self, event: AiocqhttpMessageEvent):
+        """查看全服经济统计，使用方法: /经济统计 [刷新]"""
+        parts = await get_cmd_info(event)
+        message = await economy_analytics.format_report(force="刷新" in parts)
+        yield event.plain_result(message)
+
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @filter.command("性能统计")
+    @tracked_command
+    async def performance_report(self, event: AiocqhttpMessageEvent):
+        """查看命令耗时统计，使用方法: /性能统计 [1|5|15|60] | 开启 | 关闭 | 重置"""
+        parts = await get_cmd_info(event)
+        yield event.plain_result(command_metrics.handle_command(parts))
+
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @filter.command("性能剖析")
+    @tracked_command
+    async def profile_command(self, event: AiocqhttpMessageEvent):
+        """剖析某个命令接下来的N次调用，使用方法: /性能剖析 <命令> [次数] | 状态 | 停止"""
+        parts = await get_cmd_info(event)
+        yield event.plain_result(command_profiler.handle_command(event, parts))
+
     async def terminate(self):
         """可选择实现异步的插件销毁方法，当插件被卸载/停用时会调用。"""
+        await period_clock.stop()
+        await loop_watchdog.stop()
+        await data_layout.stop()
+        await api_queue.close()
+        await economy_analytics.close()
+        await config_service.flush()
+        # 库存与索引在多实例时写入前需要持有租约，先于释放租约写入
+        await stock_ledger.flush()
+        await user_index.flush()
+        await group_index.flush()
+        await file_index.flush()
+        await lease_manager.close()
+        await economy_ledger.close()
+        await tracer.flush()
 
     ########## 任务系统
     @filter.command("每日任务", alias={"日常任务"})
+    @tracked_command
     async def show_daily_tasks(self, event: AiocqhttpMessageEvent):
         """查看每日任务"""
         await self.task.format_user_daily_tasks(event)
 
     @filter.command("每周任务", alias={"周常任务"})
+    @tracked_command
     async def show_weekly_tasks(self, event: AiocqhttpMessageEvent):
         """查看每周任务"""
         await self.task.format_user_weekly_tasks(event)
 
     @filter.command("特殊任务", alias={"活动任务"})
+    @tracked_command
     async def show_special_tasks(self, event: AiocqhttpMessageEvent):
         """查看特殊任务"""
         await self.task.format_user_special_tasks(event)
 
     @filter.command("领取奖励", alias={"完成任务", "领取任务奖励"})
+    @tracked_command
     async def claim_reward(self, event: AiocqhttpMessageEvent):
         """领取任务奖励，使用方法: #领取奖励 [任务名称]"""
         parts = await get_cmd_info(event)
         await self.task.handle_claim_reward(event, parts)
 
+    @filter.command("一键领取", alias={"全部领取", "领取全部奖励"})
+    @tracked_command
+    async def claim_all_rewards(self, event: AiocqhttpMessageEvent):
+        """一键领取所有已完成任务的奖励"""
+        await self.task.handle_claim_all_rewards(event)
+
     @filter.command("任务商店", alias={"任务兑换"})
+    @tracked_command
     async def quest_shop(self, event: AiocqhttpMessageEvent):
         """显示任务商店"""
         await self.task.format_task_shop_items(event)
@@ -118,29 +254,34 @@ class AkashaTerminal(Star):
     @filter.command(
         "虚空兑换", alias={"商店兑换", "商城兑换", "任务商城兑换", "任务商店兑换"}
     )
+    @tracked_command
     async def exchange_reward(self, event: AiocqhttpMessageEvent):
         """任务商店购买物品，使用方法: /虚空兑换 [商品名称]"""
         parts = await get_cmd_info(event)
         await self.task.handle_task_shop_purchase(event, parts)
 
     @filter.command("任务列表", alias={"我的任务", "查看任务"})
+    @tracked_command
     async def show_tasks(self, event: AiocqhttpMessageEvent):
         """显示所有任务列表"""
         await self.task.format_user_tasks(event)
 
     @filter.command("刷新任务", alias={"重置任务", "刷新每日任务", "重置每日任务"})
+    @tracked_command
     async def refresh_tasks(self, event: AiocqhttpMessageEvent):
         """手动重置每日任务"""
         await self.task.handle_reset_tasks(event)
 
     ########## 商店、背包系统
     @filter.command("商店", alias={"虚空商店", "商城", "虚空商城"})
+    @tracked_command
     async def show_shop(self, event: AiocqhttpMessageEvent):
         """显示商店物品列表"""
         message = await self.shop.format_shop_items()
         yield event.plain_result(message)
 
     @filter.command("购买道具", alias={"买道具", "购买物品", "买物品"})
+    @tracked_command
     async def buy_prop(self, event: AiocqhttpMessageEvent):
         """/购买道具 物品名称 数量"""
         # 提取命令后的参数部分
@@ -149,12 +290,14 @@ class AkashaTerminal(Star):
         yield event.plain_result(message)
 
     @filter.command("背包", alias="查看背包")
+    @tracked_command
     async def show_backpack(self, event: AiocqhttpMessageEvent):
         """查看我的背包"""
         message = await self.shop.format_backpack(event)
         yield event.plain_result(message)
 
     @filter.command("使用道具", alias={"用道具", "使用物品", "用物品"})
+    @tracked_command
     async def use_item(self, event: AiocqhttpMessageEvent):
         """使用道具，使用方法: /使用道具 物品名称"""
         parts = await get_cmd_info(event)
@@ -162,6 +305,7 @@ class AkashaTerminal(Star):
         yield event.plain_result(message)
 
     @filter.command("赠送道具", alias={"送道具", "赠送物品", "送物品"})
+    @tracked_command
     async def gift_item(self, event: AiocqhttpMessageEvent):
         """赠送道具，使用方法: /赠送道具 物品名称 @用户"""
         parts = await get_cmd_info(event)
@@ -169,6 +313,7 @@ class AkashaTerminal(Star):
         yield event.plain_result(message)
 
     @filter.command("抽武器", alias={"单抽武器", "单抽", "抽卡"})
+    @tracked_command
     async def draw_weapon(self, event: AiocqhttpMessageEvent):
         """单抽武器"""
         message, image_path = await self.lottery.weapon_draw(event, count=1)
@@ -182,6 +327,7 @@ class AkashaTerminal(Star):
             yield event.plain_result(message)
 
     @filter.command("十连抽武器", alias={"十连武器", "武器十连", "十连抽", "十连"})
+    @tracked_command
     async def draw_ten_weapons(self, event: AiocqhttpMessageEvent):
         """十连抽武器"""
         message, weapon_image_paths = await self.lottery.weapon_draw(event, count=10)
@@ -195,12 +341,14 @@ class AkashaTerminal(Star):
         yield event.chain_result(components)
 
     @filter.command("签到", alias={"每日签到"})
+    @tracked_command
     async def sign_in(self, event: AiocqhttpMessageEvent):
         """进行每日签到"""
         message = await self.lottery.daily_sign_in(event)
         yield event.plain_result(message)
 
     @filter.command("我的武器", alias={"武器库", "查看武器"})
+    @tracked_command
     async def my_weapons(self, event: AiocqhttpMessageEvent):
         """展示背包武器的统计信息"""
         message = await self.lottery.show_my_weapons(event)
@@ -208,6 +356,7 @@ class AkashaTerminal(Star):
 
     @filter.permission_type(filter.PermissionType.ADMIN)
     @filter.command("开挂", alias={"增加纠缠之缘", "添加纠缠之缘"})
+    @tracked_command
     async def cheat(self, event: AiocqhttpMessageEvent):
         """增添纠缠之缘，使用方法: /开挂 数量"""
         parts = await get_cmd_info(event)
@@ -216,12 +365,14 @@ class AkashaTerminal(Star):
 
     @filter.command("刷新商城", alias={"刷新商店", "刷新虚空商店", "刷新虚空商城"})
     @filter.permission_type(filter.PermissionType.ADMIN)
+    @tracked_command
     async def refresh_shop(self, event: AiocqhttpMessageEvent):
         """刷新商城物品"""
         message = await self.shop.refresh_shop_manually()
         yield event.plain_result(message)
 
     @filter.command("道具详情", alias={"道具详细", "物品详情", "物品详细"})
+    @tracked_command
     async def item_detail(self, event: AiocqhttpMessageEvent):
         """查看道具详情，使用方法: /道具详情 物品名称"""
         parts = await get_cmd_info(event)
@@ -231,12 +382,21 @@ class AkashaTerminal(Star):
     @filter.command(
         "决斗", alias={"发起决斗", "开始决斗", "和我决斗", "与我决斗", "御前决斗"}
     )
+    @tracked_command
     async def duel(self, event: AiocqhttpMessageEvent):
         """发起决斗，使用方法: /决斗 @用户/qq号"""
         parts = await get_cmd_info(event)
         await self.battle.handle_duel_command(event, parts, self.admins_id)
 
+    @filter.command("锦标赛", alias={"比武大会", "淘汰赛"})
+    @tracked_command
+    async def tournament(self, event: AiocqhttpMessageEvent):
+        """锦标赛，使用方法: /锦标赛 报名|退出|名单|开始|取消"""
+        parts = await get_cmd_info(event)
+        await self.battle.handle_tournament_command(event, parts, self.admins_id)
+
     @filter.command("设置战斗力系数", alias={"设置战斗力意义系数"})
+    @tracked_command
     async def set_magnification(self, event: AiocqhttpMessageEvent):
         """设置战斗力系数值，使用方法: /设置战斗力系数 数值"""
         parts = await get_cmd_info(event)
@@ -244,18 +404,21 @@ class AkashaTerminal(Star):
 
     @filter.permission_type(filter.PermissionType.ADMIN)
     @filter.command("测试", alias={"测试用例"})
+    @tracked_command
     async def abcd(self, event: AiocqhttpMessageEvent):
         """测试用例方法"""
         await self.shop.ceshi_command(event)
 
     ########## 合成系统
     @filter.command("合成列表", alias={"查看合成", "合成配方"})
+    @tracked_command
     async def composite_list(self, event: AiocqhttpMessageEvent):
         """展示合成列表"""
         message = await self.synthesis.show_composite_list(event)
         yield event.plain_result(message)
 
     @filter.command("合成", alias={"虚空合成", "开始合成"})
+    @tracked_command
     async def composite_item(self, event: AiocqhttpMessageEvent):
         """合成物品，使用方法: /合成 物品名称"""
         cmd_prefix = event.message_str.split()[0]
@@ -266,18 +429,21 @@ class AkashaTerminal(Star):
         yield event.plain_result(message)
 
     @filter.command("工坊", alias={"合成工坊", "我的工坊"})
+    @tracked_command
     async def workshop(self, event: AiocqhttpMessageEvent):
         """展示工坊信息"""
         message = await self.synthesis.show_workshop(event)
         yield event.plain_result(message)
 
     @filter.command("升级工坊", alias={"工坊升级", "提升工坊"})
+    @tracked_command
     async def upgrade_workshop(self, event: AiocqhttpMessageEvent):
         """升级工坊"""
         message = await self.synthesis.upgrade_workshop(event)
         yield event.plain_result(message)
 
     @filter.command("批量合成", alias={"快速合成", "一键合成"})
+    @tracked_command
     async def batch_composite(self, event: AiocqhttpMessageEvent):
         """批量合成物品，使用方法: /批量合成 物品名称 数量"""
         cmd_prefix = event.message_str.split()[0]
@@ -288,6 +454,7 @@ class AkashaTerminal(Star):
         yield event.plain_result(message)
 
     @filter.command("道具分解", alias={"分解", "分解道具"})
+    @tracked_command
     async def prop_decomposition(self, event: AiocqhttpMessageEvent):
         """分解道具，使用方法: /道具分解 物品名称"""
         cmd_prefix = event.message_str.split()[0]
@@ -298,6 +465,7 @@ class AkashaTerminal(Star):
         yield event.plain_result(message)
 
     @filter.command("合成历史", alias={"历史", "制作记录"})
+    @tracked_command
     async def composite_history(self, event: AiocqhttpMessageEvent):
         """查看合成历史记录"""
         message = await self.synthesis.show_composite_history(event)
@@ -0,0 +1,86 @@
+"""
+单元测试环境\n
+- 插件内部使用相对导入，把插件目录注册为包 astrbot_plugin_akasha_terminal 后按包名导入被测模块\n
+- 未安装AstrBot时注册被测模块导入所需的最小替身（只提供导入时用到的名字，测试不依赖其行为）
+"""
+
+import importlib.util
+import logging
+import sys
+import tempfile
+import types
+from pathlib import Path
+
+import pytest
+
+PLUGIN_ROOT = Path(__file__).resolve().parent.parent
+PACKAGE = "astrbot_plugin_akasha_terminal"
+
+
+def _stub(name: str, **attrs) -> types.ModuleType:
+    module = types.ModuleType(name)
+    module.__path__ = []
+    module.__dict__.update(attrs)
+    sys.modules[name] = module
+    parent, _, child = name.rpartition(".")
+    if parent:
+        setattr(sys.modules[parent], child, module)
+    return module
+
+
+def _install_astrbot_stubs() -> None:
+    data_dir = Path(tempfile.mkdtemp(prefix="akasha_test_"))
+
+    class StarTools:
+        @staticmethod
+        def get_data_dir(name: str) -> Path:
+            path = data_dir / name
+            path.mkdir(parents=True, exist_ok=True)
+            return path
+
+    class Component:
+        def __init__(self, *args, **kwargs):
+            self.args = args
+            self.kwargs = kwargs
+
+    components = {
+        name: type(name, (Component,), {}) for name in ("Plain", "At", "Image")
+    }
+
+    _stub("astrbot")
+    _stub("astrbot.api", logger=logging.getLogger("astrbot"))
+    _stub("astrbot.api.message_components", **components)
+    _stub("astrbot.api.star", StarTools=StarTools)
+    _stub("astrbot.core")
+    _stub("astrbot.core.message")
+    _stub(
+        "astrbot.core.message.components",
+        Reply=type("Reply", (Component,), {}),
+        **components,
+    )
+    _stub("astrbot.core.platform")
+    _stub("astrbot.core.platform.sources")
+    _stub("astrbot.core.platform.sources.aiocqhttp")
+    _stub(
+        "astrbot.core.platform.sources.aiocqhttp.aiocqhttp_message_event",
+        AiocqhttpMessageEvent=type("AiocqhttpMessageEvent", (), {}),
+    )
+
+
+if importlib.util.find_spec("astrbot") is None:
+    _install_astrbot_stubs()
+
+if PACKAGE not in sys.modules:
+    package = types.ModuleType(PACKAGE)
+    package.__path__ = [str(PLUGIN_ROOT)]
+    sys.modules[PACKAGE] = package
+
+
+@pytest.fixture
+def config():
+    """可在测试中用 config.update(...) 修改配置，测试结束后恢复原快照"""
+    from astrbot_plugin_akasha_terminal.utils.config import config_service
+
+    snapshot = config_service.snapshot
+    yield config_service
+    config_service._snapshot = snapshot
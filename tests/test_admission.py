@@ -0,0 +1,144 @@
+import asyncio
+
+from astrbot_plugin_akasha_terminal.utils import admission
+from astrbot_plugin_akasha_terminal.utils.admission import (
+    ADMIT,
+    BUSY,
+    BYPASS,
+    IDLE_TIMEOUT,
+    OVERLOADED_MESSAGE,
+    RATE_LIMITED_MESSAGE,
+    SHED,
+    AdmissionController,
+)
+
+
+class Event:
+    def __init__(self, group="100", user="1"):
+        self._group = group
+        self._user = user
+
+    def get_group_id(self):
+        return self._group
+
+    def get_sender_id(self):
+        return self._user
+
+
+def test_group_rate_limit_replies_once_then_sheds(config):
+    config.update("performance_system", group_command_rate=0.001, group_command_burst=2)
+
+    async def main():
+        control = AdmissionController()
+        for _ in range(2):
+            assert (await control.admit("sign_in", Event()))[0] == ADMIT
+            control.release("sign_in")
+        assert await control.admit("sign_in", Event()) == (BUSY, RATE_LIMITED_MESSAGE)
+        # 提示间隔内再次被拒绝时静默丢弃
+        assert await control.admit("sign_in", Event()) == (SHED, "")
+        # 其他群与私聊不受影响
+        assert (await control.admit("sign_in", Event(group="200")))[0] == ADMIT
+        assert (await control.admit("sign_in", Event(group=None)))[0] == ADMIT
+        assert control.rate_limited == 2
+
+    asyncio.run(main())
+
+
+def test_heavy_commands_cost_more_tokens(config):
+    config.update("performance_system", group_command_rate=0.001, group_command_burst=4)
+
+    async def main():
+        control = AdmissionController()
+        assert (await control.admit("leaderboard", Event()))[0] == ADMIT
+        control.release("leaderboard")
+        assert (await control.admit("leaderboard", Event()))[0] == BUSY
+        assert (await control.admit("sign_in", Event()))[0] == ADMIT
+
+    asyncio.run(main())
+
+
+def test_disabled_or_exempt_commands_bypass(config):
+    async def main():
+        control = AdmissionController()
+        assert (await control.admit("performance_report", Event()))[0] == BYPASS
+        config.update("performance_system", admission_enabled=False)
+        assert (await control.admit("sign_in", Event()))[0] == BYPASS
+        assert control.active == 0
+
+    asyncio.run(main())
+
+
+def test_concurrency_cap_queues_and_wakes_normal_before_heavy(config):
+    config.update(
+        "performance_system",
+        group_command_burst=100,
+        max_concurrent_commands=1,
+        max_heavy_commands=1,
+        admission_wait_ms=1000,
+    )
+
+    async def main():
+        control = AdmissionController()
+        assert (await control.admit("sign_in", Event()))[0] == ADMIT
+        order = []
+
+        async def queued(name, group):
+            verdict, _ = await control.admit(name, Event(group=group))
+            order.append(name)
+            return verdict
+
+        heavy = asyncio.ensure_future(queued("leaderboard", "200"))
+        await asyncio.sleep(0)
+        normal = asyncio.ensure_future(queued("sign_in", "300"))
+        await asyncio.sleep(0)
+        control.release("sign_in")
+        assert await normal == ADMIT
+        control.release("sign_in")
+        assert await heavy == ADMIT
+        control.release("leaderboard")
+        assert order == ["sign_in", "leaderboard"]
+        assert control.active == 0 and control.queued == 2
+
+    asyncio.run(main())
+
+
+def test_queue_timeout_reports_overload(config):
+    config.update(
+        "performance_system",
+        group_command_burst=100,
+        max_concurrent_commands=1,
+        admission_wait_ms=10,
+    )
+
+    async def main():
+        control = AdmissionController()
+        assert (await control.admit("sign_in", Event()))[0] == ADMIT
+        assert await control.admit("sign_in", Event(group="200")) == (
+            BUSY,
+            OVERLOADED_MESSAGE,
+        )
+        assert control.overloaded == 1
+
+    asyncio.run(main())
+
+
+def test_idle_group_state_is_pruned(config, monkeypatch):
+    config.update("performance_system", group_command_rate=1.0, group_command_burst=1)
+
+    async def main():
+        control = AdmissionController()
+        await control.admit("sign_in", Event(group="idle"))
+        control.release("sign_in")
+        assert (await control.admit("sign_in", Event(group="idle")))[0] == BUSY
+        assert "idle" in control._buckets and "idle" in control._last_busy_reply
+
+        # IDLE_TIMEOUT 秒后空闲群的令牌桶已补满，其状态在下一次准入时回收
+        now = admission.time.monotonic() + IDLE_TIMEOUT + 1
+        monkeypatch.setattr(admission.time, "monotonic", lambda: now)
+        control._buckets["idle"].updated -= IDLE_TIMEOUT + 1
+        assert (await control.admit("sign_in", Event(group="active")))[0] == ADMIT
+        assert "idle" not in control._buckets
+        assert "idle" not in control._last_busy_reply
+        assert "active" in control._buckets
+
+    asyncio.run(main())
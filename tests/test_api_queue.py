@@ -0,0 +1,79 @@
+import asyncio
+
+from astrbot_plugin_akasha_terminal.utils.api_queue import (
+    OneBotApiQueue,
+    is_retryable,
+)
+
+
+class ActionFailed(Exception):
+    """模拟 OneBot 返回失败时抛出的异常（带retcode）"""
+
+    def __init__(self, retcode, wording="", info=None):
+        super().__init__(wording)
+        self.retcode = retcode
+        self.result = {"retcode": retcode, "wording": wording, "msg": ""}
+        self.info = info
+
+
+def test_rate_limited_rejections_are_retried_for_any_action():
+    assert is_retryable("send_group_msg", ActionFailed(1429))
+    assert is_retryable("set_group_ban", ActionFailed(100, wording="发送过于频繁"))
+    assert is_retryable("send", ActionFailed(1200, info="Rate Limit exceeded"))
+
+
+def test_other_rejections_are_not_retried():
+    assert not is_retryable("get_group_member_info", ActionFailed(100, "参数错误"))
+    assert not is_retryable("set_group_ban", ActionFailed(102, "权限不足"))
+
+
+def test_transport_errors_retry_only_idempotent_reads():
+    assert is_retryable("get_group_member_info", asyncio.TimeoutError())
+    assert is_retryable("get_msg", ConnectionResetError())
+    # 写操作超时后可能已经生效，不重试以免重复发送或重复禁言
+    assert not is_retryable("send", asyncio.TimeoutError())
+    assert not is_retryable("set_group_ban", ConnectionResetError())
+
+
+def test_retry_stops_on_non_retryable_write():
+    queue = OneBotApiQueue(rate=1000, burst=1000, backoff_base=0, backoff_max=0)
+    calls = []
+
+    async def send():
+        calls.append(1)
+        raise asyncio.TimeoutError()
+
+    async def main():
+        try:
+            await queue.call("1", send, action="send")
+        except asyncio.TimeoutError:
+            pass
+        summary = queue.format_summary()
+        await queue.close()
+        return summary
+
+    summary = asyncio.run(main())
+    assert calls == [1]
+    assert queue.metrics()["actions"]["send"]["failed"] == 1
+    assert "send: 提交1次" in summary and "重试0" in summary
+
+
+def test_rate_limited_call_is_retried_until_success():
+    queue = OneBotApiQueue(rate=1000, burst=1000, backoff_base=0, backoff_max=0)
+    attempts = []
+
+    async def send():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ActionFailed(1429)
+        return "ok"
+
+    async def main():
+        result = await queue.call("1", send, action="send")
+        await queue.close()
+        return result
+
+    assert asyncio.run(main()) == "ok"
+    assert len(attempts) == 3
+    stats = queue.metrics()["actions"]["send"]
+    assert stats["retried"] == 2 and stats["succeeded"] == 1
@@ -0,0 +1,64 @@
+import asyncio
+import os
+
+from astrbot_plugin_akasha_terminal.utils import data_layout as layout
+from astrbot_plugin_akasha_terminal.utils import utils
+from astrbot_plugin_akasha_terminal.utils.data_layout import (
+    SHARD_LEVELS,
+    DataLayout,
+    owner_of,
+    sharded_path,
+    shard_prefix,
+    user_file,
+)
+
+
+def test_owner_of_strips_group_suffix_only_in_group_dirs():
+    assert owner_of("user_data", "12345.json") == "12345"
+    assert owner_of("user_backpack", "12345") == "12345"
+    assert owner_of("user_workshop", "12345_678.json") == "12345"
+    # 用户id本身带下划线时只去掉最后一段群号
+    assert owner_of("user_inventory", "a_b_678.json") == "a_b"
+    assert owner_of("user_data", "a_b.json") == "a_b"
+
+
+def test_shard_prefix_is_stable_and_shared_across_groups(tmp_path):
+    prefix = shard_prefix(12345)
+    assert prefix == shard_prefix("12345")
+    assert len(prefix) == SHARD_LEVELS
+    assert all(len(level) == 1 and level in "0123456789abcdef" for level in prefix)
+    workshop = tmp_path / "user_workshop"
+    assert (
+        sharded_path(workshop, "12345_1.json").parent
+        == user_file(workshop, 12345, 2).parent
+    )
+    assert user_file(tmp_path / "user_data", 12345) == tmp_path.joinpath(
+        "user_data", *prefix, "12345.json"
+    )
+
+
+def test_background_migration_skips_files_that_fail(tmp_path, monkeypatch):
+    directory = tmp_path / "user_data"
+    directory.mkdir()
+    for user_id in range(5):
+        (directory / f"{user_id}.json").write_text("{}")
+    monkeypatch.setattr(utils, "PLUGIN_DATA_DIR", tmp_path)
+    monkeypatch.setattr(layout, "MIGRATE_BATCH", 2)
+    replace = os.replace
+
+    def flaky_replace(src, dst):
+        if os.path.basename(src) in ("1.json", "3.json"):
+            raise PermissionError("denied")
+        replace(src, dst)
+
+    monkeypatch.setattr(layout.os, "replace", flaky_replace)
+
+    data_layout = DataLayout()
+    asyncio.run(asyncio.wait_for(data_layout._migrate_all(), timeout=5))
+
+    assert data_layout.migrated_in_background == 3
+    assert sorted(layout._json_files(directory)) == ["1.json", "3.json"]
+    for user_id in (0, 2, 4):
+        assert user_file(directory, user_id).exists()
+    # 仍有旧文件留在原位置，访问时迁移保持开启
+    assert data_layout._legacy[directory] is True
@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from astrbot_plugin_akasha_terminal.utils.leases import (
+    LEASE_SHARDS,
+    RESOURCE_SHARDS,
+    LeaseManager,
+    LeaseTimeout,
+    shard_of,
+)
+
+
+def _users_on_distinct_shards(count):
+    users, shards = [], set()
+    user_id = 10000
+    while len(users) < count:
+        user_id += 1
+        if shard_of(user_id) not in shards:
+            shards.add(shard_of(user_id))
+            users.append(str(user_id))
+    return users
+
+
+def test_shards_of_is_sorted_and_includes_resource_shards():
+    a, b = _users_on_distinct_shards(2)
+    shards = LeaseManager.shards_of([b, a, b], resources=["indexes", "shop_stock"])
+    assert shards == sorted({shard_of(a), shard_of(b), LEASE_SHARDS, LEASE_SHARDS + 1})
+    assert RESOURCE_SHARDS["shop_stock"] == LEASE_SHARDS
+    assert all(0 <= shard_of(user) < LEASE_SHARDS for user in (a, b))
+
+
+def test_hold_is_a_no_op_when_cluster_mode_is_off(config, tmp_path):
+    config.update("cluster_system", enabled=False)
+    manager = LeaseManager(path=tmp_path / "leases.sqlite3")
+
+    async def main():
+        async with manager.hold(["1"]) as shards:
+            assert shards == []
+            assert manager.covers(["1", "2"])
+
+    asyncio.run(main())
+    assert not (tmp_path / "leases.sqlite3").exists()
+
+
+def test_nested_hold_only_acquires_missing_shards(config, tmp_path):
+    config.update("cluster_system", enabled=True)
+    manager = LeaseManager(path=tmp_path / "leases.sqlite3")
+    a, b = _users_on_distinct_shards(2)
+
+    async def main():
+        assert not manager.covers([a])
+        async with manager.hold([a]) as outer:
+            assert outer == [shard_of(a)]
+            assert manager.covers([a]) and not manager.covers([a, b])
+            # 已持有的分片不重复获取，也不会等待自己
+            async with manager.hold([a]) as inner:
+                assert inner == []
+            async with manager.hold([a, b], resources=["shop_stock"]) as inner:
+                assert inner == sorted([shard_of(b), LEASE_SHARDS])
+                assert manager.covers([a, b])
+                assert manager._held[shard_of(a)].refs == 1
+            # 内层结束后恢复外层的上下文
+            assert manager.covers([a]) and not manager.covers([b])
+            assert manager._held[shard_of(b)].refs == 0
+        assert not manager.covers([a])
+        assert manager._held[shard_of(a)].refs == 0
+        await manager.close()
+
+    asyncio.run(main())
+    assert manager.acquired == 2
+
+
+def test_held_shard_times_out_for_other_process(config, tmp_path):
+    config.update("cluster_system", enabled=True, lease_wait_ms=50)
+    path = tmp_path / "leases.sqlite3"
+    first, second = LeaseManager(path=path), LeaseManager(path=path)
+
+    async def main():
+        async with first.hold(["1"]):
+            with pytest.raises(LeaseTimeout):
+                async with second.hold(["1", "2"]):
+                    pass
+            # 全部获取或全部不获取：未被占用的分片也没有被第二个进程持有
+            assert second._held == {}
+            assert first._wanted(60) == [shard_of("1")]
+        await first.close()
+        await second.close()
+
+    asyncio.run(main())
+    assert second.timeouts == 1
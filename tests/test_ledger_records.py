@@ -0,0 +1,69 @@
+import pytest
+
+from astrbot_plugin_akasha_terminal.core.ledger import (
+    RECORD_SIZE,
+    _decode,
+    _encode,
+    _read_records,
+)
+
+
+def test_encode_decode_round_trip():
+    raw = _encode(42, "123456789", "money", -300, 1700, "shop")
+    assert len(raw) == RECORD_SIZE
+    record = _decode(raw)
+    assert record["seq"] == 42
+    assert record["user_id"] == "123456789"
+    assert record["asset"] == "money"
+    assert record["delta"] == -300
+    assert record["balance"] == 1700
+    assert record["reason"] == "shop"
+
+
+def test_encode_truncates_reason_and_rejects_long_user_id():
+    record = _decode(_encode(1, "1", "task_points", 5, 5, "tournament"))
+    assert record["asset"] == "task_points"
+    assert record["reason"] == "tournam"
+    with pytest.raises(ValueError):
+        _encode(1, "9" * 25, "money", 1, 1, "admin")
+
+
+def test_decode_rejects_crc_mismatch_and_wrong_length():
+    raw = bytearray(_encode(7, "42", "money", 10, 10, "admin"))
+    assert _decode(bytes(raw[:-1])) is None
+    raw[20] ^= 0xFF
+    assert _decode(bytes(raw)) is None
+
+
+def test_read_records_replays_valid_prefix(tmp_path):
+    path = tmp_path / "segment_000001.log"
+    records = [_encode(seq, "42", "money", seq, seq * 10, "admin") for seq in (1, 2, 3)]
+    path.write_bytes(b"".join(records))
+    replayed, valid = _read_records(path)
+    assert [record["seq"] for record in replayed] == [1, 2, 3]
+    assert [record["balance"] for record in replayed] == [10, 20, 30]
+    assert valid == 3 * RECORD_SIZE
+
+
+def test_read_records_stops_at_torn_tail(tmp_path):
+    path = tmp_path / "segment_000001.log"
+    good = _encode(1, "42", "money", 5, 5, "admin")
+    torn = _encode(2, "42", "money", 5, 10, "admin")[: RECORD_SIZE // 2]
+    path.write_bytes(good + torn)
+    replayed, valid = _read_records(path)
+    assert [record["seq"] for record in replayed] == [1]
+    assert valid == RECORD_SIZE
+
+
+def test_read_records_stops_at_corrupted_record(tmp_path):
+    path = tmp_path / "segment_000001.log"
+    first, second, third = (
+        _encode(seq, "42", "money", 1, seq, "admin") for seq in (1, 2, 3)
+    )
+    corrupted = bytearray(second)
+    corrupted[-1] ^= 0xFF
+    path.write_bytes(first + bytes(corrupted) + third)
+    replayed, valid = _read_records(path)
+    # 损坏记录之后的记录不再重放
+    assert [record["seq"] for record in replayed] == [1]
+    assert valid == RECORD_SIZE
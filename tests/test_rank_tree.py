@@ -0,0 +1,103 @@
+import random
+
+from astrbot_plugin_akasha_terminal.utils.rank_tree import RankTree, _size
+
+
+def _check_invariants(tree: RankTree) -> None:
+    """中序有序、子树大小正确、父节点优先级不低于子节点"""
+    keys = []
+
+    def walk(node):
+        if node is None:
+            return
+        for child in (node.left, node.right):
+            if child is not None:
+                assert child.priority <= node.priority
+        walk(node.left)
+        keys.append(node.key)
+        walk(node.right)
+        assert node.size == 1 + _size(node.left) + _size(node.right)
+
+    walk(tree._root)
+    assert keys == sorted(keys)
+    assert len(keys) == len(tree)
+
+
+def _expected_order(scores):
+    return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+
+def test_update_orders_by_score_then_member():
+    tree = RankTree()
+    for member, score in (("b", 5), ("a", 5), ("c", 9), ("d", 1)):
+        tree.update(member, score)
+    assert list(tree) == [("c", 9), ("a", 5), ("b", 5), ("d", 1)]
+    assert [tree.rank(m) for m in "cabd"] == [1, 2, 3, 4]
+    _check_invariants(tree)
+
+
+def test_update_existing_member_moves_it():
+    tree = RankTree()
+    for member, score in (("a", 1), ("b", 2), ("c", 3)):
+        tree.update(member, score)
+    tree.update("a", 10)
+    assert tree.rank("a") == 1
+    assert tree.score("a") == 10
+    assert len(tree) == 3
+    # 分数不变时不修改树
+    tree.update("a", 10)
+    assert list(tree) == [("a", 10), ("c", 3), ("b", 2)]
+    _check_invariants(tree)
+
+
+def test_remove():
+    tree = RankTree()
+    for member, score in (("a", 1), ("b", 2), ("c", 3)):
+        tree.update(member, score)
+    tree.remove("b")
+    tree.remove("missing")
+    assert "b" not in tree
+    assert tree.rank("b") is None
+    assert list(tree) == [("c", 3), ("a", 1)]
+    assert tree.rank("a") == 2
+    _check_invariants(tree)
+
+
+def test_top():
+    tree = RankTree.build({"a": 3, "b": 7, "c": 5})
+    assert tree.top(2) == [("b", 7), ("c", 5)]
+    assert tree.top(10) == [("b", 7), ("c", 5), ("a", 3)]
+    assert tree.top(0) == []
+    assert RankTree().top(3) == []
+
+
+def test_build_priorities_keep_heap_property():
+    scores = {str(i): i % 97 for i in range(1000)}
+    tree = RankTree.build(scores)
+    _check_invariants(tree)
+    assert list(tree) == _expected_order(scores)
+    # 批量构建后再插入的随机优先级节点不破坏堆性质
+    for i in range(1000, 1200):
+        tree.update(str(i), i % 13)
+    _check_invariants(tree)
+
+
+def test_random_operations_match_sorted_reference():
+    rng = random.Random(0)
+    tree = RankTree.build({})
+    reference = {}
+    for _ in range(2000):
+        member = str(rng.randrange(200))
+        if rng.random() < 0.2:
+            tree.remove(member)
+            reference.pop(member, None)
+        else:
+            score = rng.randrange(50)
+            tree.update(member, score)
+            reference[member] = score
+    expected = _expected_order(reference)
+    assert list(tree) == expected
+    assert tree.top(10) == expected[:10]
+    for rank, (member, _) in enumerate(expected, 1):
+        assert tree.rank(member) == rank
+    _check_invariants(tree)
@@ -0,0 +1,145 @@
+import asyncio
+
+from astrbot_plugin_akasha_terminal.utils.singleflight import (
+    DROP,
+    RUN,
+    SHARE,
+    SingleFlight,
+)
+
+
+class Message:
+    def __init__(self, message_id):
+        self.message_id = message_id
+
+
+class Event:
+    def __init__(self, text, user="1", group="100", message_id=None):
+        self.message_str = text
+        self.message_obj = Message(message_id)
+        self._user = user
+        self._group = group
+
+    def get_sender_id(self):
+        return self._user
+
+    def get_group_id(self):
+        return self._group
+
+
+def test_concurrent_duplicate_shares_the_running_call(config):
+    async def main():
+        flights = SingleFlight()
+        verdict, flight = flights.join("sign_in", Event("/签到"))
+        assert verdict == RUN
+        # 参数中多余的空白不影响判定
+        verdict, shared = flights.join("sign_in", Event("/签到  "))
+        assert verdict == SHARE and shared is flight
+        waiter = asyncio.ensure_future(flights.wait(shared))
+        flights.finish(flight, "done")
+        assert await waiter == "done"
+        assert flights.shared == 1
+
+    asyncio.run(main())
+
+
+def test_unshareable_duplicate_is_dropped_while_running(config):
+    async def main():
+        flights = SingleFlight()
+        assert flights.join("backpack", Event("/背包"))[0] == RUN
+        assert flights.join("backpack", Event("/背包"), shareable=False) == (
+            DROP,
+            None,
+        )
+        assert flights.dropped == 1 and flights.shared == 0
+
+    asyncio.run(main())
+
+
+def test_different_user_group_or_arguments_run_independently(config):
+    async def main():
+        flights = SingleFlight()
+        assert flights.join("duel", Event("/决斗 2"))[0] == RUN
+        assert flights.join("duel", Event("/决斗 3"))[0] == RUN
+        assert flights.join("duel", Event("/决斗 2", user="2"))[0] == RUN
+        assert flights.join("duel", Event("/决斗 2", group="200"))[0] == RUN
+        assert flights.join("sign_in", Event("/决斗 2"))[0] == RUN
+
+    asyncio.run(main())
+
+
+def test_repeat_within_window_is_dropped(config):
+    async def main():
+        flights = SingleFlight()
+        _, flight = flights.join("sign_in", Event("/签到"))
+        flights.finish(flight)
+        assert flights.join("sign_in", Event("/签到"))[0] == DROP
+        # 窗口为0时完成后立即可以再次执行
+        config.update("performance_system", duplicate_window_ms=0)
+        other = SingleFlight()
+        _, flight = other.join("sign_in", Event("/签到"))
+        other.finish(flight)
+        assert other.join("sign_in", Event("/签到"))[0] == RUN
+
+    asyncio.run(main())
+
+
+def test_redelivered_message_id_is_dropped(config):
+    async def main():
+        flights = SingleFlight()
+        _, flight = flights.join("sign_in", Event("/签到", message_id=7))
+        flights.finish(flight)
+        config.update("performance_system", duplicate_window_ms=0)
+        assert flights.join("sign_in", Event("/签到", message_id=7)) == (DROP, None)
+        assert flights.join("sign_in", Event("/签到", message_id=8))[0] == RUN
+        assert flights.redelivered == 1
+
+    asyncio.run(main())
+
+
+def test_recent_entries_are_bounded(config):
+    async def main():
+        flights = SingleFlight(max_entries=3)
+        for i in range(10):
+            _, flight = flights.join("sign_in", Event("/签到", user=str(i)))
+            flights.finish(flight)
+        flights.join("sign_in", Event("/签到", user="x"))
+        assert len(flights._recent) <= 3
+
+    asyncio.run(main())
+
+
+def test_generator_command_duplicate_is_dropped_without_waiting(config):
+    from astrbot_plugin_akasha_terminal.utils.command_hooks import tracked_command
+
+    config.update("performance_system", admission_enabled=False)
+    runs = []
+
+    class Plugin:
+        @tracked_command
+        async def backpack(self, event):
+            runs.append(event)
+            await asyncio.sleep(0.05)
+            yield "result"
+
+    class CommandEvent(Event):
+        def get_messages(self):
+            return []
+
+        def stop_event(self):
+            self.stopped = True
+
+    async def collect(agen):
+        return [result async for result in agen]
+
+    async def main():
+        plugin = Plugin()
+        first = asyncio.ensure_future(collect(plugin.backpack(CommandEvent("/背包"))))
+        await asyncio.sleep(0)
+        duplicate = CommandEvent("/背包")
+        assert await collect(plugin.backpack(duplicate)) == []
+        assert duplicate.stopped and not first.done()
+        assert await first == ["result"]
+
+    asyncio.run(main())
+    assert len(runs) == 1
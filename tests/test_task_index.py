@@ -0,0 +1,80 @@
+from astrbot_plugin_akasha_terminal.core.task import TaskIndex
+
+TASK_DATA = {
+    "daily_tasks": {
+        "sign": {"name": "每日签到", "track_key": "sign_count"},
+    },
+    "weekly_tasks": {
+        "duel": {"name": "武术交流", "track_key": "duel_count"},
+        "relationship": {"name": "社交达人"},
+    },
+    "special_tasks": {
+        "social_expert": {"name": "社交达人", "track_key": "interaction_count"},
+    },
+    "achievements": [
+        {"id": "claim_10", "metric": "total_claimed", "target": 10},
+        {"id": "claim_1", "metric": "total_claimed", "target": 1},
+        {"id": "claim_50", "metric": "total_claimed", "target": 50},
+        {"id": "points_100", "metric": "points_earned", "target": 100},
+    ],
+}
+
+
+def _ids(achievements):
+    return [ach["id"] for ach in achievements]
+
+
+def test_crossed_achievements_between_old_and_new():
+    index = TaskIndex(TASK_DATA)
+    assert _ids(index.crossed_achievements("total_claimed", 0, 1)) == ["claim_1"]
+    assert _ids(index.crossed_achievements("total_claimed", 1, 10)) == ["claim_10"]
+    assert _ids(index.crossed_achievements("total_claimed", 0, 60)) == [
+        "claim_1",
+        "claim_10",
+        "claim_50",
+    ]
+
+
+def test_crossed_achievements_excludes_already_reached_threshold():
+    index = TaskIndex(TASK_DATA)
+    # old == 阈值时该成就此前已达成
+    assert index.crossed_achievements("total_claimed", 10, 11) == []
+    assert index.crossed_achievements("total_claimed", 2, 9) == []
+
+
+def test_crossed_achievements_no_progress_or_unknown_metric():
+    index = TaskIndex(TASK_DATA)
+    assert index.crossed_achievements("total_claimed", 5, 5) == []
+    assert index.crossed_achievements("total_claimed", 20, 0) == []
+    assert index.crossed_achievements("unknown", 0, 1000) == []
+    assert _ids(index.crossed_achievements("points_earned", 99, 100)) == ["points_100"]
+
+
+def test_lookup_by_category_name_and_track_key():
+    index = TaskIndex(TASK_DATA)
+    assert index.by_name[("weekly", "武术交流")]["track_key"] == "duel_count"
+    assert [category for category, _ in index.by_track_key["sign_count"]] == ["daily"]
+    # 周常与特殊任务同名时两者都能查到
+    assert "track_key" not in index.by_name[("weekly", "社交达人")]
+    assert index.by_name[("special", "社交达人")]["track_key"] == "interaction_count"
+
+
+def test_find_user_task_resolves_duplicate_name_to_claimable_task():
+    index = TaskIndex(TASK_DATA)
+    weekly = {"completed": True, "claimed": True}
+    special = {"completed": True, "claimed": False}
+    user_tasks = {"weekly": {"社交达人": weekly}, "special": {"社交达人": special}}
+    user_task, task = index.find_user_task(user_tasks, "社交达人")
+    assert user_task is special
+    assert task["track_key"] == "interaction_count"
+    # 只持有特殊任务时同样能找到
+    user_task, task = index.find_user_task(
+        {"special": {"社交达人": special}}, "社交达人"
+    )
+    assert user_task is special
+    # 都不可领取时返回第一项，供调用方提示已领取/未完成
+    weekly_pending = {"completed": False, "claimed": False}
+    user_tasks["special"]["社交达人"] = {"completed": True, "claimed": True}
+    user_tasks["weekly"]["社交达人"] = weekly_pending
+    assert index.find_user_task(user_tasks, "社交达人")[0] is weekly_pending
+    assert index.find_user_task(user_tasks, "不存在") == (None, None)
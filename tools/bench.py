@@ -0,0 +1,287 @@
+"""
+热点路径微基准：本地运行、无需网络，结果可保存为基线并与之比较
+
+用法（在 AstrBot 的 data/plugins 目录下执行）:
+    python -m astrbot_plugin_akasha_terminal.tools.bench
+        运行全部基准并打印结果
+    python -m astrbot_plugin_akasha_terminal.tools.bench --save bench_baseline.json
+        运行并保存为基线
+    python -m astrbot_plugin_akasha_terminal.tools.bench --compare bench_baseline.json --threshold 0.15
+        与基线比较，中位数变慢超过阈值的基准标记为回退，存在回退时退出码为1
+    python -m astrbot_plugin_akasha_terminal.tools.bench --only json
+        只运行名称包含 json 的基准
+
+插件数据写入临时目录（与 tools.harness 相同的方式替换 StarTools.get_data_dir）
+"""
+
+import argparse
+import asyncio
+import importlib
+import inspect
+import json
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+from .fake_onebot import FakeOneBot
+from .harness import (
+    BUNDLED_DATA_DIR,
+    PACKAGE,
+    FakeMessageEvent,
+    install_data_dir,
+    percentile,
+)
+
+# 每个基准的预热次数与计时样本数
+WARMUP = 20
+SAMPLES = 200
+# 纯计算的基准每个样本连续调用的次数（单次太短，计时误差大）
+INNER_LOOPS = 1000
+# 比较基线时默认的回退阈值（中位数变慢的比例）
+DEFAULT_THRESHOLD = 0.10
+# read_json/write_json 的文档规模：名称 -> 条目数（约为 用户数据/背包/大型文档）
+DOC_SIZES = {"1KB": 12, "16KB": 200, "128KB": 1600}
+
+BENCH_USER = "200001"
+BENCH_GROUP = "900001"
+
+# 基准: 名称 -> (单次执行的函数, 每个样本内的调用次数)
+Bench = Tuple[Callable[[], Any], int]
+
+
+def make_document(entries: int) -> Dict[str, Any]:
+    """构造与用户背包结构相近的文档"""
+    return {
+        f"item_{i}": {
+            "id": i,
+            "name": f"道具{i}",
+            "count": i % 17,
+            "tags": ["武器", "三星"] if i % 3 else ["道具"],
+            "updated_at": 1700000000 + i,
+        }
+        for i in range(entries)
+    }
+
+
+def mod(name: str) -> Any:
+    """导入插件的子模块（须在替换数据目录之后）"""
+    return importlib.import_module(f"{PACKAGE}.{name}")
+
+
+async def build_benches(root: Path) -> Dict[str, Bench]:
+    """初始化插件各子系统与测试数据，返回所有基准"""
+    utils = mod("utils.utils")
+    config_service = mod("utils.config").config_service
+    economy_ledger = mod("core.ledger").economy_ledger
+    Lottery = mod("core.lottery").Lottery
+    Task = mod("core.task").Task
+    Shop = mod("core.shop").Shop
+    Synthesis = mod("core.synthesis").Synthesis
+    Battle = mod("core.battle").Battle
+
+    # 基准只测逻辑本身：关闭抽卡冷却与命令统计
+    config_service.load({})
+    config_service.update("other_system", draw_card_cooldown=0)
+    config_service.update("performance_system", metrics_enabled=False)
+
+    benches: Dict[str, Bench] = {}
+    docs_dir = root / "bench_docs"
+    docs_dir.mkdir(parents=True, exist_ok=True)
+    for label, entries in DOC_SIZES.items():
+        document = make_document(entries)
+        path = docs_dir / f"doc_{label}.json"
+        utils.write_json_sync(path, document)
+        benches[f"read_json/{label}"] = (
+            lambda path=path: utils.read_json(path),
+            1,
+        )
+        benches[f"write_json/{label}"] = (
+            lambda path=path, document=document: utils.write_json(path, document),
+            1,
+        )
+
+    bot = FakeOneBot(rate_limit=10**9, latency=0)
+    event = FakeMessageEvent(bot, BENCH_USER, BENCH_GROUP, "bench")
+
+    lottery = Lottery()
+    if not lottery.weapon_all_data:
+        # 数据文件名大小写与代码不一致时（区分大小写的文件系统），按实际文件加载
+        for candidate in BUNDLED_DATA_DIR.glob("*.json"):
+            if candidate.name.lower() == lottery.weapon_file.name.lower():
+                lottery.weapon_file = candidate
+                lottery.weapon_all_data = lottery.load_weapon_data() or {}
+    user_data, backpack = await utils.get_user_data_and_backpack(BENCH_USER)
+    backpack["weapon"]["纠缠之缘"] = 10**9
+    await utils.save_user_backpack(BENCH_USER, backpack)
+    miss = {"five": 0, "four": 0}
+
+    async def single_draw():
+        result = await lottery.handle_single_draw(
+            BENCH_USER, user_data, backpack, miss["five"], miss["four"]
+        )
+        miss["five"], miss["four"] = result[1], result[2]
+
+    benches["lottery/handle_single_draw"] = (single_draw, 1)
+    benches["lottery/weapon_draw(10)"] = (lambda: lottery.weapon_draw(event, 10), 1)
+
+    task = Task()
+    benches["task/update_task_progress"] = (
+        lambda: task.update_task_progress(None, BENCH_USER, "shop_count", 1),
+        1,
+    )
+
+    shop = Shop()
+    economy_ledger.apply(BENCH_USER, "money", 10**12, "admin")
+    await economy_ledger.commit()
+
+    async def buy():
+        home_data = await shop.user.get_home_data(BENCH_USER)
+        await shop.buy_item(event, BENCH_USER, "爱心巧克力", home_data, 1)
+
+    benches["shop/buy_item"] = (buy, 1)
+
+    synthesis = Synthesis()
+    recipes = await synthesis.get_synthesis_recipes()
+    recipe = dict(recipes.get("recipes", {}).get("传送卷轴", {}), name="传送卷轴")
+    workshop = {"level": 3, "exp": 0}
+    inventory = {material: 10**9 for material in recipe.get("materials", {})}
+
+    async def synthesize():
+        await synthesis.execute_synthesis(
+            BENCH_USER, BENCH_GROUP, recipe, workshop, inventory, "bench_cooldown"
+        )
+
+    benches["synthesis/execute_synthesis"] = (synthesize, 1)
+
+    battle = Battle()
+    benches["battle/calc_win_prob"] = (
+        lambda: battle.calc_win_prob(12, 9, (3, 2, 1), (4, 1, 0)),
+        INNER_LOOPS,
+    )
+    return benches
+
+
+async def measure(func: Callable[[], Any], loops: int, samples: int) -> List[float]:
+    """返回每次调用的耗时样本（微秒）"""
+
+    async def call_once():
+        result = func()
+        if inspect.isawaitable(result):
+            await result
+
+    for _ in range(WARMUP):
+        await call_once()
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter_ns()
+        if loops == 1:
+            await call_once()
+        else:
+            for _ in range(loops):
+                func()
+        timings.append((time.perf_counter_ns() - started) / loops / 1000)
+    return timings
+
+
+def summarize(timings: List[float]) -> Dict[str, float]:
+    values = sorted(timings)
+    return {
+        "median_us": percentile(values, 0.50),
+        "p95_us": percentile(values, 0.95),
+        "mean_us": sum(values) / len(values),
+        "samples": len(values),
+    }
+
+
+def compare(
+    results: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    threshold: float,
+) -> List[str]:
+    """打印与基线的对比，返回回退的基准名称"""
+    regressions = []
+    print(f"\n与基线比较（阈值 {threshold:.0%}，按中位数）:")
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            print(f"  {name}: 基线中没有此项")
+            continue
+        change = result["median_us"] / base["median_us"] - 1 if base["median_us"] else 0
+        flag = ""
+        if change > threshold:
+            flag = "  ⚠️ 回退"
+            regressions.append(name)
+        elif change < -threshold:
+            flag = "  ✅ 提升"
+        print(
+            f"  {name}: {base['median_us']:.2f} -> {result['median_us']:.2f}微秒 "
+            f"({change:+.1%}){flag}"
+        )
+    return regressions
+
+
+async def run(args: argparse.Namespace) -> int:
+    benches = await build_benches(args.root)
+    results: Dict[str, Dict[str, float]] = {}
+    print(f"{'基准':<32}{'中位数(微秒)':>14}{'p95(微秒)':>14}{'平均(微秒)':>14}")
+    for name, (func, loops) in benches.items():
+        if args.only and args.only not in name:
+            continue
+        results[name] = summarize(await measure(func, loops, args.samples))
+        r = results[name]
+        print(f"{name:<32}{r['median_us']:>14.2f}{r['p95_us']:>14.2f}{r['mean_us']:>14.2f}")
+
+    if args.save:
+        payload = {
+            "meta": {
+                "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "python": sys.version.split()[0],
+                "platform": platform.platform(),
+            },
+            "results": results,
+        }
+        Path(args.save).write_text(
+            json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8"
+        )
+        print(f"\n基线已保存: {args.save}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        regressions = compare(results, baseline.get("results", {}), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)}项基准回退: {', '.join(regressions)}")
+            return 1
+        print("\n没有超过阈值的回退")
+    return 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="插件热点路径微基准")
+    parser.add_argument("--samples", type=int, default=SAMPLES, help="每个基准的样本数")
+    parser.add_argument("--only", default="", help="只运行名称包含该字符串的基准")
+    parser.add_argument("--save", default="", help="将结果保存为基线JSON")
+    parser.add_argument("--compare", default="", help="与基线JSON比较")
+    parser.add_argument(
+        "--threshold", type=float, default=DEFAULT_THRESHOLD, help="回退阈值（比例）"
+    )
+    args = parser.parse_args()
+
+    args.root = Path(tempfile.mkdtemp(prefix="akasha_bench_"))
+    install_data_dir(args.root)
+    bundled = {path: path.read_bytes() for path in BUNDLED_DATA_DIR.glob("*.json")}
+    code = 1
+    try:
+        code = asyncio.run(run(args))
+    finally:
+        for path, content in bundled.items():
+            path.write_bytes(content)
+        shutil.rmtree(args.root, ignore_errors=True)
+    sys.exit(code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+本地模拟的 OneBot v11 接口，用于在没有真实QQ机器人的情况下测试出站调用队列的吞吐与顺序
+
+用法（在 AstrBot 的 data/plugins 目录下执行）:
+    python -m astrbot_plugin_akasha_terminal.tools.fake_onebot
+        使用进程内的模拟端点压测出站队列，检查失败数、吞吐与同群顺序
+    python -m astrbot_plugin_akasha_terminal.tools.fake_onebot --serve --port 5700
+        以HTTP形式启动模拟端点，可将 aiocqhttp 的 api_root 指向 http://127.0.0.1:5700
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from collections import defaultdict, deque
+from typing import Any, Dict, List, Tuple
+
+from ..utils.api_queue import OneBotApiQueue
+
+
+class FakeActionFailed(Exception):
+    """模拟 OneBot 返回的调用失败（retcode非0）"""
+
+    def __init__(self, retcode: int, message: str):
+        super().__init__(f"retcode={retcode}: {message}")
+        self.retcode = retcode
+
+
+class FakeOneBot:
+    """
+    进程内的模拟 OneBot 客户端，调用方式与 aiocqhttp.CQHttp 一致（bot.set_group_ban(...)）\n
+    - 每个群每秒最多处理rate_limit次调用，超出则抛出FakeActionFailed（模拟“禁言失败”）\n
+    - 每次调用有latency秒的模拟延迟，并按failure_rate的概率随机失败\n
+    - 所有成功的调用按执行顺序记录在calls中
+    """
+
+    def __init__(
+        self, rate_limit: int = 5, latency: float = 0.005, failure_rate: float = 0.0
+    ):
+        self.rate_limit = rate_limit
+        self.latency = latency
+        self.failure_rate = failure_rate
+        # 执行成功的调用 [(时间, 动作, 参数)]
+        self.calls: List[Tuple[float, str, Dict[str, Any]]] = []
+        # 被拒绝的调用次数 {动作: 次数}
+        self.rejected: Dict[str, int] = defaultdict(int)
+        # 每个群最近1秒内的调用时间戳
+        self._windows: Dict[Any, deque] = defaultdict(deque)
+
+    async def call_action(self, action: str, **params) -> Any:
+        await asyncio.sleep(self.latency)
+        now = time.monotonic()
+        window = self._windows[params.get("group_id")]
+        while window and now - window[0] > 1.0:
+            window.popleft()
+        if len(window) >= self.rate_limit:
+            self.rejected[action] += 1
+            raise FakeActionFailed(1400, "请求过于频繁")
+        if self.failure_rate and random.random() < self.failure_rate:
+            self.rejected[action] += 1
+            raise FakeActionFailed(100, "随机失败")
+        window.append(now)
+        self.calls.append((now, action, params))
+        if action == "get_group_member_info":
+            user_id = params.get("user_id")
+            return {
+                "group_id": params.get("group_id"),
+                "user_id": user_id,
+                "nickname": f"用户{user_id}",
+                "card": "",
+            }
+        if action.startswith("send_"):
+            return {"message_id": len(self.calls)}
+        return None
+
+    def __getattr__(self, action: str):
+        if action.startswith("_"):
+            raise AttributeError(action)
+
+        async def api(**params):
+            return await self.call_action(action, **params)
+
+        api.__name__ = action
+        return api
+
+
+def create_app(bot: FakeOneBot):
+    """将模拟端点包装为 OneBot HTTP API 形式的 aiohttp 应用（POST /<action>）"""
+    from aiohttp import web
+
+    async def handle(request: web.Request) -> web.Response:
+        action = request.match_info["action"]
+        params = await request.json() if request.can_read_body else {}
+        try:
+            data = await bot.call_action(action, **params)
+            return web.json_response({"status": "ok", "retcode": 0, "data": data})
+        except FakeActionFailed as e:
+            return web.json_response(
+                {"status": "failed", "retcode": e.retcode, "data": None}
+            )
+
+    app = web.Application()
+    app.router.add_post("/{action}", handle)
+    return app
+
+
+async def run_benchmark(groups: int, per_group: int, rate_limit: int) -> None:
+    """分别直连与经出站队列发送同样的禁言请求，对比失败数、耗时与顺序"""
+    # 直连：一次性并发全部请求
+    bot = FakeOneBot(rate_limit=rate_limit)
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *(
+            bot.set_group_ban(group_id=g, user_id=u, duration=60)
+            for g in range(groups)
+            for u in range(per_group)
+        ),
+        return_exceptions=True,
+    )
+    failed = sum(isinstance(r, Exception) for r in results)
+    print(
+        f"[直连] 请求{len(results)}次，失败{failed}次，"
+        f"耗时{time.perf_counter() - start:.2f}秒"
+    )
+
+    # 经队列：令牌桶速率与端点限流一致，失败自动退避重试
+    bot = FakeOneBot(rate_limit=rate_limit)
+    queue = OneBotApiQueue(rate=rate_limit * 0.9, burst=rate_limit, backoff_base=0.2)
+    start = time.perf_counter()
+    futures = [
+        queue.submit(g, bot.set_group_ban, group_id=g, user_id=u, duration=60)
+        for g in range(groups)
+        for u in range(per_group)
+    ]
+    results = await asyncio.gather(*futures, return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    failed = sum(isinstance(r, Exception) for r in results)
+    print(
+        f"[队列] 请求{len(results)}次，失败{failed}次，"
+        f"耗时{elapsed:.2f}秒，吞吐{len(results) / elapsed:.1f}次/秒"
+    )
+
+    # 顺序检查：每个群内的执行顺序必须与提交顺序一致
+    executed: Dict[Any, List[Any]] = defaultdict(list)
+    for _, _, params in bot.calls:
+        executed[params["group_id"]].append(params["user_id"])
+    ordered = all(executed[g] == list(range(per_group)) for g in range(groups))
+    print(f"[队列] 同群顺序保持: {'是' if ordered else '否'}")
+
+    # 合并检查：同一成员的并发查询只请求一次
+    before = len(bot.calls)
+    await asyncio.gather(
+        *(
+            queue.call(
+                0,
+                bot.get_group_member_info,
+                coalesce_key=("get_group_member_info", 0, 1),
+                group_id=0,
+                user_id=1,
+            )
+            for _ in range(50)
+        )
+    )
+    print(f"[队列] 50次并发成员查询实际请求: {len(bot.calls) - before}次")
+    print(f"[队列] 统计: {queue.metrics()['actions']}")
+    await queue.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="模拟 OneBot 端点")
+    parser.add_argument("--serve", action="store_true", help="以HTTP形式启动模拟端点")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5700)
+    parser.add_argument("--groups", type=int, default=4, help="压测的群数量")
+    parser.add_argument("--per-group", type=int, default=20, help="每个群的请求数")
+    parser.add_argument("--rate-limit", type=int, default=5, help="端点每群每秒限额")
+    args = parser.parse_args()
+    if args.serve:
+        from aiohttp import web
+
+        web.run_app(
+            create_app(FakeOneBot(rate_limit=args.rate_limit)),
+            host=args.host,
+            port=args.port,
+        )
+    else:
+        asyncio.run(run_benchmark(args.groups, args.per_group, args.rate_limit))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+"""
+离线压测工具：用模拟的消息事件与 OneBot 客户端驱动插件的命令处理函数，无需真实QQ机器人
+
+用法（在 AstrBot 的 data/plugins 目录下执行）:
+    python -m astrbot_plugin_akasha_terminal.tools.harness
+        默认 2000 个模拟用户、20 个群，按默认命令比例发送 20000 条命令
+    python -m astrbot_plugin_akasha_terminal.tools.harness --users 5000 --commands 50000 \\
+        --concurrency 128 --mix 签到=3,十连=2,购买道具=2,决斗=1,任务列表=2,合成=1
+        自定义用户数、命令数、并发数与命令比例
+重复命令合并与命令准入控制默认关闭（压测的每群速率远超真实群聊），可用 --singleflight、--admission 开启
+
+插件数据写入临时目录（StarTools.get_data_dir 被替换），结束后删除（--keep 保留）；
+报告各命令的吞吐、端到端延迟分位数，以及 /性能统计 记录的处理耗时与每次调用的文件读写
+"""
+
+import argparse
+import asyncio
+import importlib
+import inspect
+import random
+import shutil
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from astrbot.api.message_components import At
+from astrbot.api.star import StarTools
+
+from .fake_onebot import FakeOneBot
+
+PLUGIN_NAME = "astrbot_plugin_akasha_terminal"
+# 插件包名（tools 的上一级）
+PACKAGE = __package__.rsplit(".", 1)[0]
+# 插件自带的数据目录，部分子系统初始化时会改写其中的文件，压测结束后恢复
+BUNDLED_DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+# 模拟机器人自身的QQ号
+SELF_ID = "10000"
+
+# 命令名 -> (处理函数名, 生成消息文本的函数(随机数发生器), 是否@同群的另一名用户)
+CommandSpec = Tuple[str, Callable[[random.Random], str], bool]
+COMMANDS: Dict[str, CommandSpec] = {
+    "签到": ("sign_in", lambda rng: "签到", False),
+    "十连": ("draw_ten_weapons", lambda rng: "十连", False),
+    "购买道具": (
+        "buy_prop",
+        lambda rng: f"购买道具 {rng.choice(['爱心巧克力', '幸运符', '金币袋'])} 1",
+        False,
+    ),
+    "决斗": ("duel", lambda rng: "决斗", True),
+    "任务列表": ("show_tasks", lambda rng: "任务列表", False),
+    "合成": (
+        "composite_item",
+        lambda rng: f"合成 {rng.choice(['传送卷轴', '爱情药水'])}",
+        False,
+    ),
+}
+DEFAULT_MIX = "签到=3,十连=2,购买道具=2,决斗=1,任务列表=2,合成=1"
+
+
+class FakeMessageEvent:
+    """
+    模拟的 AiocqhttpMessageEvent，只实现插件用到的接口\n
+    发送的消息与stop_event调用记录在实例上
+    """
+
+    def __init__(
+        self,
+        bot: FakeOneBot,
+        user_id: str,
+        group_id: str,
+        message_str: str,
+        at_ids: Optional[List[str]] = None,
+    ):
+        self.bot = bot
+        self.message_str = message_str
+        self._user_id = user_id
+        self._group_id = group_id
+        self._at_ids = at_ids or []
+        self.sent: List[Any] = []
+        self.stopped = False
+
+    def get_sender_id(self) -> str:
+        return self._user_id
+
+    def get_sender_name(self) -> str:
+        return f"用户{self._user_id}"
+
+    def get_group_id(self) -> str:
+        return self._group_id
+
+    def get_self_id(self) -> str:
+        return SELF_ID
+
+    def get_messages(self) -> List[Any]:
+        return [At(qq=qq) for qq in self._at_ids]
+
+    def plain_result(self, text: str) -> Tuple[str, Any]:
+        return ("plain", text)
+
+    def chain_result(self, chain: List[Any]) -> Tuple[str, Any]:
+        return ("chain", chain)
+
+    def stop_event(self) -> None:
+        self.stopped = True
+
+    async def send(self, result: Any) -> None:
+        self.sent.append(result)
+
+
+class FakeContext:
+    """模拟的插件上下文"""
+
+    def get_config(self) -> Dict[str, Any]:
+        return {"admins_id": []}
+
+
+def install_data_dir(root: Path) -> None:
+    """让 StarTools.get_data_dir 返回临时目录（须在导入插件模块之前调用）"""
+
+    def get_data_dir(cls, plugin_name: Optional[str] = None) -> Path:
+        path = root / "plugin_data" / (plugin_name or PLUGIN_NAME)
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+
+    StarTools.get_data_dir = classmethod(get_data_dir)
+
+
+def parse_mix(text: str) -> Dict[str, int]:
+    mix = {}
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in COMMANDS:
+            raise SystemExit(f"未知的命令「{name}」，可选: {'、'.join(COMMANDS)}")
+        mix[name] = int(weight or 1)
+    return mix
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(len(sorted_values) * q + 0.999999) - 1))
+    return sorted_values[index]
+
+
+async def run_handler(handler: Callable, event: FakeMessageEvent) -> None:
+    """执行命令处理函数（异步生成器的结果视为发送的消息）"""
+    result = handler(event)
+    if inspect.isasyncgen(result):
+        async for item in result:
+            event.sent.append(item)
+    else:
+        await result
+
+
+async def run_load(args: argparse.Namespace) -> None:
+    main = importlib.import_module(f"{PACKAGE}.main")
+    api_queue = importlib.import_module(f"{PACKAGE}.utils.api_queue").api_queue
+    ledger = importlib.import_module(f"{PACKAGE}.core.ledger").economy_ledger
+    metrics = importlib.import_module(f"{PACKAGE}.utils.metrics").command_metrics
+    config_service = importlib.import_module(f"{PACKAGE}.utils.config").config_service
+
+    plugin = main.AkashaTerminal(FakeContext(), {})
+    await plugin.initialize()
+    # 出站队列的限速（生产环境为每群每秒2次），压测时默认放开以免决斗等命令被限速主导
+    api_queue.rate = args.api_rate
+    api_queue.burst = max(1, int(args.api_rate))
+    # 模拟用户随机发送命令，同一用户短时间内的相同命令很常见，默认不合并以测量实际处理；
+    # 压测的每群命令速率远超真实群聊，默认关闭准入控制
+    config_service.update(
+        "performance_system",
+        singleflight_enabled=args.singleflight,
+        admission_enabled=args.admission,
+    )
+    bot = FakeOneBot(rate_limit=10**6, latency=args.bot_latency)
+
+    rng = random.Random(args.seed)
+    users = [str(100000 + i) for i in range(args.users)]
+    groups = [str(900000 + i) for i in range(args.groups)]
+    home_group = {uid: groups[i % len(groups)] for i, uid in enumerate(users)}
+    members: Dict[str, List[str]] = defaultdict(list)
+    for uid, gid in home_group.items():
+        members[gid].append(uid)
+
+    # 预置金币，使购买、合成等命令走完整流程
+    if args.money:
+        for uid in users:
+            ledger.apply(uid, "money", args.money, "admin")
+        await ledger.commit()
+
+    mix = parse_mix(args.mix)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    plan = [
+        (rng.choice(users), name)
+        for name in rng.choices(names, weights=weights, k=args.commands)
+    ]
+
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    metrics.reset()
+    queue: asyncio.Queue = asyncio.Queue()
+    for item in plan:
+        queue.put_nowait(item)
+
+    async def worker() -> None:
+        while True:
+            try:
+                user_id, name = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            handler_name, build, needs_target = COMMANDS[name]
+            group_id = home_group[user_id]
+            at_ids = []
+            if needs_target:
+                candidates = members[group_id]
+                target = rng.choice(candidates)
+                if target != user_id:
+                    at_ids.append(target)
+            event = FakeMessageEvent(bot, user_id, group_id, build(rng), at_ids)
+            started = time.perf_counter()
+            try:
+                await run_handler(getattr(plugin, handler_name), event)
+            except Exception:
+                errors[name] += 1
+            latencies[name].append(time.perf_counter() - started)
+
+    print(
+        f"开始压测: {args.users}个用户，{args.groups}个群，{args.commands}条命令，"
+        f"并发{args.concurrency}"
+    )
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    # 等待延迟写入与排队中的出站调用完成
+    await asyncio.sleep(0)
+    await plugin.terminate()
+
+    print(f"完成: 耗时{elapsed:.2f}秒，吞吐{args.commands / elapsed:.1f}条/秒")
+    print("命令：次数/异常 | 端到端 p50/p95/p99/最大（毫秒）")
+    for name in names:
+        values = sorted(latencies[name])
+        if not values:
+            continue
+        print(
+            f"- {name}：{len(values)}/{errors[name]} | "
+            + "/".join(
+                f"{v * 1000:.2f}"
+                for v in (
+                    percentile(values, 0.50),
+                    percentile(values, 0.95),
+                    percentile(values, 0.99),
+                    values[-1],
+                )
+            )
+        )
+    print()
+    print(metrics.format_report(minutes=60, limit=len(COMMANDS) + 1))
+    print(f"模拟 OneBot 调用: {len(bot.calls)}次")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="插件离线压测")
+    parser.add_argument("--users", type=int, default=2000, help="模拟用户数")
+    parser.add_argument("--groups", type=int, default=20, help="模拟群数")
+    parser.add_argument("--commands", type=int, default=20000, help="发送的命令总数")
+    parser.add_argument("--concurrency", type=int, default=64, help="同时处理的命令数")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="命令比例，如 签到=3,十连=2")
+    parser.add_argument("--money", type=int, default=100000, help="每个用户预置的金币")
+    parser.add_argument(
+        "--api-rate", type=float, default=1000.0, help="出站队列每群每秒调用数"
+    )
+    parser.add_argument(
+        "--bot-latency", type=float, default=0.002, help="模拟 OneBot 调用延迟（秒）"
+    )
+    parser.add_argument(
+        "--singleflight", action="store_true", help="开启重复命令合并（默认关闭）"
+    )
+    parser.add_argument(
+        "--admission", action="store_true", help="开启命令准入控制（默认关闭）"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="随机数种子")
+    parser.add_argument("--keep", action="store_true", help="保留临时数据目录")
+    args = parser.parse_args()
+
+    root = Path(tempfile.mkdtemp(prefix="akasha_harness_"))
+    install_data_dir(root)
+    bundled = {
+        path: path.read_bytes() for path in BUNDLED_DATA_DIR.glob("*.json")
+    }
+    try:
+        asyncio.run(run_load(args))
+    finally:
+        for path, content in bundled.items():
+            path.write_bytes(content)
+        if args.keep:
+            print(f"数据目录: {root}")
+        else:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+多进程压测：多个插件进程共享同一个数据目录，并发地对同一批用户做「读取-修改-写入」，校验没有丢失更新
+
+用法（在 AstrBot 的 data/plugins 目录下执行）:
+    python -m astrbot_plugin_akasha_terminal.tools.stress_multiprocess
+        默认 4 个进程、每个进程 2000 次操作、32 个用户；每次操作把用户背包中的计数器加1并给用户加1金币
+    python -m astrbot_plugin_akasha_terminal.tools.stress_multiprocess --no-leases
+        关闭分片租约（cluster_system.enabled=false），对照观察丢失的更新
+
+结束后在新进程中重新读取背包文件与经济账本，与各进程实际完成的操作数对比
+"""
+
+import argparse
+import asyncio
+import importlib
+import json
+import multiprocessing
+import random
+import shutil
+import tempfile
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, List
+
+from .harness import BUNDLED_DATA_DIR, PLUGIN_NAME, install_data_dir
+
+PACKAGE = __package__.rsplit(".", 1)[0]
+# 背包中用于计数的字段
+COUNTER_KEY = "压测计数"
+
+
+def _load(module: str):
+    return importlib.import_module(f"{PACKAGE}.{module}")
+
+
+async def _worker(index: int, args: argparse.Namespace) -> Dict[str, int]:
+    utils = _load("utils.utils")
+    ledger = _load("core.ledger").economy_ledger
+    leases = _load("utils.leases").lease_manager
+    _load("utils.config").config_service.update(
+        "cluster_system", enabled=not args.no_leases, lease_wait_ms=args.lease_wait_ms
+    )
+    leases.on_transfer(ledger.catch_up)
+    leases.on_transfer(utils.invalidate_shard)
+    leases.before_release(ledger.commit)
+    (utils.PLUGIN_DATA_DIR / "user_backpack").mkdir(parents=True, exist_ok=True)
+
+    rng = random.Random(index)
+    users = [str(200000 + i) for i in range(args.users)]
+    done: Counter = Counter()
+    # 同一进程内对同一用户的读写串行执行（进程内的并发由插件自身的机制处理，这里只考察跨进程）
+    user_locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+    queue: asyncio.Queue = asyncio.Queue()
+    for _ in range(args.ops):
+        queue.put_nowait(rng.choice(users))
+
+    async def run() -> None:
+        while not queue.empty():
+            uid = queue.get_nowait()
+            try:
+                async with leases.hold([uid]), user_locks[uid]:
+                    backpack = await utils.get_user_data_and_backpack(uid, "user_backpack")
+                    # 让出事件循环，放大读写之间的时间窗口
+                    await asyncio.sleep(rng.random() * 0.002)
+                    backpack[COUNTER_KEY] = backpack.get(COUNTER_KEY, 0) + 1
+                    await utils.save_user_backpack(uid, backpack)
+                    ledger.apply(uid, "money", 1, "admin")
+                done[uid] += 1
+            except Exception as e:
+                print(f"[进程{index}] 操作失败: {e!r}")
+
+    await asyncio.gather(*(run() for _ in range(args.concurrency)))
+    await leases.close()
+    await ledger.close()
+    print(
+        f"[进程{index}] 完成{sum(done.values())}次操作；"
+        f"{leases.format_summary() or '未使用分片租约'}"
+    )
+    return dict(done)
+
+
+def worker_main(root: str, index: int, args: argparse.Namespace) -> Dict[str, int]:
+    install_data_dir(Path(root))
+    return asyncio.run(_worker(index, args))
+
+
+def verify(root: Path, expected: Counter) -> List[str]:
+    """在新进程中读取最终的背包计数与账本余额，返回不一致的用户"""
+    install_data_dir(root)
+    ledger = _load("core.ledger").economy_ledger
+    locate_user_file = _load("utils.data_layout").locate_user_file
+    backpack_dir = root / "plugin_data" / PLUGIN_NAME / "user_backpack"
+    problems = []
+    for uid, count in sorted(expected.items()):
+        path = locate_user_file(backpack_dir, uid)
+        backpack = json.loads(path.read_text(encoding="utf-8")) if path.exists() else {}
+        counter = backpack.get(COUNTER_KEY, 0)
+        money = ledger.balance(uid) or 0
+        if counter != count or money != count:
+            problems.append(f"{uid}: 期望{count}，背包计数{counter}，账本余额{money}")
+    return problems
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="多进程共享数据目录压测")
+    parser.add_argument("--processes", type=int, default=4, help="进程数")
+    parser.add_argument("--ops", type=int, default=2000, help="每个进程的操作数")
+    parser.add_argument("--users", type=int, default=32, help="用户数（越少冲突越多）")
+    parser.add_argument("--concurrency", type=int, default=16, help="每个进程同时执行的操作数")
+    parser.add_argument(
+        "--lease-wait-ms", type=int, default=30000, help="等待分片租约的最长时间（毫秒）"
+    )
+    parser.add_argument("--no-leases", action="store_true", help="关闭分片租约作对照")
+    parser.add_argument("--keep", action="store_true", help="保留临时数据目录")
+    args = parser.parse_args()
+
+    root = Path(tempfile.mkdtemp(prefix="akasha_stress_"))
+    bundled = {path: path.read_bytes() for path in BUNDLED_DATA_DIR.glob("*.json")}
+    started = time.perf_counter()
+    problems: List[str] = []
+    try:
+        # spawn：每个进程独立导入插件，与实际的多实例部署一致
+        with multiprocessing.get_context("spawn").Pool(args.processes) as pool:
+            results = pool.starmap(
+                worker_main, [(str(root), i, args) for i in range(args.processes)]
+            )
+        elapsed = time.perf_counter() - started
+        expected: Counter = Counter()
+        for done in results:
+            expected.update(done)
+        total = sum(expected.values())
+        print(f"{args.processes}个进程共完成{total}次操作，耗时{elapsed:.2f}秒（{total / elapsed:.0f}次/秒）")
+        problems = verify(root, expected)
+        if problems:
+            print(f"❌ {len(problems)}个用户的数据丢失了更新:")
+            for line in problems[:20]:
+                print(f"  {line}")
+        else:
+            print(f"✅ {len(expected)}个用户的背包计数与账本余额均与操作数一致")
+    finally:
+        for path, content in bundled.items():
+            path.write_bytes(content)
+        if args.keep:
+            print(f"数据目录: {root}")
+        else:
+            shutil.rmtree(root, ignore_errors=True)
+    if problems:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
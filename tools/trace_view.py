@@ -0,0 +1,92 @@
+"""
+把插件导出的追踪文件（traces*.jsonl，每行一个 Chrome Trace Event）转换为追踪查看器可直接打开的JSON
+
+用法（在 AstrBot 的 data/plugins 目录下执行）:
+    python -m astrbot_plugin_akasha_terminal.tools.trace_view <追踪目录或文件> -o trace.json
+        合并目录下所有轮转文件（按从旧到新的顺序），在 chrome://tracing 或 https://ui.perfetto.dev 中打开 trace.json
+    python -m astrbot_plugin_akasha_terminal.tools.trace_view <追踪目录> --command draw_ten_weapons --last 1
+        只导出最近一次 /十连 的追踪
+
+追踪目录默认位于 AstrBot 数据目录下的 plugin_data/astrbot_plugin_akasha_terminal/traces
+"""
+
+import argparse
+import json
+import re
+import sys
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List
+
+# 轮转文件名中的序号（traces.3.jsonl -> 3），当前文件为0
+ROTATED = re.compile(r"^traces(?:\.(\d+))?\.jsonl$")
+
+
+def trace_files(source: Path) -> List[Path]:
+    """追踪文件列表，从旧到新"""
+    if source.is_file():
+        return [source]
+    files = []
+    for path in source.iterdir():
+        match = ROTATED.match(path.name)
+        if match:
+            files.append((int(match.group(1) or 0), path))
+    return [path for _, path in sorted(files, reverse=True)]
+
+
+def load_traces(files: List[Path]) -> "OrderedDict[Any, List[Dict[str, Any]]]":
+    """按追踪（pid, tid）分组读取事件，跳过损坏的行"""
+    traces: "OrderedDict[Any, List[Dict[str, Any]]]" = OrderedDict()
+    for path in files:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                traces.setdefault((event.get("pid"), event.get("tid")), []).append(event)
+    return traces
+
+
+def root_name(events: List[Dict[str, Any]]) -> str:
+    """追踪的命令名（元数据事件中的行名去掉编号）"""
+    for event in events:
+        if event.get("ph") == "M":
+            return event.get("args", {}).get("name", "").split(" #")[0]
+    return ""
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="转换插件追踪文件为 Chrome Trace 格式")
+    parser.add_argument("source", help="追踪目录或单个 .jsonl 文件")
+    parser.add_argument("-o", "--output", default="trace.json", help="输出文件")
+    parser.add_argument("--command", default="", help="只导出该命令处理函数的追踪")
+    parser.add_argument("--last", type=int, default=0, help="只导出最近N个追踪")
+    args = parser.parse_args()
+
+    source = Path(args.source)
+    if not source.exists():
+        sys.exit(f"找不到追踪文件: {source}")
+    traces = load_traces(trace_files(source))
+    selected = [
+        events
+        for events in traces.values()
+        if not args.command or root_name(events) == args.command
+    ]
+    if args.last:
+        selected = selected[-args.last :]
+    events = [event for trace in selected for event in trace]
+    Path(args.output).write_text(
+        json.dumps(
+            {"traceEvents": events, "displayTimeUnit": "ms"}, ensure_ascii=False
+        ),
+        encoding="utf-8",
+    )
+    print(f"已导出{len(selected)}个追踪（{len(events)}个事件）: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
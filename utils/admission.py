@@ -0,0 +1,209 @@
+import asyncio
+import time
+from collections import Counter, deque
+from typing import Any, Deque, Dict, Tuple
+
+from .api_queue import TokenBucket
+from .config import config_service
+
+# 重负载命令（处理函数名）：占用更多群令牌，并发数另有上限，排队时让位于普通命令
+HEAVY_COMMANDS = frozenset(
+    {
+        "draw_ten_weapons",
+        "list_all_users",
+        "export_users",
+        "delete_users",
+        "economy_report",
+        "leaderboard",
+        "batch_composite",
+        "tournament",
+    }
+)
+# 不受准入控制的命令（负载过高时管理员仍需查看统计）
+EXEMPT_COMMANDS = frozenset({"performance_report", "profile_command"})
+# 重负载命令消耗的群令牌数
+HEAVY_COST = 3
+# 同一个群两次繁忙提示的最短间隔（秒），期间被拒绝的命令静默丢弃
+BUSY_REPLY_INTERVAL = 10
+# 统计中列出的被限流最多的群数
+TOP_GROUPS = 3
+# 群的限流状态空闲超过该时长（秒）后回收（与出站队列回收空闲群的时长一致）
+IDLE_TIMEOUT = 60
+
+# admit() 的判定结果：占用名额执行、不受限制直接执行、回复繁忙提示、静默丢弃
+ADMIT = "admit"
+BYPASS = "bypass"
+BUSY = "busy"
+SHED = "shed"
+
+RATE_LIMITED_MESSAGE = "⏳ 本群命令太频繁啦，请稍后再试~"
+OVERLOADED_MESSAGE = "⏳ 当前使用的人太多啦，请稍后再试~"
+
+
+def group_key(event: Any) -> str:
+    """限流的分组：群聊按群号，私聊按用户"""
+    group_id = event.get_group_id()
+    return str(group_id) if group_id else f"private:{event.get_sender_id()}"
+
+
+class AdmissionController:
+    """
+    命令准入控制\n
+    - 每个群一个令牌桶（performance_system.group_command_rate 个/秒，最多积攒 group_command_burst 个），
+      令牌不足时拒绝，避免单个群刷屏拖慢其他群\n
+    - 全局同时执行的命令不超过 max_concurrent_commands，其中重负载命令不超过 max_heavy_commands；
+      名额已满时排队等待至多 admission_wait_ms，有名额空出时先唤醒普通命令\n
+    - 被拒绝时回复繁忙提示（每个群每 BUSY_REPLY_INTERVAL 秒至多一次，其余静默丢弃）\n
+    - 每 IDLE_TIMEOUT 秒回收一次空闲群的令牌桶（已补满）与过期的繁忙提示记录
+    """
+
+    def __init__(self):
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._last_busy_reply: Dict[str, float] = {}
+        self._pruned_at = time.monotonic()
+        self.active = 0
+        self.active_heavy = 0
+        # 排队中的命令: 是否重负载 -> 等待名额的future
+        self._waiters: Dict[bool, Deque[asyncio.Future]] = {False: deque(), True: deque()}
+        self.admitted = 0
+        self.queued = 0
+        self._wait_total = 0.0
+        self.peak_active = 0
+        self.rate_limited = 0
+        self.overloaded = 0
+        self._limited_groups: Counter = Counter()
+
+    @property
+    def enabled(self) -> bool:
+        return config_service.snapshot.performance.admission_enabled
+
+    def _bucket(self, key: str) -> TokenBucket:
+        performance = config_service.snapshot.performance
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(
+                performance.group_command_rate, performance.group_command_burst
+            )
+        else:
+            # 配置可能已修改
+            bucket.rate = performance.group_command_rate
+            bucket.capacity = performance.group_command_burst
+        return bucket
+
+    def _prune(self, now: float) -> None:
+        """回收空闲群的限流状态：空闲超过IDLE_TIMEOUT且令牌已补满的令牌桶、已过提示间隔的繁忙提示记录"""
+        if now - self._pruned_at < IDLE_TIMEOUT:
+            return
+        self._pruned_at = now
+        for key, bucket in list(self._buckets.items()):
+            idle = now - bucket.updated
+            if idle >= IDLE_TIMEOUT and (
+                bucket.tokens + idle * bucket.rate >= bucket.capacity
+            ):
+                del self._buckets[key]
+        for key, replied in list(self._last_busy_reply.items()):
+            if now - replied >= BUSY_REPLY_INTERVAL:
+                del self._last_busy_reply[key]
+
+    def _can_start(self, heavy: bool) -> bool:
+        performance = config_service.snapshot.performance
+        if self.active >= performance.max_concurrent_commands:
+            return False
+        return not heavy or self.active_heavy < performance.max_heavy_commands
+
+    def _start(self, heavy: bool) -> None:
+        self.active += 1
+        if heavy:
+            self.active_heavy += 1
+        self.peak_active = max(self.peak_active, self.active)
+
+    def _reject(self, key: str, message: str) -> Tuple[str, str]:
+        """被拒绝：距上次提示足够久时回复繁忙提示，否则静默丢弃"""
+        now = time.monotonic()
+        if now - self._last_busy_reply.get(key, 0.0) < BUSY_REPLY_INTERVAL:
+            return SHED, ""
+        self._last_busy_reply[key] = now
+        return BUSY, message
+
+    async def admit(self, name: str, event: Any) -> Tuple[str, str]:
+        """
+        命令处理入口调用，返回 (判定, 繁忙提示)\n
+        ADMIT: 执行，结束后调用release(name)；BYPASS: 直接执行；
+        BUSY: 回复繁忙提示；SHED: 静默丢弃
+        """
+        if not self.enabled or name in EXEMPT_COMMANDS:
+            return BYPASS, ""
+        self._prune(time.monotonic())
+        heavy = name in HEAVY_COMMANDS
+        key = group_key(event)
+        if not self._bucket(key).try_take(HEAVY_COST if heavy else 1):
+            self.rate_limited += 1
+            self._limited_groups[key] += 1
+            return self._reject(key, RATE_LIMITED_MESSAGE)
+
+        # 普通命令只需排在其他普通命令之后；重负载命令还要让位于所有排队的普通命令
+        ahead = self._waiters[False] or (heavy and self._waiters[True])
+        if not ahead and self._can_start(heavy):
+            self._start(heavy)
+            self.admitted += 1
+            return ADMIT, ""
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters[heavy].append(waiter)
+        self.queued += 1
+        started = time.monotonic()
+        timeout = config_service.snapshot.performance.admission_wait_ms / 1000
+        try:
+            await asyncio.wait({waiter}, timeout=timeout)
+        except asyncio.CancelledError:
+            # 已分到名额时归还
+            if waiter.done() and not waiter.cancelled():
+                self.release(name)
+            waiter.cancel()
+            raise
+        self._wait_total += time.monotonic() - started
+        if waiter.done():
+            self.admitted += 1
+            return ADMIT, ""
+        waiter.cancel()
+        self.overloaded += 1
+        return self._reject(key, OVERLOADED_MESSAGE)
+
+    def release(self, name: str) -> None:
+        """命令执行结束，归还名额并按优先级唤醒排队的命令"""
+        self.active -= 1
+        if name in HEAVY_COMMANDS:
+            self.active_heavy -= 1
+        for heavy in (False, True):
+            waiters = self._waiters[heavy]
+            while waiters and self._can_start(heavy):
+                waiter = waiters.popleft()
+                if waiter.done():
+                    continue
+                self._start(heavy)
+                waiter.set_result(None)
+
+    def format_summary(self) -> str:
+        if not self.enabled:
+            return "🚦 准入控制: 已关闭"
+        performance = config_service.snapshot.performance
+        waiting = len(self._waiters[False]) + len(self._waiters[True])
+        avg_wait = self._wait_total / self.queued * 1000 if self.queued else 0.0
+        lines = [
+            f"🚦 准入控制: 执行中{self.active}/{performance.max_concurrent_commands}"
+            f"（重负载{self.active_heavy}/{performance.max_heavy_commands}，峰值{self.peak_active}），"
+            f"排队{waiting}",
+            f"- 放行{self.admitted}次，其中排队{self.queued}次（平均等待{avg_wait:.1f}毫秒）；"
+            f"群限流拒绝{self.rate_limited}次，过载拒绝{self.overloaded}次",
+        ]
+        if self._limited_groups:
+            top = "、".join(
+                f"{key}（{count}次）"
+                for key, count in self._limited_groups.most_common(TOP_GROUPS)
+            )
+            lines.append(f"- 限流最多的群: {top}")
+        return "\n".join(lines)
+
+
+# 全局命令准入控制
+admission_control = AdmissionController()
@@ -0,0 +1,352 @@
+import asyncio
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from astrbot.api import logger
+from astrbot.core.platform.sources.aiocqhttp.aiocqhttp_message_event import (
+    AiocqhttpMessageEvent,
+)
+
+from .tracing import span
+
+# 幂等的只读调用：超时、连接断开等失败时可以安全重试
+IDEMPOTENT_ACTIONS = frozenset(
+    {
+        "get_group_member_info",
+        "get_group_member_list",
+        "get_group_info",
+        "get_stranger_info",
+        "get_login_info",
+        "get_msg",
+    }
+)
+# 明确表示请求未被执行、稍后可重试的返回码（被限流）
+RETRYABLE_RETCODES = frozenset({1429})
+# 失败信息中表示被限流的关键词
+RATE_LIMIT_HINTS = ("频繁", "频率", "rate limit", "too many")
+
+
+def is_retryable(action: str, error: Exception) -> bool:
+    """
+    调用失败后是否重试\n
+    - OneBot 返回了失败（ActionFailed，带retcode）：只重试限流类拒绝，此时请求确定未被执行\n
+    - 超时、连接断开等：请求可能已经生效（如消息已发出），只重试幂等的只读调用，
+      发送消息、禁言等写操作重试会造成重复
+    """
+    retcode = getattr(error, "retcode", None)
+    if retcode is not None:
+        if retcode in RETRYABLE_RETCODES:
+            return True
+        result = getattr(error, "result", None)
+        wording = ""
+        if isinstance(result, dict):
+            wording = f"{result.get('wording') or ''} {result.get('msg') or ''}"
+        wording = f"{wording} {getattr(error, 'info', None) or ''}".lower()
+        return any(hint in wording for hint in RATE_LIMIT_HINTS)
+    return action in IDEMPOTENT_ACTIONS
+
+
+def queue_key(event: AiocqhttpMessageEvent) -> str:
+    """事件所属的出站队列：群聊按群号，私聊按用户（每个私聊会话单独限流）"""
+    group_id = event.get_group_id()
+    return str(group_id) if group_id else f"private:{event.get_sender_id()}"
+
+
+class TokenBucket:
+    """令牌桶：以rate个/秒的速度补充令牌，最多积攒capacity个"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def reserve(self, cost: float = 1.0) -> float:
+        """预定cost个令牌，返回需要等待的秒数（0表示可立即执行）"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= cost
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+    def try_take(self, cost: float = 1.0) -> bool:
+        """令牌足够时取出cost个并返回True，否则不扣减并返回False"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < cost:
+            return False
+        self.tokens -= cost
+        return True
+
+
+class OneBotApiQueue:
+    """
+    统一的 OneBot 出站调用队列\n
+    - 每个群一个令牌桶与一个FIFO工作协程，同群调用严格按提交顺序执行，不同群互不阻塞\n
+    - 只读调用失败、或任何调用被限流拒绝时按指数退避（带抖动）重试；
+      发送消息、禁言等写操作超时后不重试，避免重复发送\n
+    - 相同的只读请求（如get_group_member_info）在途时合并为一次调用\n
+    - 记录各动作的调用、失败、重试、合并次数与限流等待时间
+    """
+
+    def __init__(
+        self,
+        rate: float = 2.0,
+        burst: int = 5,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        idle_timeout: float = 60.0,
+    ):
+        # 每个群每秒允许的调用数与突发上限
+        self.rate = rate
+        self.burst = burst
+        # 重试次数与退避参数（秒）
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # 群队列空闲多久后回收工作协程（秒）
+        self.idle_timeout = idle_timeout
+
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._workers: Dict[str, asyncio.Task] = {}
+        # 在途的可合并请求 {合并键: Future}
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        # 统计数据 {动作名: {指标: 数值}}
+        self._metrics: Dict[str, Dict[str, float]] = {}
+
+    def _stat(self, action: str, key: str, value: float = 1) -> None:
+        stats = self._metrics.setdefault(
+            action,
+            {
+                "submitted": 0,
+                "succeeded": 0,
+                "failed": 0,
+                "retried": 0,
+                "coalesced": 0,
+                "throttle_wait": 0.0,
+                "latency": 0.0,
+            },
+        )
+        stats[key] += value
+
+    def submit(
+        self,
+        group_id: Any,
+        func: Callable[..., Awaitable[Any]],
+        /,
+        *args,
+        action: Optional[str] = None,
+        **kwargs,
+    ) -> asyncio.Future:
+        """
+        提交一次调用，立即返回Future（即发即忘时无需等待）\n
+        group_id: 限流与排序所属的群（私聊传 "private:<用户id>"，每个私聊会话各自排队），
+        仅限位置参数，kwargs会原样传给func\n
+        action: 统计用的动作名，默认取func的名称
+        """
+        loop = asyncio.get_running_loop()
+        group_key = str(group_id or "private:unknown")
+        action = action or getattr(func, "__name__", "call")
+        if group_key not in self._queues:
+            self._queues[group_key] = asyncio.Queue()
+            self._buckets[group_key] = TokenBucket(self.rate, self.burst)
+        worker = self._workers.get(group_key)
+        if worker is None or worker.done():
+            self._workers[group_key] = loop.create_task(self._run(group_key))
+        future = loop.create_future()
+        # 失败已在工作协程中记录日志，这里标记异常已被读取，避免“即发即忘”时的告警
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._queues[group_key].put_nowait(
+            (action, func, args, kwargs, future, time.monotonic())
+        )
+        self._stat(action, "submitted")
+        return future
+
+    async def call(
+        self,
+        group_id: Any,
+        func: Callable[..., Awaitable[Any]],
+        /,
+        *args,
+        action: Optional[str] = None,
+        coalesce_key: Optional[Hashable] = None,
+        **kwargs,
+    ) -> Any:
+        """
+        提交一次调用并等待结果\n
+        coalesce_key: 合并键，相同键的请求在途时直接共享其结果（仅用于只读请求）
+        """
+        with span("api_queue.call", action=action or getattr(func, "__name__", "call")):
+            if coalesce_key is None:
+                return await self.submit(group_id, func, *args, action=action, **kwargs)
+            inflight = self._inflight.get(coalesce_key)
+            if inflight is not None:
+                self._stat(action or getattr(func, "__name__", "call"), "coalesced")
+                return await asyncio.shield(inflight)
+            future = self.submit(group_id, func, *args, action=action, **kwargs)
+            self._inflight[coalesce_key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(coalesce_key, None))
+            return await asyncio.shield(future)
+
+    async def _run(self, group_key: str):
+        """群工作协程：按令牌桶节奏逐个执行该群的调用"""
+        queue = self._queues[group_key]
+        bucket = self._buckets[group_key]
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), self.idle_timeout)
+            except asyncio.TimeoutError:
+                # 长时间空闲则回收，避免群数量增长导致协程常驻
+                if queue.empty():
+                    self._queues.pop(group_key, None)
+                    self._buckets.pop(group_key, None)
+                    self._workers.pop(group_key, None)
+                    return
+                continue
+            action, func, args, kwargs, future, submitted_at = item
+            try:
+                wait = bucket.reserve()
+                if wait > 0:
+                    self._stat(action, "throttle_wait", wait)
+                    await asyncio.sleep(wait)
+                result = await self._call_with_retry(action, func, args, kwargs)
+                self._stat(action, "succeeded")
+                if not future.done():
+                    future.set_result(result)
+            except Exception as e:
+                self._stat(action, "failed")
+                logger.error(f"OneBot调用 {action} 失败（群{group_key}）: {e}")
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self._stat(action, "latency", time.monotonic() - submitted_at)
+                queue.task_done()
+
+    async def _call_with_retry(self, action, func, args, kwargs) -> Any:
+        """执行调用，可重试的失败（见is_retryable）按指数退避重试"""
+        attempt = 0
+        while True:
+            try:
+                return await func(*args, **kwargs)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(action, e):
+                    raise
+                delay = min(self.backoff_max, self.backoff_base * 2**attempt)
+                delay *= 0.5 + random.random() / 2
+                attempt += 1
+                self._stat(action, "retried")
+                logger.warning(
+                    f"OneBot调用 {action} 失败，{delay:.2f}秒后第{attempt}次重试: {e}"
+                )
+                await asyncio.sleep(delay)
+
+    # ---------- 常用调用的便捷封装 ----------
+    async def set_group_ban(
+        self, event: AiocqhttpMessageEvent, user_id: Any, duration: int
+    ) -> Any:
+        """禁言群成员（duration为秒，0为解除禁言）"""
+        group_id = event.get_group_id()
+        return await self.call(
+            group_id,
+            event.bot.set_group_ban,
+            action="set_group_ban",
+            group_id=int(group_id),
+            user_id=int(user_id),
+            duration=duration,
+        )
+
+    def submit_group_ban(
+        self, event: AiocqhttpMessageEvent, user_id: Any, duration: int
+    ) -> asyncio.Future:
+        """即发即忘地提交一次禁言，不等待执行结果"""
+        group_id = event.get_group_id()
+        return self.submit(
+            group_id,
+            event.bot.set_group_ban,
+            action="set_group_ban",
+            group_id=int(group_id),
+            user_id=int(user_id),
+            duration=duration,
+        )
+
+    async def get_group_member_info(
+        self, event: AiocqhttpMessageEvent, user_id: Any
+    ) -> Dict[str, Any]:
+        """获取群成员信息，相同成员的并发查询只会真正请求一次"""
+        group_id = event.get_group_id()
+        return await self.call(
+            group_id,
+            event.bot.get_group_member_info,
+            action="get_group_member_info",
+            coalesce_key=("get_group_member_info", str(group_id), str(user_id)),
+            group_id=int(group_id),
+            user_id=int(user_id),
+        )
+
+    async def send(self, event: AiocqhttpMessageEvent, result: Any) -> Any:
+        """经队列发送消息，保证同群（私聊为同一会话）消息按顺序发出"""
+        return await self.call(queue_key(event), event.send, result, action="send")
+
+    def metrics(self) -> Dict[str, Any]:
+        """返回统计快照：各动作的计数与平均延迟、当前各群排队数"""
+        actions = {}
+        for action, stats in self._metrics.items():
+            done = stats["succeeded"] + stats["failed"]
+            actions[action] = {
+                **stats,
+                "avg_latency": stats["latency"] / done if done else 0.0,
+            }
+        return {
+            "actions": actions,
+            "queue_depth": {g: q.qsize() for g, q in self._queues.items() if q.qsize()},
+            "active_groups": len(self._workers),
+        }
+
+    def format_summary(self) -> str:
+        """/性能统计 中的出站调用统计，尚无调用时为空"""
+        if not self._metrics:
+            return ""
+        snapshot = self.metrics()
+        lines = [
+            f"📤 OneBot调用: 活跃队列{snapshot['active_groups']}个，"
+            f"排队{sum(snapshot['queue_depth'].values())}个"
+        ]
+        for action, stats in sorted(
+            snapshot["actions"].items(), key=lambda item: -item[1]["submitted"]
+        ):
+            lines.append(
+                f"- {action}: 提交{stats['submitted']:.0f}次，成功{stats['succeeded']:.0f}，"
+                f"失败{stats['failed']:.0f}，重试{stats['retried']:.0f}，"
+                f"合并{stats['coalesced']:.0f}；限流等待{stats['throttle_wait']:.1f}秒，"
+                f"平均延迟{stats['avg_latency'] * 1000:.1f}毫秒"
+            )
+        return "\n".join(lines)
+
+    async def close(self):
+        """停止所有工作协程（未执行的调用将被取消）"""
+        workers = list(self._workers.values())
+        for worker in workers:
+            worker.cancel()
+        for worker in workers:
+            try:
+                await worker
+            except asyncio.CancelledError:
+                pass
+        for queue in self._queues.values():
+            while not queue.empty():
+                item = queue.get_nowait()
+                item[4].cancel()
+        self._workers.clear()
+        self._queues.clear()
+        self._buckets.clear()
+        self._inflight.clear()
+
+
+# 全局出站调用队列：所有子系统共享，同一群的调用统一限流
+api_queue = OneBotApiQueue()
@@ -0,0 +1,234 @@
+import functools
+import inspect
+import time
+from typing import Any, Callable, Dict, Iterable
+
+from astrbot.api import logger
+
+from .admission import ADMIT, BUSY, BYPASS, admission_control
+from .api_queue import api_queue
+from .group_index import group_index
+from .leases import LeaseTimeout, lease_manager
+from .metrics import command_metrics, current_command
+from .profiler import command_profiler, command_token
+from .singleflight import RUN, SHARE, single_flight
+from .tracing import current_span, tracer
+from .utils import get_at_ids
+
+# 多实例部署时，涉及的用户数据正被其他进程长时间占用
+LEASE_BUSY_MESSAGE = "⏳ 数据正被其他实例使用，请稍后再试~"
+
+# 命令额外涉及的用户 {命令处理函数名: resolver(event) -> 用户id列表}
+_lease_resolvers: Dict[str, Callable[[Any], Iterable[Any]]] = {}
+
+
+def register_lease_users(name: str, resolver: Callable[[Any], Iterable[Any]]) -> None:
+    """
+    登记命令额外涉及的用户（如锦标赛开赛时的全部参赛者）\n
+    命令入口与发送者、被at的用户一起一次性获取全部租约，执行中不再嵌套获取
+    """
+    _lease_resolvers[name] = resolver
+
+
+def _observe(event: Any) -> None:
+    """记录事件的发送者与群号"""
+    try:
+        group_index.observe(event.get_group_id(), event.get_sender_id())
+    except Exception as e:
+        logger.error(f"记录群成员失败: {str(e)}")
+
+
+def _join(name: str, event: Any, shareable: bool = True):
+    """重复命令判定，关闭时总是执行"""
+    if not single_flight.enabled:
+        return RUN, None
+    return single_flight.join(name, event, shareable)
+
+
+async def _skip(event: Any, verdict: str, flight: Any) -> Any:
+    """不执行重复的命令：等待同键调用结束（共享其结果）或直接丢弃，并阻止事件继续传播"""
+    result = await single_flight.wait(flight) if verdict == SHARE else None
+    event.stop_event()
+    return result
+
+
+def _lease_users(name: str, event: Any) -> list:
+    """命令涉及的用户（发送者、被at的用户与登记的额外用户），执行前获取其所在分片的租约"""
+    users = [str(event.get_sender_id())]
+    try:
+        users += get_at_ids(event)
+    except Exception:
+        pass
+    resolver = _lease_resolvers.get(name)
+    if resolver is not None:
+        try:
+            users += [str(uid) for uid in resolver(event)]
+        except Exception as e:
+            logger.error(f"获取命令 {name} 涉及的用户失败: {str(e)}")
+    return users
+
+
+def _begin_trace(name: str, event: Any):
+    """按采样率为本次调用创建根span"""
+    return tracer.begin(
+        name,
+        command=command_token(event),
+        user=str(event.get_sender_id()),
+        group=str(event.get_group_id() or ""),
+    )
+
+
+def tracked_command(func: Callable) -> Callable:
+    """
+    命令处理函数的公共入口装饰器（放在 @filter.command 之下、紧贴函数定义）\n
+    处理前记录发送者所在的群，并统计处理耗时（不含在yield处等待发送结果的时间）；
+    处理函数执行期间设置current_command，使其中的文件读写归属到该命令；
+    命令处于 /性能剖析 中时用cProfile采集本次调用；
+    被追踪采样时设置current_span，并把在yield处等待发送的时间记录为send span；
+    同一用户重复的命令（执行中的、刚完成的连点、适配器重发的消息）不再执行：
+    协程处理函数的重复调用等待并共享执行中调用的结果，异步生成器处理函数的结果已在yield处逐条发出、
+    无法再交给重复的调用，执行中的重复调用直接丢弃；
+    经准入控制（群限流、全局并发上限）放行后才执行，被拒绝时回复繁忙提示；
+    多实例部署时持有涉及用户所在分片的租约执行，等待超时回复繁忙提示；
+    保持被装饰函数的类型（异步生成器/协程）不变
+    """
+    name = func.__name__
+
+    if inspect.isasyncgenfunction(func):
+
+        async def tracked(self, event, *args, **kwargs):
+            profile = command_profiler.claim(name, event)
+            root = _begin_trace(name, event)
+            measure = command_metrics.enabled
+            if not measure and profile is None and root is None:
+                async for result in func(self, event, *args, **kwargs):
+                    yield result
+                return
+            elapsed = 0
+            error = True
+            agen = func(self, event, *args, **kwargs)
+            try:
+                while True:
+                    started = time.perf_counter_ns()
+                    token = current_command.set(name)
+                    span_token = current_span.set(root)
+                    step = agen.__anext__()
+                    if profile is not None:
+                        step = command_profiler.wrap(step, profile)
+                    try:
+                        result = await step
+                    except StopAsyncIteration:
+                        error = False
+                        return
+                    finally:
+                        current_span.reset(span_token)
+                        current_command.reset(token)
+                        elapsed += time.perf_counter_ns() - started
+                    if root is None:
+                        yield result
+                        continue
+                    send = tracer.child(root, "send")
+                    try:
+                        yield result
+                    finally:
+                        send.finish()
+            except GeneratorExit:
+                # 调用方提前关闭生成器不算出错
+                error = False
+                raise
+            finally:
+                await agen.aclose()
+                if profile is not None:
+                    command_profiler.complete(name, profile)
+                if root is not None:
+                    tracer.end(root, error)
+                if measure:
+                    command_metrics.record(name, elapsed, error)
+
+        @functools.wraps(func)
+        async def gen_wrapper(self, event, *args, **kwargs):
+            _observe(event)
+            verdict, flight = _join(name, event, shareable=False)
+            if verdict != RUN:
+                await _skip(event, verdict, flight)
+                return
+            try:
+                admission, message = await admission_control.admit(name, event)
+                if admission == BUSY:
+                    yield event.plain_result(message)
+                if admission not in (ADMIT, BYPASS):
+                    return
+                try:
+                    async with lease_manager.hold(_lease_users(name, event)):
+                        agen = tracked(self, event, *args, **kwargs)
+                        try:
+                            async for result in agen:
+                                yield result
+                        finally:
+                            await agen.aclose()
+                except LeaseTimeout:
+                    yield event.plain_result(LEASE_BUSY_MESSAGE)
+                finally:
+                    if admission == ADMIT:
+                        admission_control.release(name)
+            finally:
+                if flight is not None:
+                    single_flight.finish(flight)
+
+        return gen_wrapper
+
+    async def tracked_call(self, event, *args, **kwargs):
+        profile = command_profiler.claim(name, event)
+        root = _begin_trace(name, event)
+        measure = command_metrics.enabled
+        if not measure and profile is None and root is None:
+            return await func(self, event, *args, **kwargs)
+        started = time.perf_counter_ns()
+        token = current_command.set(name)
+        span_token = current_span.set(root)
+        error = True
+        try:
+            call = func(self, event, *args, **kwargs)
+            if profile is not None:
+                call = command_profiler.wrap(call, profile)
+            result = await call
+            error = False
+            return result
+        finally:
+            current_span.reset(span_token)
+            current_command.reset(token)
+            if profile is not None:
+                command_profiler.complete(name, profile)
+            if root is not None:
+                tracer.end(root, error)
+            if measure:
+                command_metrics.record(name, time.perf_counter_ns() - started, error)
+
+    @functools.wraps(func)
+    async def wrapper(self, event, *args, **kwargs):
+        _observe(event)
+        verdict, flight = _join(name, event)
+        if verdict != RUN:
+            return await _skip(event, verdict, flight)
+        result = None
+        try:
+            admission, message = await admission_control.admit(name, event)
+            if admission == BUSY:
+                await api_queue.send(event, event.plain_result(message))
+            if admission not in (ADMIT, BYPASS):
+                return None
+            try:
+                async with lease_manager.hold(_lease_users(name, event)):
+                    result = await tracked_call(self, event, *args, **kwargs)
+                return result
+            except LeaseTimeout:
+                await api_queue.send(event, event.plain_result(LEASE_BUSY_MESSAGE))
+                return None
+            finally:
+                if admission == ADMIT:
+                    admission_control.release(name)
+        finally:
+            if flight is not None:
+                single_flight.finish(flight, result)
+
+    return wrapper
@@ -0,0 +1,277 @@
+import asyncio
+import inspect
+from dataclasses import dataclass, field, fields, replace
+from typing import Any, Callable, Dict, List, Optional
+
+from astrbot.api import logger
+
+
+# ---------- 配置快照（与 _conf_schema.json 的分组一一对应，均不可变） ----------
+@dataclass(frozen=True)
+class EnhancedWifeConfig:
+    date_cooldown: int = 0
+    confession_cooldown: int = 0
+    propose_cooldown: int = 0
+    confession_wait: int = 0
+
+
+@dataclass(frozen=True)
+class QuestConfig:
+    daily_refresh: int = 0
+    weekly_refresh: int = 0
+    special_refresh: int = 0
+    quest_complete_delay: int = 0
+
+
+@dataclass(frozen=True)
+class ShopConfig:
+    signin_cooldown: int = 10
+    streak_expire: int = 86400
+    protection_duration: int = 86400
+    luck_duration: int = 86400
+    workboost_duration: int = 604800
+
+
+@dataclass(frozen=True)
+class BattleConfig:
+    duel_cooldown: int = 300
+    combat_effectiveness_coefficient: float = 2.0
+
+
+@dataclass(frozen=True)
+class SynthesisConfig:
+    synthesis_cooldown: int = 0
+    decompose_cooldown: int = 0
+    batch_synthesis_delay: int = 0
+
+
+@dataclass(frozen=True)
+class OtherConfig:
+    draw_card_cooldown: int = 10
+    exercise_cooldown: int = 5
+    breakthrough_cooldown: int = 5
+    idcard_cooldown: int = 10
+    cpwsc_cooldown: int = 10
+
+
+@dataclass(frozen=True)
+class WifeConfig:
+    random_marry_cooldown: int = 0
+    force_marry_cooldown: int = 0
+    work_cooldown: int = 0
+    hug_cooldown: int = 0
+    shopping_cooldown: int = 0
+    steal_wife_cooldown: int = 0
+    welfare_cooldown: int = 0
+    lottery_cooldown: int = 0
+
+
+@dataclass(frozen=True)
+class PerformanceConfig:
+    metrics_enabled: bool = True
+    watchdog_enabled: bool = True
+    loop_lag_threshold_ms: int = 200
+    trace_sample_rate: float = 0.0
+    trace_file_max_kb: int = 4096
+    trace_max_files: int = 5
+    singleflight_enabled: bool = True
+    duplicate_window_ms: int = 1000
+    admission_enabled: bool = True
+    group_command_rate: float = 2.0
+    group_command_burst: int = 10
+    max_concurrent_commands: int = 32
+    max_heavy_commands: int = 4
+    admission_wait_ms: int = 3000
+
+
+@dataclass(frozen=True)
+class ClusterConfig:
+    enabled: bool = False
+    lease_ttl: int = 15
+    lease_wait_ms: int = 5000
+
+
+@dataclass(frozen=True)
+class PluginConfig:
+    """插件配置快照，字段名即配置文件中的分组名"""
+
+    enhanced_wife_system: EnhancedWifeConfig = field(default_factory=EnhancedWifeConfig)
+    quest_system: QuestConfig = field(default_factory=QuestConfig)
+    shop_system: ShopConfig = field(default_factory=ShopConfig)
+    battle_system: BattleConfig = field(default_factory=BattleConfig)
+    synthesis_system: SynthesisConfig = field(default_factory=SynthesisConfig)
+    other_system: OtherConfig = field(default_factory=OtherConfig)
+    wife_system: WifeConfig = field(default_factory=WifeConfig)
+    performance_system: PerformanceConfig = field(default_factory=PerformanceConfig)
+    cluster_system: ClusterConfig = field(default_factory=ClusterConfig)
+
+    # 便捷访问
+    @property
+    def battle(self) -> BattleConfig:
+        return self.battle_system
+
+    @property
+    def shop(self) -> ShopConfig:
+        return self.shop_system
+
+    @property
+    def other(self) -> OtherConfig:
+        return self.other_system
+
+    @property
+    def performance(self) -> PerformanceConfig:
+        return self.performance_system
+
+    @property
+    def cluster(self) -> ClusterConfig:
+        return self.cluster_system
+
+
+def _coerce(value: Any, default: Any) -> Any:
+    """按默认值的类型转换配置值，无法转换时返回默认值"""
+    try:
+        if isinstance(default, bool):
+            return bool(value)
+        if isinstance(default, int):
+            return int(value)
+        if isinstance(default, float):
+            return float(value)
+    except (TypeError, ValueError):
+        return default
+    return value
+
+
+def _build_section(section_cls, raw: Any):
+    """由原始配置字典构建一个配置分组，缺失或非法的字段使用默认值"""
+    default = section_cls()
+    if not isinstance(raw, dict):
+        return default
+    values = {}
+    for f in fields(section_cls):
+        if f.name in raw:
+            values[f.name] = _coerce(raw[f.name], getattr(default, f.name))
+    return replace(default, **values)
+
+
+def build_config(raw: Optional[Dict[str, Any]]) -> PluginConfig:
+    """由原始配置字典构建完整的配置快照"""
+    raw = raw or {}
+    return PluginConfig(
+        **{
+            f.name: _build_section(type(getattr(PluginConfig(), f.name)), raw.get(f.name))
+            for f in fields(PluginConfig)
+        }
+    )
+
+
+# 订阅者回调: callback(旧快照, 新快照)，可为普通函数或协程函数
+ConfigListener = Callable[[PluginConfig, PluginConfig], Any]
+
+
+class ConfigService:
+    """
+    插件配置服务\n
+    - 插件加载时从 AstrBotConfig 读取一次，之后所有子系统只读内存中的不可变快照\n
+    - 通过update()原子地替换快照，并在后台持久化到配置文件\n
+    - 配置变更时通知订阅者
+    """
+
+    def __init__(self):
+        self._snapshot = PluginConfig()
+        # AstrBot 提供的配置对象（dict子类，带save_config方法）
+        self._raw: Optional[Dict[str, Any]] = None
+        self._listeners: List[ConfigListener] = []
+        # 后台持久化任务
+        self._persist_task: Optional[asyncio.Task] = None
+        self._dirty = False
+
+    @property
+    def snapshot(self) -> PluginConfig:
+        """当前配置快照（不可变，可安全地跨await持有）"""
+        return self._snapshot
+
+    def load(self, config: Optional[Dict[str, Any]]) -> PluginConfig:
+        """从 AstrBotConfig 加载配置（插件初始化时调用一次）"""
+        self._raw = config
+        old, self._snapshot = self._snapshot, build_config(config)
+        self._notify(old, self._snapshot)
+        return self._snapshot
+
+    def subscribe(self, listener: ConfigListener) -> Callable[[], None]:
+        """订阅配置变更，返回取消订阅的函数"""
+        self._listeners.append(listener)
+
+        def unsubscribe():
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+        return unsubscribe
+
+    def update(self, section: str, **changes) -> PluginConfig:
+        """
+        更新某个配置分组的若干字段，例如 update("battle_system", duel_cooldown=60)\n
+        新快照立即生效，配置文件在后台写入；未知的分组或字段抛出KeyError
+        """
+        if section not in {f.name for f in fields(PluginConfig)}:
+            raise KeyError(f"未知的配置分组: {section}")
+        old = self._snapshot
+        current = getattr(old, section)
+        known = {f.name for f in fields(current)}
+        unknown = set(changes) - known
+        if unknown:
+            raise KeyError(f"未知的配置项: {section}.{', '.join(sorted(unknown))}")
+        changes = {k: _coerce(v, getattr(current, k)) for k, v in changes.items()}
+        new = replace(old, **{section: replace(current, **changes)})
+        self._snapshot = new
+        if self._raw is not None:
+            self._raw.setdefault(section, {}).update(changes)
+            self._schedule_persist()
+        self._notify(old, new)
+        return new
+
+    def _notify(self, old: PluginConfig, new: PluginConfig) -> None:
+        """通知订阅者，单个订阅者出错不影响其他订阅者"""
+        if old == new:
+            return
+        for listener in list(self._listeners):
+            try:
+                result = listener(old, new)
+                if inspect.isawaitable(result):
+                    asyncio.ensure_future(result)
+            except Exception as e:
+                logger.error(f"配置变更通知失败: {str(e)}")
+
+    def _schedule_persist(self) -> None:
+        """标记待写入，合并短时间内的多次修改为一次写文件"""
+        self._dirty = True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._save()
+            return
+        if self._persist_task is None or self._persist_task.done():
+            self._persist_task = loop.create_task(self._persist())
+
+    async def _persist(self) -> None:
+        loop = asyncio.get_running_loop()
+        while self._dirty:
+            self._dirty = False
+            await loop.run_in_executor(None, self._save)
+
+    def _save(self) -> None:
+        save = getattr(self._raw, "save_config", None)
+        if save is None:
+            return
+        try:
+            save()
+        except Exception as e:
+            logger.error(f"保存配置文件失败: {str(e)}")
+
+    async def flush(self) -> None:
+        """等待未完成的配置写入（插件卸载时调用）"""
+        if self._persist_task is not None and not self._persist_task.done():
+            await self._persist_task
+
+
+# 全局配置服务：各子系统共享同一份快照
+config_service = ConfigService()
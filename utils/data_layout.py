@@ -0,0 +1,266 @@
+import asyncio
+import hashlib
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Set, Tuple
+
+from astrbot.api import logger
+
+from .io_executor import io_executor
+
+# 存放用户文件的目录：目录名 -> 文件名是否带群号后缀（<user_id>_<group_id>.json）
+USER_DIRS = {
+    "user_data": False,
+    "user_backpack": False,
+    "user_workshop": True,
+    "user_inventory": True,
+}
+# 分层目录的层数：取用户id的MD5十六进制前几位，每位一层（如 user_data/3/f/<user_id>.json），
+# 共 16**SHARD_LEVELS 个子目录；同一用户在各群的文件位于同一子目录
+SHARD_LEVELS = 2
+# 后台迁移每批移动的文件数（每批在读写线程池中执行，批次之间让出事件循环）
+MIGRATE_BATCH = 500
+# 迁移时分层路径已存在（新布局写入过），平铺的旧文件改名加上该后缀保留
+CONFLICT_SUFFIX = ".legacy"
+
+
+def owner_of(directory: str, file_name: str) -> str:
+    """由文件名解析所属用户id"""
+    stem = file_name[:-5] if file_name.endswith(".json") else file_name
+    if USER_DIRS.get(directory):
+        return stem.rsplit("_", 1)[0]
+    return stem
+
+
+def file_name_of(user_id: Any, group_id: Any = None) -> str:
+    return f"{user_id}_{group_id}.json" if group_id is not None else f"{user_id}.json"
+
+
+def shard_prefix(user_id: Any) -> Tuple[str, ...]:
+    """用户所在的分层子目录（各层目录名）"""
+    digest = hashlib.md5(str(user_id).encode("utf-8")).hexdigest()
+    return tuple(digest[:SHARD_LEVELS])
+
+
+def sharded_path(directory: Path, file_name: str) -> Path:
+    """用户文件在分层布局中的路径（只计算路径，不访问磁盘）"""
+    return directory.joinpath(*shard_prefix(owner_of(directory.name, file_name)), file_name)
+
+
+def user_file(directory: Path, user_id: Any, group_id: Any = None) -> Path:
+    """用户（在某个群）的文件在分层布局中的路径（只计算路径，不访问磁盘）"""
+    return directory.joinpath(*shard_prefix(user_id), file_name_of(user_id, group_id))
+
+
+def locate_user_file(directory: Path, user_id: Any, group_id: Any = None) -> Path:
+    """
+    只读地定位用户文件：分层路径不存在而平铺的旧文件存在时返回旧文件（不迁移）\n
+    供线程或子进程中的全量扫描使用
+    """
+    target = user_file(directory, user_id, group_id)
+    if not target.exists():
+        legacy = directory / target.name
+        if legacy.exists():
+            return legacy
+    return target
+
+
+def _json_files(directory: Path, limit: int = 0) -> Iterator[str]:
+    """目录中直接包含的.json文件名（不进入子目录），limit>0时最多产出limit个"""
+    count = 0
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(".json") and entry.is_file():
+                    yield entry.name
+                    count += 1
+                    if count == limit:
+                        return
+    except FileNotFoundError:
+        return
+
+
+def _shard_dirs(directory: Path, level: int = 0) -> Iterator[Path]:
+    """分层布局中所有最底层的子目录"""
+    try:
+        with os.scandir(directory) as entries:
+            subdirs = [
+                Path(entry.path)
+                for entry in entries
+                if len(entry.name) == 1 and entry.is_dir()
+            ]
+    except FileNotFoundError:
+        return
+    for subdir in sorted(subdirs):
+        if level + 1 == SHARD_LEVELS:
+            yield subdir
+        else:
+            yield from _shard_dirs(subdir, level + 1)
+
+
+def iter_user_files(directory: Path) -> Iterator[Path]:
+    """
+    逐个产出目录中的用户文件（平铺的旧文件与分层布局中的文件），不一次性列出整个目录\n
+    扫描期间被迁移的文件可能在两处各出现一次，按文件名去重
+    """
+    legacy: Set[str] = set()
+    for name in _json_files(directory):
+        legacy.add(name)
+        yield directory / name
+    for subdir in _shard_dirs(directory):
+        for name in _json_files(subdir):
+            if name not in legacy:
+                yield subdir / name
+
+
+class DataLayout:
+    """
+    用户文件的分层目录布局\n
+    - 用户文件位于 <目录>/<a>/<b>/<文件名>，避免单个目录下有数十万个文件\n
+    - 读写用户文件前 await user_path()：目录仍有平铺旧文件时，在读写线程池中把对应的旧文件移动到分层路径
+      （访问时迁移）；目录迁移完成后直接返回路径，不访问磁盘\n
+    - 启动后在后台分批迁移剩余的平铺文件
+    """
+
+    def __init__(self):
+        # 目录 -> 是否可能还有未迁移的平铺文件
+        self._legacy: Dict[Path, bool] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.migrated_on_access = 0
+        self.migrated_in_background = 0
+        self.conflicts = 0
+
+    def _has_legacy(self, directory: Path) -> bool:
+        """（在线程中执行）"""
+        pending = self._legacy.get(directory)
+        if pending is None:
+            pending = self._legacy[directory] = any(True for _ in _json_files(directory, 1))
+        return pending
+
+    def _migrate(self, legacy: Path, target: Path) -> bool:
+        """把平铺的旧文件移动到分层路径，返回是否移动（可在线程中执行）"""
+        try:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            if target.exists():
+                # 分层路径已由新布局写入，旧文件改名保留以便人工核对
+                self.conflicts += 1
+                os.replace(legacy, legacy.with_name(legacy.name + CONFLICT_SUFFIX))
+                logger.warning(f"用户文件 {legacy.name} 在分层目录中已存在，旧文件已改名保留")
+                return False
+            os.replace(legacy, target)
+            return True
+        except FileNotFoundError:
+            # 已被并发的访问或其他进程迁移
+            return False
+        except Exception as e:
+            logger.error(f"迁移用户文件 {legacy} 失败: {str(e)}")
+            return False
+
+    def _prepare(self, path: Path) -> None:
+        """分层路径对应的平铺旧文件仍存在时先迁移（在读写线程池中执行）"""
+        directory = path.parents[SHARD_LEVELS]
+        if self._has_legacy(directory):
+            legacy = directory / path.name
+            if legacy.exists() and self._migrate(legacy, path):
+                self.migrated_on_access += 1
+
+    async def prepare(self, path: Path) -> Path:
+        """确保分层路径上的用户文件已从旧路径迁移，返回path"""
+        if self._legacy.get(path.parents[SHARD_LEVELS]) is not False:
+            await asyncio.get_running_loop().run_in_executor(io_executor, self._prepare, path)
+        return path
+
+    async def user_path(self, directory: Path, user_id: Any, group_id: Any = None) -> Path:
+        """读写用户（在某个群）的文件前获取其路径，所有用户文件的读写都应经过此函数"""
+        return await self.prepare(user_file(directory, user_id, group_id))
+
+    # ---------- 后台迁移 ----------
+    def start(self) -> None:
+        """在后台迁移所有平铺的旧文件（在插件initialize中调用）"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._migrate_all())
+
+    async def stop(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    def _migrate_batch(self, directory: Path, failed: Set[str]) -> Tuple[int, int]:
+        """
+        迁移一批旧文件，返回(找到的文件数, 移动的文件数)\n
+        跳过failed中的文件；移动失败而仍留在原位置的文件加入failed，之后的批次不再重试
+        """
+        names = []
+        for name in _json_files(directory):
+            if name not in failed:
+                names.append(name)
+                if len(names) == MIGRATE_BATCH:
+                    break
+        moved = 0
+        for name in names:
+            legacy = directory / name
+            if self._migrate(legacy, sharded_path(directory, name)):
+                moved += 1
+            elif legacy.exists():
+                failed.add(name)
+        return len(names), moved
+
+    async def _migrate_all(self) -> None:
+        # 延迟导入，避免 utils -> data_layout 循环导入
+        from .utils import PLUGIN_DATA_DIR
+
+        loop = asyncio.get_running_loop()
+        for name in USER_DIRS:
+            directory = PLUGIN_DATA_DIR / name
+            if not self._has_legacy(directory):
+                continue
+            started = time.perf_counter()
+            total = 0
+            failed: Set[str] = set()
+            try:
+                while True:
+                    found, moved = await loop.run_in_executor(
+                        io_executor, self._migrate_batch, directory, failed
+                    )
+                    total += moved
+                    self.migrated_in_background += moved
+                    if found < MIGRATE_BATCH:
+                        break
+                    await asyncio.sleep(0)
+            except Exception as e:
+                logger.error(f"迁移 {name} 目录失败: {str(e)}")
+                continue
+            if failed:
+                # 迁移失败的旧文件仍在原位置，保留访问时迁移
+                logger.warning(f"{name} 目录有{len(failed)}个文件迁移失败，已保留在原位置")
+            else:
+                self._legacy[directory] = False
+            logger.info(
+                f"{name} 目录已迁移到分层布局: 移动{total}个文件，"
+                f"耗时{time.perf_counter() - started:.2f}秒"
+            )
+
+    def format_summary(self) -> str:
+        migrated = self.migrated_on_access + self.migrated_in_background
+        pending = [directory.name for directory, legacy in self._legacy.items() if legacy]
+        if not (migrated or pending):
+            return ""
+        line = (
+            f"🗂️ 用户目录迁移: 访问时迁移{self.migrated_on_access}个，"
+            f"后台迁移{self.migrated_in_background}个文件"
+        )
+        if self.conflicts:
+            line += f"，冲突{self.conflicts}个"
+        if pending:
+            line += f"；仍有旧文件: {'、'.join(pending)}"
+        return line
+
+
+# 全局用户文件布局
+data_layout = DataLayout()
+user_path = data_layout.user_path
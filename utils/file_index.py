@@ -0,0 +1,152 @@
+import asyncio
+from pathlib import Path
+from typing import Any, Dict, List, Set, Tuple
+
+from astrbot.api import logger
+
+from .data_layout import USER_DIRS, data_layout, iter_user_files, owner_of, sharded_path
+from .io_executor import io_executor
+from .utils import PLUGIN_DATA_DIR, BatchedJsonStore, on_user_save, read_json_sync
+
+
+def _normalize(relative: str) -> str:
+    """平铺布局的相对路径（user_data/<文件名>）转换为分层布局中的路径"""
+    directory, _, name = relative.partition("/")
+    if directory in USER_DIRS and "/" not in name:
+        return sharded_path(Path(directory), name).as_posix()
+    return relative
+
+
+class FileOwnershipIndex:
+    """
+    用户文件归属索引 {user_id: {相对于数据目录的路径}}\n
+    - 各系统写入用户文件时登记，删除与导出直接按索引定位文件，无需扫描整个目录\n
+    - 索引文件不存在时扫描一次USER_DIRS重建\n
+    - 登记的是分层布局中的路径，旧索引中的平铺路径在加载时转换，定位文件时先迁移仍未移动的旧文件\n
+    - 多实例时写入前持有索引租约，把本进程登记有变化的用户合并到磁盘上的索引
+    """
+
+    def __init__(self, data_dir=None):
+        self.data_dir = data_dir or PLUGIN_DATA_DIR
+        self.file_path = self.data_dir / "file_index.json"
+        self._files: Dict[str, Set[str]] = {}
+        self._loaded = False
+        # 上次写入后登记有变化的用户（多实例时只把这些用户合并到其他进程写入的索引中）
+        self._changed: Set[str] = set()
+        self._store = BatchedJsonStore(self.file_path, self._dump, merge=self._merge)
+        on_user_save("user_data", self._on_user_data)
+        on_user_save("user_backpack", self._on_backpack)
+
+    def _read(self) -> Tuple[Dict[str, Set[str]], bool]:
+        """
+        读取索引文件，缺失时扫描USER_DIRS重建（不修改实例状态，可在线程中执行）\n
+        返回(索引, 是否需要写回)：重建或转换了平铺路径时需要写回
+        """
+        if not self.file_path.exists():
+            return self._scan(), True
+        stored = read_json_sync(self.file_path)
+        files = {uid: {_normalize(p) for p in paths} for uid, paths in stored.items()}
+        return files, any(set(paths) != files[uid] for uid, paths in stored.items())
+
+    def _scan(self) -> Dict[str, Set[str]]:
+        files: Dict[str, Set[str]] = {}
+        for directory in USER_DIRS:
+            for path in iter_user_files(self.data_dir / directory):
+                files.setdefault(owner_of(directory, path.name), set()).add(
+                    sharded_path(Path(directory), path.name).as_posix()
+                )
+        logger.info(f"用户文件索引已重建: {len(files)}个用户")
+        return files
+
+    def _install(self, files: Dict[str, Set[str]], dirty: bool) -> None:
+        self._files = files
+        self._loaded = True
+        if dirty:
+            self._changed.update(files)
+            self._store.mark_dirty()
+
+    def _mark_changed(self, user_id: str) -> None:
+        self._changed.add(user_id)
+        self._store.mark_dirty()
+
+    def _dump(self) -> Dict[str, List[str]]:
+        self._changed.clear()
+        return {uid: sorted(paths) for uid, paths in self._files.items()}
+
+    def _merge(self, stored: Dict[str, List[str]]) -> Dict[str, List[str]]:
+        """多实例：把本进程登记有变化的用户合并到磁盘上的索引，并采用合并结果（含其他进程的登记）"""
+        for user_id in self._changed:
+            paths = self._files.get(user_id)
+            if paths is None:
+                stored.pop(user_id, None)
+            else:
+                stored[user_id] = sorted(paths)
+        self._changed.clear()
+        self._files = {uid: set(paths) for uid, paths in stored.items()}
+        return stored
+
+    async def load(self) -> None:
+        """在读写线程池中加载或重建索引（在插件initialize中调用，避免首个命令在事件循环中扫描用户目录）"""
+        if self._loaded:
+            return
+        files, dirty = await asyncio.get_running_loop().run_in_executor(
+            io_executor, self._read
+        )
+        if not self._loaded:
+            self._install(files, dirty)
+
+    def _ensure_loaded(self) -> None:
+        """未经load()加载时（如离线工具中）在首次使用时同步加载"""
+        if not self._loaded:
+            self._install(*self._read())
+
+    def _relative(self, path: Path) -> str:
+        return _normalize(Path(path).resolve().relative_to(self.data_dir.resolve()).as_posix())
+
+    def add(self, user_id: Any, path: Path) -> None:
+        """登记用户拥有的文件"""
+        self._ensure_loaded()
+        relative = self._relative(path)
+        paths = self._files.setdefault(str(user_id), set())
+        if relative not in paths:
+            paths.add(relative)
+            self._mark_changed(str(user_id))
+
+    def discard(self, user_id: Any, path: Path) -> None:
+        self._ensure_loaded()
+        paths = self._files.get(str(user_id))
+        if paths is not None and self._relative(path) in paths:
+            paths.discard(self._relative(path))
+            if not paths:
+                del self._files[str(user_id)]
+            self._mark_changed(str(user_id))
+
+    async def files_of(self, user_id: Any) -> List[Path]:
+        """用户拥有的文件（绝对路径，仍在平铺旧路径的文件先迁移）"""
+        self._ensure_loaded()
+        files = []
+        for relative in sorted(self._files.get(str(user_id), ())):
+            path = self.data_dir / relative
+            if relative.partition("/")[0] in USER_DIRS:
+                await data_layout.prepare(path)
+            files.append(path)
+        return files
+
+    def forget(self, user_id: Any) -> None:
+        """移除用户的全部登记"""
+        self._ensure_loaded()
+        if self._files.pop(str(user_id), None) is not None:
+            self._mark_changed(str(user_id))
+
+    def _on_user_data(self, user_id: str, _data: Dict[str, Any]) -> None:
+        self.add(user_id, sharded_path(self.data_dir / "user_data", f"{user_id}.json"))
+
+    def _on_backpack(self, user_id: str, _data: Dict[str, Any]) -> None:
+        self.add(user_id, sharded_path(self.data_dir / "user_backpack", f"{user_id}.json"))
+
+    async def flush(self) -> None:
+        await self._store.flush()
+
+
+# 全局用户文件索引
+file_index = FileOwnershipIndex()
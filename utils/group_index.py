@@ -0,0 +1,316 @@
+import asyncio
+import json
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from astrbot.api import logger
+
+from .io_executor import io_executor
+from .leases import LeaseTimeout, lease_manager
+from .utils import PLUGIN_DATA_DIR, read_json_sync, write_json_sync
+
+# 超过该时长（秒）未在群内出现的成员会被移出索引
+MEMBER_TTL = 30 * 86400
+# 同一成员的最近出现时间至少间隔该时长（秒）才写入日志，避免每条命令都写盘
+TOUCH_INTERVAL = 3600
+# 日志累计多少行后写入快照并清空日志
+COMPACT_LINES = 5000
+# 日志合并写入的延迟（秒）
+FLUSH_DELAY = 1.0
+
+# 成员变动回调 callback(group_id, user_id)
+MembershipListener = Callable[[str, str], Any]
+
+
+def _put(members: Dict, user_groups: Dict, group_id: str, user_id: str, seen: float):
+    members.setdefault(group_id, {})[user_id] = seen
+    user_groups.setdefault(user_id, {})[group_id] = seen
+
+
+def _drop(members: Dict, user_groups: Dict, group_id: str, user_id: str):
+    seen_by_user = members.get(group_id)
+    if seen_by_user is not None:
+        seen_by_user.pop(user_id, None)
+        if not seen_by_user:
+            del members[group_id]
+    groups = user_groups.get(user_id)
+    if groups is not None:
+        groups.pop(group_id, None)
+        if not groups:
+            del user_groups[user_id]
+
+
+def _replay(members: Dict, user_groups: Dict, line: str) -> None:
+    try:
+        op, group_id, user_id, seen = json.loads(line)
+    except (ValueError, TypeError):
+        # 进程退出时可能留下不完整的最后一行
+        return
+    if op == "+":
+        _put(members, user_groups, group_id, user_id, seen)
+    else:
+        _drop(members, user_groups, group_id, user_id)
+
+
+class GroupIndex:
+    """
+    群成员索引\n
+    - 由处理过的事件（发送者 + 群号）构建：{group_id: {user_id: 最近出现时间}} 及反向索引\n
+    - 新成员与出现时间的变化追加写入 group_index.log，定期合并为 group_index.json 快照\n
+    - 超过MEMBER_TTL未出现的成员在每日清理时移除\n
+    - 查询成员/所在群均为O(1)\n
+    - 多实例时追加日志与合并快照均持有索引租约，合并前先重放所有进程追加的日志
+    """
+
+    def __init__(self, data_dir=None):
+        data_dir = data_dir or PLUGIN_DATA_DIR
+        self.snapshot_file = data_dir / "group_index.json"
+        self.journal_file = data_dir / "group_index.log"
+        self._members: Dict[str, Dict[str, float]] = {}
+        self._user_groups: Dict[str, Dict[str, float]] = {}
+        self._loaded = False
+        # 待追加的日志行与日志中已有的行数
+        self._journal: List[str] = []
+        self._journal_lines = 0
+        self._flush_task: Optional[asyncio.Task] = None
+        # 追加日志与合并快照互斥，避免合并时截断刚追加的日志
+        self._io_lock = asyncio.Lock()
+        self._join_listeners: List[MembershipListener] = []
+        self._leave_listeners: List[MembershipListener] = []
+
+    # ---------- 加载 ----------
+    def _recover(self) -> Tuple[Dict, Dict, int]:
+        """读取快照并重放日志，返回(成员索引, 反向索引, 日志行数)（不修改实例状态，可在线程中执行）"""
+        members: Dict[str, Dict[str, float]] = {}
+        user_groups: Dict[str, Dict[str, float]] = {}
+        for group_id, seen_by_user in read_json_sync(self.snapshot_file).items():
+            for user_id, seen in seen_by_user.items():
+                _put(members, user_groups, group_id, user_id, seen)
+        lines = 0
+        if self.journal_file.exists():
+            try:
+                with open(self.journal_file, "r", encoding="utf-8") as f:
+                    for line in f:
+                        _replay(members, user_groups, line)
+                        lines += 1
+            except Exception as e:
+                logger.error(f"读取群成员日志失败: {str(e)}")
+        return members, user_groups, lines
+
+    def _install(self, state: Tuple[Dict, Dict, int]) -> None:
+        self._members, self._user_groups, self._journal_lines = state
+        self._loaded = True
+        self._prune(time.time())
+
+    async def load(self) -> None:
+        """在读写线程池中加载索引（在插件initialize中调用，避免首个命令在事件循环中重放日志）"""
+        if self._loaded:
+            return
+        state = await asyncio.get_running_loop().run_in_executor(
+            io_executor, self._recover
+        )
+        if not self._loaded:
+            self._install(state)
+
+    def _ensure_loaded(self) -> None:
+        """未经load()加载时（如离线工具中）在首次使用时同步加载"""
+        if not self._loaded:
+            self._install(self._recover())
+
+    def _set(self, group_id: str, user_id: str, seen: float) -> None:
+        _put(self._members, self._user_groups, group_id, user_id, seen)
+
+    def _unset(self, group_id: str, user_id: str) -> None:
+        _drop(self._members, self._user_groups, group_id, user_id)
+
+    # ---------- 更新 ----------
+    def observe(self, group_id: Any, user_id: Any) -> None:
+        """记录用户在群内出现（由命令处理入口调用）"""
+        if not group_id or not user_id:
+            return
+        self._ensure_loaded()
+        group_id, user_id = str(group_id), str(user_id)
+        now = time.time()
+        last = self._members.get(group_id, {}).get(user_id)
+        if last is not None and now - last < TOUCH_INTERVAL:
+            return
+        self._set(group_id, user_id, now)
+        self._append(["+", group_id, user_id, now])
+        if last is None:
+            self._notify(self._join_listeners, group_id, user_id)
+
+    def remove_user(self, user_id: Any) -> None:
+        """从所有群中移除用户"""
+        self._ensure_loaded()
+        user_id = str(user_id)
+        for group_id in list(self._user_groups.get(user_id, ())):
+            self._remove(group_id, user_id)
+
+    def _remove(self, group_id: str, user_id: str) -> None:
+        self._unset(group_id, user_id)
+        self._append(["-", group_id, user_id, 0])
+        self._notify(self._leave_listeners, group_id, user_id)
+
+    def _prune(self, now: float) -> int:
+        expired = [
+            (group_id, user_id)
+            for group_id, members in self._members.items()
+            for user_id, seen in members.items()
+            if now - seen > MEMBER_TTL
+        ]
+        for group_id, user_id in expired:
+            self._remove(group_id, user_id)
+        return len(expired)
+
+    async def prune(self) -> None:
+        """移除长期未出现的成员并合并日志（每日调用）"""
+        self._ensure_loaded()
+        removed = self._prune(time.time())
+        if removed:
+            logger.info(f"群成员索引已清理 {removed} 条过期记录")
+        await self.compact()
+
+    # ---------- 查询 ----------
+    def members(self, group_id: Any) -> Dict[str, float]:
+        """群内成员 {user_id: 最近出现时间}（只读使用）"""
+        self._ensure_loaded()
+        return self._members.get(str(group_id), {})
+
+    def groups_of(self, user_id: Any) -> Dict[str, float]:
+        """用户所在的群 {group_id: 最近出现时间}（只读使用）"""
+        self._ensure_loaded()
+        return self._user_groups.get(str(user_id), {})
+
+    def is_member(self, group_id: Any, user_id: Any) -> bool:
+        return str(user_id) in self.members(group_id)
+
+    def groups(self) -> List[str]:
+        self._ensure_loaded()
+        return list(self._members)
+
+    # ---------- 订阅 ----------
+    def subscribe(
+        self,
+        on_join: Optional[MembershipListener] = None,
+        on_leave: Optional[MembershipListener] = None,
+    ) -> None:
+        """订阅成员加入/移出事件，重复订阅只保留一次"""
+        if on_join is not None and on_join not in self._join_listeners:
+            self._join_listeners.append(on_join)
+        if on_leave is not None and on_leave not in self._leave_listeners:
+            self._leave_listeners.append(on_leave)
+
+    @staticmethod
+    def _notify(listeners: List[MembershipListener], group_id: str, user_id: str):
+        for listener in listeners:
+            try:
+                listener(group_id, user_id)
+            except Exception as e:
+                logger.error(f"执行群成员变动回调失败: {str(e)}")
+
+    # ---------- 持久化 ----------
+    def _append(self, entry: List[Any]) -> None:
+        self._journal.append(json.dumps(entry, ensure_ascii=False))
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._write_journal(self._take_journal())
+            return
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = loop.create_task(self._flush_later())
+
+    def _take_journal(self) -> List[str]:
+        lines, self._journal = self._journal, []
+        return lines
+
+    def _write_journal(self, lines: List[str]) -> None:
+        if not lines:
+            return
+        with open(self.journal_file, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        self._journal_lines += len(lines)
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(FLUSH_DELAY)
+        await self.flush()
+
+    async def _write_pending(self) -> bool:
+        """追加缓冲中的日志行，失败时放回缓冲（调用方持有_io_lock）"""
+        lines = self._take_journal()
+        if not lines:
+            return True
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                io_executor, self._write_journal, lines
+            )
+            return True
+        except Exception as e:
+            logger.error(f"写入群成员日志失败: {str(e)}")
+            self._journal[:0] = lines
+            return False
+
+    async def flush(self) -> None:
+        """立即追加未写入的日志，日志过长时合并为快照"""
+        try:
+            # 多实例时各进程追加日志与合并快照均持有索引租约
+            async with lease_manager.hold((), resources=("indexes",)), self._io_lock:
+                if not await self._write_pending():
+                    return
+        except LeaseTimeout as e:
+            logger.warning(f"写入群成员日志失败: {str(e)}")
+            return
+        if self._journal_lines >= COMPACT_LINES:
+            await self.compact()
+
+    async def compact(self) -> None:
+        """写入完整快照并清空日志（多实例时先重放其他进程追加的日志）"""
+        if not self._loaded:
+            return
+        try:
+            async with lease_manager.hold((), resources=("indexes",)), self._io_lock:
+                loop = asyncio.get_running_loop()
+                if lease_manager.enabled:
+                    # 先追加本进程的变动，再从磁盘重放所有进程的变动
+                    if not await self._write_pending():
+                        return
+                    self._adopt(await loop.run_in_executor(io_executor, self._recover))
+                else:
+                    # 快照已包含尚未写入日志的变动，之后的变动仍留在缓冲中
+                    self._journal.clear()
+                data = {
+                    group_id: dict(members)
+                    for group_id, members in self._members.items()
+                }
+                if await loop.run_in_executor(
+                    io_executor, write_json_sync, self.snapshot_file, data
+                ):
+                    await loop.run_in_executor(io_executor, self._truncate_journal)
+        except LeaseTimeout as e:
+            logger.warning(f"合并群成员日志失败: {str(e)}")
+
+    def _adopt(self, state: Tuple[Dict, Dict, int]) -> None:
+        """多实例：采用从磁盘重放的索引（含其他进程的变动），并通知成员变动"""
+        members, user_groups, _ = state
+        # 重放期间本进程新产生、尚未写入日志的变动
+        for line in self._journal:
+            _replay(members, user_groups, line)
+        old = self._members
+        self._members, self._user_groups, self._journal_lines = state
+        for group_id, seen_by_user in members.items():
+            known = old.get(group_id, {})
+            for user_id in seen_by_user:
+                if user_id not in known:
+                    self._notify(self._join_listeners, group_id, user_id)
+        for group_id, seen_by_user in old.items():
+            current = members.get(group_id, {})
+            for user_id in seen_by_user:
+                if user_id not in current:
+                    self._notify(self._leave_listeners, group_id, user_id)
+
+    def _truncate_journal(self) -> None:
+        open(self.journal_file, "w", encoding="utf-8").close()
+        self._journal_lines = 0
+
+
+# 全局群成员索引
+group_index = GroupIndex()
@@ -0,0 +1,64 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+# JSON读写线程池的线程数
+IO_WORKERS = 8
+
+
+class IoExecutor(ThreadPoolExecutor):
+    """
+    JSON文件读写专用线程池\n
+    与事件循环默认线程池分开，并统计排队深度、执行中的任务数与排队等待时间
+    """
+
+    def __init__(self, max_workers: int = IO_WORKERS):
+        super().__init__(max_workers=max_workers, thread_name_prefix="akasha-io")
+        self.workers = max_workers
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.active = 0
+        self.peak_pending = 0
+        self.completed = 0
+        self._wait_ns = 0
+        self.max_wait_ns = 0
+
+    def submit(self, fn: Callable, /, *args, **kwargs) -> Future:
+        submitted = time.perf_counter_ns()
+        with self._lock:
+            self.pending += 1
+            self.peak_pending = max(self.peak_pending, self.pending)
+
+        def run() -> Any:
+            waited = time.perf_counter_ns() - submitted
+            with self._lock:
+                self.pending -= 1
+                self.active += 1
+                self._wait_ns += waited
+                self.max_wait_ns = max(self.max_wait_ns, waited)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.active -= 1
+                    self.completed += 1
+
+        return super().submit(run)
+
+    def stats(self) -> Dict[str, float]:
+        """当前排队数、执行数、峰值排队数、已完成数与排队等待时间（毫秒）"""
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "pending": self.pending,
+                "active": self.active,
+                "peak_pending": self.peak_pending,
+                "completed": self.completed,
+                "avg_wait_ms": self._wait_ns / self.completed / 1e6 if self.completed else 0.0,
+                "max_wait_ms": self.max_wait_ns / 1e6,
+            }
+
+
+# 全局JSON读写线程池
+io_executor = IoExecutor()
@@ -0,0 +1,395 @@
+import asyncio
+import contextlib
+import inspect
+import os
+import socket
+import sqlite3
+import time
+import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from pathlib import Path
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    FrozenSet,
+    Iterable,
+    List,
+    Optional,
+)
+
+from astrbot.api import logger
+
+from .config import config_service
+
+# 用户按id的CRC32分到固定数量的分片，租约以分片为单位
+LEASE_SHARDS = 64
+# 租约表文件（位于共享的插件数据目录）
+LEASE_FILE = "leases.sqlite3"
+# 分片空闲超过该时长（秒）后释放租约，让其他进程可以尽快接手
+LINGER = 1.0
+# 后台检查间隔（秒）：释放空闲或被其他进程等待的分片，并按 lease_ttl/3 续约
+POLL_INTERVAL = 0.1
+# 等待其他进程释放租约时的重试间隔（秒）：从最短开始逐次翻倍直到最长
+RETRY_MIN = 0.01
+RETRY_MAX = 0.2
+
+# 进程共享的全局数据各占一个专用分片（编号排在用户分片之后），修改前获取其租约
+RESOURCE_SHARDS = {
+    # 商城库存：扣减/归还/补货
+    "shop_stock": LEASE_SHARDS,
+    # 用户索引、用户文件索引与群成员索引：写入文件前与其他进程的修改合并
+    "indexes": LEASE_SHARDS + 1,
+}
+
+# 当前命令（任务上下文）已持有的分片：嵌套的hold()只获取其余分片，不会等待自己持有的分片
+_context_shards: ContextVar[FrozenSet[int]] = ContextVar(
+    "lease_shards", default=frozenset()
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS leases (
+    shard INTEGER PRIMARY KEY,
+    owner TEXT,
+    expires REAL NOT NULL DEFAULT 0,
+    last_owner TEXT,
+    epoch INTEGER NOT NULL DEFAULT 0,
+    wanted REAL NOT NULL DEFAULT 0
+)
+"""
+
+
+def shard_of(user_id: Any) -> int:
+    """用户所在的分片"""
+    return zlib.crc32(str(user_id).encode("utf-8")) % LEASE_SHARDS
+
+
+class LeaseTimeout(Exception):
+    """等待租约超时（其他进程长时间持有）"""
+
+
+class _Held:
+    """本进程持有的一个分片租约"""
+
+    __slots__ = ("refs", "last_used", "draining")
+
+    def __init__(self):
+        self.refs = 0
+        self.last_used = time.monotonic()
+        # 其他进程在等待该分片：本进程不再开始新的使用，引用归零后立即释放
+        self.draining = False
+
+
+class LeaseManager:
+    """
+    多进程共享数据目录时的用户分片租约（SQLite租约表）\n
+    - 处理命令前获取涉及用户所在分片的租约，多个分片在一个事务中全部获取或全部不获取，不会互相死锁\n
+    - 持有期间后台每 lease_ttl/3 秒续约；分片空闲 LINGER 秒后释放，释放前等待注册的落盘回调完成\n
+    - 获取失败时在租约表中标记等待，持有者发现后停止在该分片上开始新命令，进行中的命令结束即释放，避免饿死\n
+    - 进程异常退出时其租约在 lease_ttl 后过期，其他进程可直接接手\n
+    - 分片上一个持有者是其他进程时，获取后调用注册的接手回调，使本进程丢弃该分片用户的过期缓存\n
+    - 商城库存与各索引等进程共享的全局数据使用RESOURCE_SHARDS中的专用分片
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self._path = path
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._conn: Optional[sqlite3.Connection] = None
+        # 所有SQLite操作在同一个线程中顺序执行
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="akasha-lease")
+        self._held: Dict[int, _Held] = {}
+        # 获取/释放租约与执行接手回调期间互斥
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._renewed = 0.0
+        self._transfer_callbacks: List[Callable[[int], Any]] = []
+        self._release_callbacks: List[Callable[[], Any]] = []
+        self.acquired = 0
+        self.transferred = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return config_service.snapshot.cluster.enabled
+
+    @property
+    def path(self) -> Path:
+        if self._path is None:
+            # 延迟导入，避免 utils -> leases 循环导入
+            from .utils import PLUGIN_DATA_DIR
+
+            self._path = PLUGIN_DATA_DIR / LEASE_FILE
+        return self._path
+
+    def on_transfer(self, callback: Callable[[int], Any]) -> None:
+        """注册接手回调 callback(分片)，可为协程函数"""
+        if callback not in self._transfer_callbacks:
+            self._transfer_callbacks.append(callback)
+
+    def before_release(self, callback: Callable[[], Any]) -> None:
+        """注册释放租约前的落盘回调 callback()，可为协程函数"""
+        if callback not in self._release_callbacks:
+            self._release_callbacks.append(callback)
+
+    # ---------- SQLite（在租约线程中执行） ----------
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(
+                str(self.path), timeout=30, isolation_level=None, check_same_thread=False
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _try_acquire(self, shards: List[int], ttl: float) -> Optional[List[int]]:
+        """在一个事务中获取全部分片，成功返回其中上一个持有者是其他进程的分片，有分片被占用时返回None"""
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = {}
+            for shard in shards:
+                rows[shard] = conn.execute(
+                    "SELECT owner, expires, last_owner FROM leases WHERE shard = ?",
+                    (shard,),
+                ).fetchone()
+                owner, expires = (rows[shard] or (None, 0))[:2]
+                if owner not in (None, self.owner) and expires > now:
+                    # 通知持有者有进程在等待
+                    conn.execute("UPDATE leases SET wanted = ? WHERE shard = ?", (now, shard))
+                    conn.execute("COMMIT")
+                    return None
+            transferred = []
+            for shard, row in rows.items():
+                moved = row is not None and row[2] not in (None, self.owner)
+                if moved:
+                    transferred.append(shard)
+                conn.execute(
+                    "INSERT INTO leases (shard, owner, expires, last_owner, epoch) "
+                    "VALUES (?, ?, ?, ?, 1) "
+                    "ON CONFLICT(shard) DO UPDATE SET owner = excluded.owner, "
+                    "expires = excluded.expires, last_owner = excluded.last_owner, "
+                    "epoch = epoch + ?, wanted = 0",
+                    (shard, self.owner, now + ttl, self.owner, 1 if moved else 0),
+                )
+            conn.execute("COMMIT")
+            return transferred
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _renew(self, shards: List[int], ttl: float) -> List[int]:
+        """续约，返回已不属于本进程的分片（长时间未续约后被其他进程接手）"""
+        conn = self._connect()
+        lost = []
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for shard in shards:
+                updated = conn.execute(
+                    "UPDATE leases SET expires = ? WHERE shard = ? AND owner = ?",
+                    (time.time() + ttl, shard, self.owner),
+                ).rowcount
+                if not updated:
+                    lost.append(shard)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return lost
+
+    def _wanted(self, ttl: float) -> List[int]:
+        """本进程持有、且最近 ttl 秒内有其他进程等待的分片"""
+        rows = self._connect().execute(
+            "SELECT shard FROM leases WHERE owner = ? AND wanted > ?",
+            (self.owner, time.time() - ttl),
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def _release(self, shards: List[int]) -> None:
+        conn = self._connect()
+        conn.executemany(
+            "UPDATE leases SET owner = NULL, expires = 0 WHERE shard = ? AND owner = ?",
+            [(shard, self.owner) for shard in shards],
+        )
+
+    async def _run(self, func: Callable, *args) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    # ---------- 获取与释放 ----------
+    async def _notify(self, callbacks: List[Callable], *args) -> None:
+        for callback in callbacks:
+            try:
+                result = callback(*args)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.error(f"执行租约回调失败: {str(e)}")
+
+    @staticmethod
+    def shards_of(user_ids: Iterable[Any], resources: Iterable[str] = ()) -> List[int]:
+        """用户所在分片与全局数据的专用分片"""
+        shards = {shard_of(uid) for uid in user_ids}
+        shards.update(RESOURCE_SHARDS[name] for name in resources)
+        return sorted(shards)
+
+    async def acquire(
+        self, user_ids: Iterable[Any], resources: Iterable[str] = ()
+    ) -> List[int]:
+        """
+        获取用户所在分片（及resources中全局数据的专用分片）的租约（引用计数），
+        返回分片列表，超时抛出LeaseTimeout
+        """
+        return await self._acquire(self.shards_of(user_ids, resources))
+
+    async def _acquire(self, shards: List[int]) -> List[int]:
+        cluster = config_service.snapshot.cluster
+        deadline = time.monotonic() + cluster.lease_wait_ms / 1000
+        started = time.monotonic()
+        delay = RETRY_MIN
+        while True:
+            async with self._lock:
+                missing = [shard for shard in shards if shard not in self._held]
+                transferred: Optional[List[int]] = []
+                if any(self._held[shard].draining for shard in shards if shard in self._held):
+                    # 正在让给其他进程，等其释放后再重新获取
+                    transferred = None
+                elif missing:
+                    transferred = await self._run(self._try_acquire, missing, cluster.lease_ttl)
+                if transferred is not None:
+                    for shard in shards:
+                        held = self._held.setdefault(shard, _Held())
+                        held.refs += 1
+                        held.last_used = time.monotonic()
+                    # 其他进程修改过这些分片的数据，先丢弃本进程的缓存再执行命令
+                    for shard in transferred:
+                        await self._notify(self._transfer_callbacks, shard)
+                    self.acquired += 1
+                    self.transferred += len(transferred)
+                    self.wait_total += time.monotonic() - started
+                    self._ensure_heartbeat()
+                    return shards
+            if time.monotonic() >= deadline:
+                self.timeouts += 1
+                raise LeaseTimeout(f"分片{missing}正被其他进程使用")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RETRY_MAX)
+
+    def release(self, shards: List[int]) -> None:
+        """命令结束，减少引用计数（租约由后台在空闲后释放）"""
+        now = time.monotonic()
+        for shard in shards:
+            held = self._held.get(shard)
+            if held is not None:
+                held.refs -= 1
+                held.last_used = now
+
+    def covers(self, user_ids: Iterable[Any]) -> bool:
+        """当前命令（任务上下文）是否已持有这些用户所在分片的租约（未开启多实例时总是True）"""
+        if not self.enabled:
+            return True
+        held = _context_shards.get()
+        return all(
+            shard in held and shard in self._held for shard in self.shards_of(user_ids)
+        )
+
+    @contextlib.asynccontextmanager
+    async def hold(
+        self, user_ids: Iterable[Any], resources: Iterable[str] = ()
+    ) -> AsyncIterator[List[int]]:
+        """
+        在持有用户分片（及resources中全局数据的专用分片）租约期间执行（未开启多实例时直接执行）\n
+        可以嵌套：命令执行中再获取更多租约时，已持有的分片不重复获取
+        """
+        if not self.enabled:
+            yield []
+            return
+        inherited = frozenset(
+            shard for shard in _context_shards.get() if shard in self._held
+        )
+        needed = [
+            shard
+            for shard in self.shards_of(user_ids, resources)
+            if shard not in inherited
+        ]
+        shards = await self._acquire(needed) if needed else []
+        _context_shards.set(inherited | set(shards))
+        try:
+            yield shards
+        finally:
+            _context_shards.set(inherited)
+            self.release(shards)
+
+    # ---------- 后台续约 ----------
+    def _ensure_heartbeat(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+
+    async def _heartbeat(self) -> None:
+        while self._held:
+            ttl = config_service.snapshot.cluster.lease_ttl
+            await asyncio.sleep(POLL_INTERVAL)
+            try:
+                await self._tick(ttl)
+            except Exception as e:
+                logger.error(f"续约租约失败: {str(e)}")
+
+    async def _tick(self, ttl: float) -> None:
+        async with self._lock:
+            for shard in await self._run(self._wanted, ttl):
+                if shard in self._held:
+                    self._held[shard].draining = True
+            now = time.monotonic()
+            idle = [
+                shard
+                for shard, held in self._held.items()
+                if held.refs <= 0 and (held.draining or now - held.last_used >= LINGER)
+            ]
+            if idle:
+                # 释放前确保本进程对这些用户的修改都已落盘
+                await self._notify(self._release_callbacks)
+                await self._run(self._release, idle)
+                for shard in idle:
+                    del self._held[shard]
+            if self._held and now - self._renewed >= ttl / 3:
+                self._renewed = now
+                lost = await self._run(self._renew, list(self._held), ttl)
+                for shard in lost:
+                    logger.warning(f"分片{shard}的租约已过期并被其他进程接手")
+                    del self._held[shard]
+
+    async def close(self) -> None:
+        """释放所有租约（在插件terminate中调用）"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._held:
+            await self._notify(self._release_callbacks)
+            await self._run(self._release, list(self._held))
+            self._held.clear()
+        if self._conn is not None:
+            await self._run(self._conn.close)
+            self._conn = None
+
+    def format_summary(self) -> str:
+        if not self.enabled:
+            return ""
+        avg_wait = self.wait_total / self.acquired * 1000 if self.acquired else 0.0
+        total = LEASE_SHARDS + len(RESOURCE_SHARDS)
+        return (
+            f"🔐 分片租约: 持有{len(self._held)}/{total}个分片，获取{self.acquired}次"
+            f"（平均等待{avg_wait:.1f}毫秒），从其他进程接手{self.transferred}次，超时{self.timeouts}次"
+        )
+
+
+# 全局分片租约
+lease_manager = LeaseManager()
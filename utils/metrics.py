@@ -0,0 +1,271 @@
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from .config import config_service
+
+# 直方图精度：每个2的幂区间再分为 2^SUB_BITS 个子桶（相对误差约 1/16）
+SUB_BITS = 4
+SUB_COUNT = 1 << SUB_BITS
+# 滑动窗口的时间片长度（秒）与保留的最长窗口（秒）
+SLOT_SECONDS = 10
+MAX_WINDOW = 3600
+# /性能统计 可选的统计窗口（分钟）
+WINDOWS = (1, 5, 15, 60)
+# I/O统计项：读次数、写次数、读字节、写字节、fsync耗时（纳秒）、等待文件锁耗时（纳秒）
+IO_FIELDS = ("reads", "writes", "read_bytes", "write_bytes", "fsync_ns", "lock_ns")
+# 不在命令处理中发生的I/O（定时任务、延迟写入等）归入此项
+BACKGROUND = "(后台)"
+
+# 当前正在处理的命令，由tracked_command在处理函数每次执行时设置，用于归属I/O
+current_command: ContextVar[Optional[str]] = ContextVar(
+    "akasha_current_command", default=None
+)
+
+
+def bucket_of(micros: int) -> int:
+    """耗时（微秒）所在的桶编号（HDR风格的对数-线性分桶）"""
+    if micros < SUB_COUNT:
+        return max(micros, 0)
+    shift = micros.bit_length() - SUB_BITS - 1
+    return ((shift + 1) << SUB_BITS) + ((micros >> shift) - SUB_COUNT)
+
+
+def bucket_upper(index: int) -> int:
+    """桶的上界（微秒）"""
+    if index < SUB_COUNT:
+        return index
+    shift = (index >> SUB_BITS) - 1
+    return (((index & (SUB_COUNT - 1)) + SUB_COUNT) << shift) + (1 << shift) - 1
+
+
+class _Slot:
+    """一个时间片内的统计"""
+
+    __slots__ = ("number", "buckets", "count", "errors", "max", "io")
+
+    def __init__(self, number: int):
+        self.number = number
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+        self.errors = 0
+        self.max = 0
+        self.io = [0] * len(IO_FIELDS)
+
+
+class CommandStats:
+    """单个命令的滑动窗口统计：按时间片保存直方图"""
+
+    __slots__ = ("slots", "total", "total_errors")
+
+    def __init__(self):
+        self.slots: Deque[_Slot] = deque()
+        self.total = 0
+        self.total_errors = 0
+
+    def _slot(self, number: int) -> _Slot:
+        slots = self.slots
+        if not slots or slots[-1].number != number:
+            slots.append(_Slot(number))
+            oldest = number - MAX_WINDOW // SLOT_SECONDS
+            while slots[0].number <= oldest:
+                slots.popleft()
+        return slots[-1]
+
+    def record(self, micros: int, error: bool, number: int) -> None:
+        slot = self._slot(number)
+        index = bucket_of(micros)
+        slot.buckets[index] = slot.buckets.get(index, 0) + 1
+        slot.count += 1
+        if micros > slot.max:
+            slot.max = micros
+        self.total += 1
+        if error:
+            slot.errors += 1
+            self.total_errors += 1
+
+    def record_io(self, values: Tuple[int, ...], number: int) -> None:
+        io = self._slot(number).io
+        for i, value in enumerate(values):
+            io[i] += value
+
+    def window(self, seconds: int, now: Optional[float] = None) -> Dict[str, float]:
+        """汇总最近seconds秒：次数、错误数、吞吐量、p50/p95/p99与最大耗时（毫秒）"""
+        now = time.time() if now is None else now
+        first = int(now // SLOT_SECONDS) - seconds // SLOT_SECONDS + 1
+        buckets: Dict[int, int] = {}
+        count = errors = peak = 0
+        io = [0] * len(IO_FIELDS)
+        for slot in list(self.slots):
+            if slot.number < first:
+                continue
+            count += slot.count
+            errors += slot.errors
+            peak = max(peak, slot.max)
+            for index, n in slot.buckets.items():
+                buckets[index] = buckets.get(index, 0) + n
+            for i, value in enumerate(slot.io):
+                io[i] += value
+        result = {
+            "count": count,
+            "errors": errors,
+            "rate": count / seconds,
+            "max": peak / 1000,
+            **dict(zip(IO_FIELDS, io)),
+        }
+        ordered = sorted(buckets.items())
+        for name, q in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99)):
+            # 桶上界可能超过实际最大值
+            result[name] = min(_quantile(ordered, count, q), peak) / 1000
+        return result
+
+
+def _quantile(ordered: List[Tuple[int, int]], count: int, q: float) -> int:
+    if not count:
+        return 0
+    target = max(1, int(count * q + 0.999999))
+    seen = 0
+    for index, n in ordered:
+        seen += n
+        if seen >= target:
+            return bucket_upper(index)
+    return bucket_upper(ordered[-1][0])
+
+
+def _format_io(row: Dict[str, float]) -> str:
+    """每次调用平均的I/O（后台I/O没有调用次数，显示总量）"""
+    calls = row["count"] or 1
+    return (
+        f"{row['reads'] / calls:.1f}/{row['writes'] / calls:.1f} | "
+        f"{row['read_bytes'] / calls / 1024:.1f}/{row['write_bytes'] / calls / 1024:.1f} | "
+        f"{row['fsync_ns'] / calls / 1e6:.2f}/{row['lock_ns'] / calls / 1e6:.2f}"
+    )
+
+
+class CommandMetrics:
+    """
+    命令性能统计\n
+    - 记录每个命令处理函数的耗时直方图、错误数与吞吐量，按SLOT_SECONDS分片滑动\n
+    - 每次记录只做几次字典更新，开销在微秒级；可通过配置 performance_system.metrics_enabled 关闭\n
+    - 文件读写由read_json/write_json等上报，按current_command归属到命令（可能来自线程池）
+    """
+
+    def __init__(self):
+        self._stats: Dict[str, CommandStats] = {}
+        self.started_at = time.time()
+        # I/O统计来自线程池中的读写，与命令统计共用一把锁
+        self._lock = threading.Lock()
+        # 附加在报告末尾的其他统计（如事件循环监控）
+        self._sections: List[Callable[[], str]] = []
+
+    def _get(self, command: str) -> CommandStats:
+        stats = self._stats.get(command)
+        if stats is None:
+            stats = self._stats[command] = CommandStats()
+        return stats
+
+    @property
+    def enabled(self) -> bool:
+        return config_service.snapshot.performance.metrics_enabled
+
+    def record(self, command: str, elapsed_ns: int, error: bool = False) -> None:
+        number = int(time.time() // SLOT_SECONDS)
+        with self._lock:
+            self._get(command).record(elapsed_ns // 1000, error, number)
+
+    def record_io(
+        self,
+        reads: int = 0,
+        writes: int = 0,
+        read_bytes: int = 0,
+        write_bytes: int = 0,
+        fsync_ns: int = 0,
+        lock_ns: int = 0,
+    ) -> None:
+        """记录一次文件读写，归属到当前命令"""
+        if not self.enabled:
+            return
+        command = current_command.get() or BACKGROUND
+        values = (reads, writes, read_bytes, write_bytes, fsync_ns, lock_ns)
+        number = int(time.time() // SLOT_SECONDS)
+        with self._lock:
+            self._get(command).record_io(values, number)
+
+    def snapshot(self, minutes: int) -> List[Tuple[str, Dict[str, float]]]:
+        """最近minutes分钟内有调用的命令统计，按p99倒序"""
+        now = time.time()
+        with self._lock:
+            rows = [
+                (command, stats.window(minutes * 60, now))
+                for command, stats in self._stats.items()
+            ]
+        rows = [row for row in rows if row[1]["count"] or row[1]["reads"] or row[1]["writes"]]
+        rows.sort(key=lambda row: row[1]["p99"], reverse=True)
+        return rows
+
+    def add_section(self, section: Callable[[], str]) -> None:
+        """注册附加在 /性能统计 报告末尾的统计文本，重复注册只保留一次"""
+        if section not in self._sections:
+            self._sections.append(section)
+
+    def _extra_sections(self) -> List[str]:
+        return [text for text in (section() for section in self._sections) if text]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+        self.started_at = time.time()
+
+    def format_report(self, minutes: int = 5, limit: int = 15) -> str:
+        rows = self.snapshot(minutes)
+        status = "" if self.enabled else "（统计已关闭）"
+        if not rows:
+            return "\n\n".join(
+                [f"最近{minutes}分钟没有命令调用记录{status}", *self._extra_sections()]
+            )
+        total = sum(row[1]["count"] for row in rows)
+        errors = sum(row[1]["errors"] for row in rows)
+        lines = [
+            f"📊 命令性能统计（最近{minutes}分钟）{status}",
+            f"共{total}次调用，{errors}次出错，{total / (minutes * 60):.2f}次/秒",
+            "命令：次数/错误 | p50/p95/p99/最大（毫秒）",
+            "  I/O（每次调用平均）：读/写次数 | 读/写KB | fsync/锁等待（毫秒）",
+        ]
+        for command, row in rows[:limit]:
+            if not row["count"]:
+                lines.append(f"- {command}（总量）：{_format_io(row)}")
+                continue
+            lines.append(
+                f"- {command}：{row['count']}/{row['errors']} | "
+                f"{row['p50']:.2f}/{row['p95']:.2f}/{row['p99']:.2f}/{row['max']:.2f}"
+            )
+            if row["reads"] or row["writes"]:
+                lines.append(f"  I/O：{_format_io(row)}")
+        if len(rows) > limit:
+            lines.append(f"…另有{len(rows) - limit}个命令")
+        return "\n\n".join(["\n".join(lines), *self._extra_sections()])
+
+    def handle_command(self, parts: List[str]) -> str:
+        """处理 /性能统计 [分钟数] | 开启 | 关闭 | 重置"""
+        if parts and parts[0] in ("开启", "关闭"):
+            config_service.update(
+                "performance_system", metrics_enabled=parts[0] == "开启"
+            )
+            return f"命令性能统计已{parts[0]}"
+        if parts and parts[0] == "重置":
+            self.reset()
+            return "命令性能统计已重置"
+        minutes = 5
+        if parts:
+            if not parts[0].isdigit() or int(parts[0]) not in WINDOWS:
+                return (
+                    f"使用方法: /性能统计 [{'|'.join(map(str, WINDOWS))}] | 开启 | 关闭 | 重置"
+                )
+            minutes = int(parts[0])
+        return self.format_report(minutes)
+
+
+# 全局命令性能统计
+command_metrics = CommandMetrics()
@@ -0,0 +1,205 @@
+import asyncio
+import cProfile
+import os
+import pstats
+import time
+from typing import Any, Awaitable, Generator, List, Optional
+
+from astrbot.api import logger
+
+from .api_queue import api_queue
+from .utils import PLUGIN_DATA_DIR
+
+# 剖析结果（.pstats）保存目录
+PROFILE_DIR = PLUGIN_DATA_DIR / "profiles"
+# 单次剖析最多记录的调用次数
+MAX_INVOCATIONS = 20
+# 剖析会话超过该时长（秒）仍未采集完时自动结束
+SESSION_TIMEOUT = 3600
+# 摘要中列出的函数数量
+SUMMARY_LINES = 10
+
+
+def command_token(event: Any) -> str:
+    """事件中实际输入的命令（去掉前缀/）"""
+    parts = (getattr(event, "message_str", "") or "").split()
+    return parts[0].lstrip("/") if parts else ""
+
+
+class _Profiled:
+    """
+    包装一个可等待对象：只在其每一步执行期间开启profiler\n
+    协程挂起（等待I/O、其他协程运行）时profiler关闭，因此不会采集到其他命令
+    """
+
+    __slots__ = ("_awaitable", "_profile")
+
+    def __init__(self, awaitable: Awaitable, profile: cProfile.Profile):
+        self._awaitable = awaitable
+        self._profile = profile
+
+    def __await__(self) -> Generator:
+        it = self._awaitable.__await__()
+        value: Any = None
+        error: Optional[BaseException] = None
+        while True:
+            self._profile.enable()
+            try:
+                if error is not None:
+                    yielded = it.throw(error)
+                else:
+                    yielded = it.send(value)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                self._profile.disable()
+            try:
+                value, error = (yield yielded), None
+            except BaseException as e:
+                value, error = None, e
+
+
+class ProfileSession:
+    """一次剖析会话：剖析目标命令接下来的若干次调用"""
+
+    def __init__(self, target: str, count: int, event: Any):
+        self.target = target
+        self.count = count
+        # 尚未开始的调用数（开始时扣减，避免并发调用超出次数）
+        self.remaining = count
+        self.finished = 0
+        self.event = event
+        self.started_at = time.time()
+        self.label = time.strftime("%Y%m%d_%H%M%S")
+        self.stats: Optional[pstats.Stats] = None
+        self.files: List[str] = []
+        # 实际匹配到的处理函数名（用于结果文件名）
+        self.handler = ""
+
+    def matches(self, name: str, event: Any) -> bool:
+        return self.target in (name, command_token(event))
+
+
+class CommandProfiler:
+    """
+    按需剖析单个命令\n
+    - /性能剖析 <命令> [次数] 后，该命令接下来的N次调用各用一个cProfile采集，保存为.pstats\n
+    - 只在被剖析的处理函数执行期间开启profiler，其他命令不受影响\n
+    - 采集完成后合并结果，把耗时最多的函数摘要发回发起剖析的会话
+    """
+
+    def __init__(self):
+        self._session: Optional[ProfileSession] = None
+        self.last_summary = ""
+
+    def claim(self, name: str, event: Any) -> Optional[cProfile.Profile]:
+        """若当前调用需要剖析，返回为其新建的profiler（命令处理入口调用）"""
+        session = self._session
+        if session is None or not session.matches(name, event):
+            return None
+        if time.time() - session.started_at > SESSION_TIMEOUT:
+            self._finish(session, timed_out=True)
+            return None
+        if session.remaining <= 0:
+            return None
+        session.remaining -= 1
+        return cProfile.Profile()
+
+    def wrap(self, awaitable: Awaitable, profile: cProfile.Profile) -> _Profiled:
+        return _Profiled(awaitable, profile)
+
+    def complete(self, name: str, profile: cProfile.Profile) -> None:
+        """一次被剖析的调用结束，保存结果"""
+        session = self._session
+        if session is None:
+            return
+        try:
+            session.handler = name
+            profile.create_stats()
+            PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+            path = PROFILE_DIR / f"{name}_{session.label}_{session.finished + 1}.pstats"
+            profile.dump_stats(str(path))
+            session.files.append(path.name)
+            if session.stats is None:
+                session.stats = pstats.Stats(profile)
+            else:
+                session.stats.add(profile)
+        except Exception as e:
+            logger.error(f"保存剖析结果失败: {str(e)}")
+        session.finished += 1
+        if session.finished >= session.count:
+            self._finish(session)
+
+    def _finish(self, session: ProfileSession, timed_out: bool = False) -> None:
+        if self._session is session:
+            self._session = None
+        self.last_summary = self.summarize(session, timed_out)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        loop.create_task(self._reply(session.event, self.last_summary))
+
+    @staticmethod
+    async def _reply(event: Any, message: str) -> None:
+        try:
+            await api_queue.send(event, event.plain_result(message))
+        except Exception as e:
+            logger.error(f"发送剖析结果失败: {str(e)}")
+
+    def summarize(self, session: ProfileSession, timed_out: bool = False) -> str:
+        """合并结果，保存合并后的.pstats，返回自身耗时最多的函数"""
+        head = f"🔬 命令「{session.target}」剖析{'超时结束' if timed_out else '完成'}"
+        if session.stats is None:
+            return f"{head}，没有采集到调用"
+        merged = PROFILE_DIR / f"{session.handler}_{session.label}_merged.pstats"
+        try:
+            session.stats.dump_stats(str(merged))
+        except Exception as e:
+            logger.error(f"保存剖析结果失败: {str(e)}")
+        rows = sorted(
+            session.stats.stats.items(), key=lambda item: item[1][2], reverse=True
+        )
+        lines = [
+            f"{head}（{session.finished}次调用，总计{session.stats.total_tt * 1000:.1f}毫秒）",
+            f"结果文件: {merged}",
+            "自身耗时/累计耗时（毫秒） 调用次数 函数",
+        ]
+        for (file, line, func), (_, calls, tottime, cumtime, _) in rows[:SUMMARY_LINES]:
+            where = f"{os.path.basename(file)}:{line}" if line else file
+            lines.append(
+                f"- {tottime * 1000:.2f}/{cumtime * 1000:.2f} {calls}次 {func}（{where}）"
+            )
+        return "\n".join(lines)
+
+    def handle_command(self, event: Any, parts: List[str]) -> str:
+        """处理 /性能剖析 <命令> [次数] | 状态 | 停止"""
+        usage = f"使用方法: /性能剖析 <命令> [次数(1-{MAX_INVOCATIONS})] | 状态 | 停止"
+        session = self._session
+        if not parts:
+            return usage
+        if parts[0] == "状态":
+            if session is not None:
+                return (
+                    f"正在剖析「{session.target}」：已采集{session.finished}/{session.count}次"
+                )
+            return self.last_summary or "当前没有进行中的剖析"
+        if parts[0] == "停止":
+            if session is None:
+                return "当前没有进行中的剖析"
+            self._session = None
+            self.last_summary = self.summarize(session)
+            return self.last_summary
+        count = 5
+        if len(parts) > 1:
+            if not parts[1].isdigit() or not 1 <= int(parts[1]) <= MAX_INVOCATIONS:
+                return usage
+            count = int(parts[1])
+        if session is not None:
+            return f"正在剖析「{session.target}」，请先 /性能剖析 停止"
+        self._session = ProfileSession(parts[0].lstrip("/"), count, event)
+        return f"将剖析命令「{parts[0]}」接下来的{count}次调用，完成后发送结果"
+
+
+# 全局命令剖析器
+command_profiler = CommandProfiler()
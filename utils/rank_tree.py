@@ -0,0 +1,161 @@
+import random
+from typing import Dict, Hashable, Iterator, List, Optional, Tuple
+
+# 排序键：(-分数, 成员)，分数高者在前，同分按成员id排序
+_Key = Tuple[int, str]
+
+
+class _Node:
+    __slots__ = ("key", "priority", "size", "left", "right")
+
+    def __init__(self, key: _Key):
+        self.key = key
+        self.priority = random.random()
+        self.size = 1
+        self.left: Optional["_Node"] = None
+        self.right: Optional["_Node"] = None
+
+
+def _size(node: Optional[_Node]) -> int:
+    return node.size if node is not None else 0
+
+
+def _pull(node: _Node) -> _Node:
+    node.size = 1 + _size(node.left) + _size(node.right)
+    return node
+
+
+def _split(node: Optional[_Node], key: _Key) -> Tuple[Optional[_Node], Optional[_Node]]:
+    """按键拆分为(<key, >=key)两棵树"""
+    if node is None:
+        return None, None
+    if node.key < key:
+        left, right = _split(node.right, key)
+        node.right = left
+        return _pull(node), right
+    left, right = _split(node.left, key)
+    node.left = right
+    return left, _pull(node)
+
+
+def _merge(a: Optional[_Node], b: Optional[_Node]) -> Optional[_Node]:
+    """合并两棵树（a中所有键都小于b）"""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    if a.priority > b.priority:
+        a.right = _merge(a.right, b)
+        return _pull(a)
+    b.left = _merge(a, b.left)
+    return _pull(b)
+
+
+def _remove_first(node: _Node) -> Optional[_Node]:
+    """删除子树中最小的节点"""
+    if node.left is None:
+        return node.right
+    node.left = _remove_first(node.left)
+    return _pull(node)
+
+
+class RankTree:
+    """
+    排行榜用的顺序统计树（树堆实现）\n
+    - update/remove/rank 均为 O(log n)，top(k) 为 O(log n + k)\n
+    - 成员id需为字符串，分数为整数
+    """
+
+    def __init__(self):
+        self._root: Optional[_Node] = None
+        # {成员: 分数}
+        self._scores: Dict[str, int] = {}
+
+    @classmethod
+    def build(cls, scores: Dict[str, int]) -> "RankTree":
+        """由{成员: 分数}批量构建（排序后O(n)建成平衡树，用于启动时重建）"""
+        tree = cls()
+        tree._scores = {member: int(score) for member, score in scores.items()}
+        keys = sorted((-score, member) for member, score in tree._scores.items())
+
+        def build(lo: int, hi: int, depth: int) -> Optional[_Node]:
+            if lo >= hi:
+                return None
+            mid = (lo + hi) // 2
+            node = _Node(keys[mid])
+            # 越靠近根优先级越高，保持堆性质；之后插入的随机节点自然下沉
+            node.priority = 2.0 - depth / 64
+            node.left = build(lo, mid, depth + 1)
+            node.right = build(mid + 1, hi, depth + 1)
+            return _pull(node)
+
+        tree._root = build(0, len(keys), 0)
+        return tree
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def __contains__(self, member: Hashable) -> bool:
+        return member in self._scores
+
+    def score(self, member: str) -> Optional[int]:
+        return self._scores.get(member)
+
+    def _insert(self, key: _Key) -> None:
+        left, right = _split(self._root, key)
+        self._root = _merge(_merge(left, _Node(key)), right)
+
+    def _delete(self, key: _Key) -> None:
+        left, right = _split(self._root, key)
+        if right is not None:
+            right = _remove_first(right)
+        self._root = _merge(left, right)
+
+    def update(self, member: str, score: int) -> None:
+        """设置成员分数（不存在则插入）"""
+        score = int(score)
+        old = self._scores.get(member)
+        if old == score:
+            return
+        if old is not None:
+            self._delete((-old, member))
+        self._scores[member] = score
+        self._insert((-score, member))
+
+    def remove(self, member: str) -> None:
+        old = self._scores.pop(member, None)
+        if old is not None:
+            self._delete((-old, member))
+
+    def rank(self, member: str) -> Optional[int]:
+        """成员名次（从1开始），不存在返回None"""
+        score = self._scores.get(member)
+        if score is None:
+            return None
+        key = (-score, member)
+        node, before = self._root, 0
+        while node is not None:
+            if key < node.key:
+                node = node.left
+            elif node.key < key:
+                before += _size(node.left) + 1
+                node = node.right
+            else:
+                return before + _size(node.left) + 1
+        return None
+
+    def top(self, k: int) -> List[Tuple[str, int]]:
+        """前k名 [(成员, 分数)]"""
+        return [item for item, _ in zip(self, range(k))]
+
+    def __iter__(self) -> Iterator[Tuple[str, int]]:
+        """按名次中序遍历"""
+        stack: List[_Node] = []
+        node = self._root
+        while stack or node is not None:
+            while node is not None:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            yield node.key[1], -node.key[0]
+            node = node.right
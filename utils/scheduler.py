@@ -0,0 +1,145 @@
+import asyncio
+import inspect
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, List, Optional
+from zoneinfo import ZoneInfo
+
+from astrbot.api import logger
+
+# 设置「中国标准时间」
+CN_TIMEZONE = ZoneInfo("Asia/Shanghai")
+
+# 后台任务单次休眠的上限（秒），防止系统休眠或改时间后错过零点太久
+MAX_SLEEP = 300
+
+
+def date_to_day_epoch(date_str: Optional[str]) -> Optional[int]:
+    """把"YYYY-MM-DD"换算为日序号，空值或格式错误返回None"""
+    if not date_str:
+        return None
+    try:
+        return date.fromisoformat(date_str).toordinal()
+    except ValueError:
+        return None
+
+
+def day_to_week_epoch(day_epoch: int) -> int:
+    """日序号所在周的周一日序号"""
+    return day_epoch - date.fromordinal(day_epoch).weekday()
+
+
+class PeriodClock:
+    """
+    日/周周期时钟（Asia/Shanghai）\n
+    - day_epoch: 今天的日序号；week_epoch: 本周周一的日序号，请求路径只需比较整数\n
+    - today_str/yesterday_str: 缓存的日期字符串，每天只格式化一次\n
+    - 后台任务在零点唤醒，递增周期并执行注册的跨日/跨周任务（如商城补货）\n
+    - 即使后台任务未启动，读取周期时也会按时间戳自动前进
+    """
+
+    def __init__(self):
+        self._day_jobs: List[Callable[[], Any]] = []
+        self._week_jobs: List[Callable[[], Any]] = []
+        self._task: Optional[asyncio.Task] = None
+        self._roll(datetime.now(CN_TIMEZONE))
+
+    def _roll(self, now: datetime) -> None:
+        """按当前时间重新计算周期与缓存"""
+        today = now.date()
+        self._day = today.toordinal()
+        self._week = self._day - today.weekday()
+        self._today_str = today.strftime("%Y-%m-%d")
+        self._yesterday_str = (today - timedelta(days=1)).strftime("%Y-%m-%d")
+        next_midnight = datetime(
+            today.year, today.month, today.day, tzinfo=CN_TIMEZONE
+        ) + timedelta(days=1)
+        self._next_day_ts = next_midnight.timestamp()
+
+    def _check(self) -> bool:
+        """已过零点则前进周期，返回是否跨日"""
+        if time.time() < self._next_day_ts:
+            return False
+        self._roll(datetime.now(CN_TIMEZONE))
+        return True
+
+    @property
+    def day_epoch(self) -> int:
+        self._check()
+        return self._day
+
+    @property
+    def week_epoch(self) -> int:
+        self._check()
+        return self._week
+
+    @property
+    def today_str(self) -> str:
+        self._check()
+        return self._today_str
+
+    @property
+    def yesterday_str(self) -> str:
+        self._check()
+        return self._yesterday_str
+
+    def seconds_until_next_day(self) -> float:
+        """距离下一个零点的秒数"""
+        self._check()
+        return max(0.0, self._next_day_ts - time.time())
+
+    def seconds_until_next_week(self) -> float:
+        """距离下周一零点的秒数"""
+        days_left = 6 - (self.day_epoch - self._week)
+        return self.seconds_until_next_day() + days_left * 86400
+
+    def on_day(self, job: Callable[[], Any]) -> None:
+        """注册跨日任务（普通函数或协程函数），重复注册只保留一次"""
+        if job not in self._day_jobs:
+            self._day_jobs.append(job)
+
+    def on_week(self, job: Callable[[], Any]) -> None:
+        """注册跨周（周一零点）任务，重复注册只保留一次"""
+        if job not in self._week_jobs:
+            self._week_jobs.append(job)
+
+    async def _run_jobs(self, jobs: List[Callable[[], Any]], kind: str) -> None:
+        for job in list(jobs):
+            try:
+                result = job()
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.error(f"执行{kind}任务失败: {str(e)}")
+
+    async def _loop(self) -> None:
+        day, week = self._day, self._week
+        while True:
+            await asyncio.sleep(min(MAX_SLEEP, self.seconds_until_next_day() + 0.5))
+            self._check()
+            if self._day != day:
+                logger.info(f"周期前进: {self._today_str}")
+                day = self._day
+                await self._run_jobs(self._day_jobs, "跨日")
+            if self._week != week:
+                week = self._week
+                await self._run_jobs(self._week_jobs, "跨周")
+
+    def start(self) -> None:
+        """启动后台任务（在插件initialize中调用）"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def stop(self) -> None:
+        """停止后台任务（在插件terminate中调用）"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# 全局周期时钟
+period_clock = PeriodClock()
@@ -0,0 +1,138 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from .config import config_service
+
+# 已完成的调用与已处理的消息ID最多保留的条数
+MAX_ENTRIES = 4096
+# 已处理的消息ID保留时长（秒），在此期间重发的同一条消息直接丢弃
+MESSAGE_ID_TTL = 120
+
+# join() 的判定结果
+RUN = "run"
+SHARE = "share"
+DROP = "drop"
+
+
+def message_id_of(event: Any) -> Optional[str]:
+    """事件对应的平台消息ID（取不到时返回None）"""
+    message_id = getattr(getattr(event, "message_obj", None), "message_id", None)
+    return str(message_id) if message_id not in (None, "") else None
+
+
+class _Flight:
+    """一次正在执行的命令调用"""
+
+    __slots__ = ("key", "future")
+
+    def __init__(self, key: Hashable):
+        self.key = key
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+class SingleFlight:
+    """
+    重复命令合并\n
+    - 以 (群, 用户, 处理函数, 命令参数) 为键：同键的调用正在执行时，后来者等待并共享其结果，不再执行；
+      结果无法共享的调用（异步生成器处理函数的结果已逐条发出）后来者直接丢弃\n
+    - 同键调用完成后 performance_system.duplicate_window_ms 内再次到达的视为连点，直接丢弃\n
+    - 适配器重发的同一条消息（消息ID相同）在 MESSAGE_ID_TTL 秒内直接丢弃\n
+    - 已完成的记录与消息ID按时间顺序保存，超时或超过 MAX_ENTRIES 条时淘汰最旧的
+    """
+
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._inflight: Dict[Hashable, _Flight] = {}
+        # 已完成的调用: 键 -> 完成时间，按完成顺序排列
+        self._recent: "OrderedDict[Hashable, float]" = OrderedDict()
+        self._message_ids: "OrderedDict[str, float]" = OrderedDict()
+        self.shared = 0
+        self.dropped = 0
+        self.redelivered = 0
+
+    @property
+    def enabled(self) -> bool:
+        return config_service.snapshot.performance.singleflight_enabled
+
+    @staticmethod
+    def key_of(name: str, event: Any) -> Tuple[str, str, str, str]:
+        return (
+            str(event.get_group_id() or ""),
+            str(event.get_sender_id()),
+            name,
+            " ".join((getattr(event, "message_str", "") or "").split()),
+        )
+
+    @staticmethod
+    def _window() -> float:
+        return config_service.snapshot.performance.duplicate_window_ms / 1000
+
+    def _evict(self, now: float) -> None:
+        """淘汰超时或超出条数上限的记录（两者都按时间排列，只需检查最旧的）"""
+        for entries, ttl in (
+            (self._recent, self._window()),
+            (self._message_ids, MESSAGE_ID_TTL),
+        ):
+            while entries:
+                oldest = next(iter(entries.values()))
+                if now - oldest < ttl and len(entries) <= self.max_entries:
+                    break
+                entries.popitem(last=False)
+
+    def join(
+        self, name: str, event: Any, shareable: bool = True
+    ) -> Tuple[str, Optional[_Flight]]:
+        """
+        命令处理入口调用，返回判定结果与对应的调用记录\n
+        RUN: 正常执行，结束后调用finish(flight, result)；SHARE: 等待flight的结果；DROP: 直接丢弃\n
+        shareable为False时同键调用正在执行也判定为DROP
+        """
+        now = time.monotonic()
+        self._evict(now)
+        message_id = message_id_of(event)
+        if message_id is not None:
+            if message_id in self._message_ids:
+                self.redelivered += 1
+                return DROP, None
+            self._message_ids[message_id] = now
+        key = self.key_of(name, event)
+        flight = self._inflight.get(key)
+        if flight is not None:
+            if not shareable:
+                self.dropped += 1
+                return DROP, None
+            self.shared += 1
+            return SHARE, flight
+        if key in self._recent:
+            self.dropped += 1
+            return DROP, None
+        flight = self._inflight[key] = _Flight(key)
+        return RUN, flight
+
+    def finish(self, flight: _Flight, result: Any = None) -> None:
+        """执行结束：唤醒共享结果的调用，并记录完成时间用于丢弃随后的连点"""
+        self._inflight.pop(flight.key, None)
+        if self._window() > 0:
+            self._recent.pop(flight.key, None)
+            self._recent[flight.key] = time.monotonic()
+        if not flight.future.done():
+            flight.future.set_result(result)
+
+    @staticmethod
+    async def wait(flight: _Flight) -> Any:
+        """等待正在执行的同键调用结束，返回其结果"""
+        return await asyncio.shield(flight.future)
+
+    def format_summary(self) -> str:
+        if not (self.shared or self.dropped or self.redelivered):
+            return ""
+        return (
+            f"🔁 重复命令: 合并执行中{self.shared}次，丢弃连点{self.dropped}次，"
+            f"丢弃重发消息{self.redelivered}次"
+        )
+
+
+# 全局重复命令合并
+single_flight = SingleFlight()
@@ -0,0 +1,257 @@
+import asyncio
+import functools
+import inspect
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from astrbot.api import logger
+
+from .config import config_service
+from .io_executor import io_executor
+
+# 追踪文件名（轮转后依次为 traces.1.jsonl、traces.2.jsonl…，数字越大越旧）
+TRACE_FILE = "traces.jsonl"
+# 单个追踪最多记录的span数，超出的span只计数不记录
+MAX_SPANS = 2000
+# perf_counter 与 Unix 时间的差值，使时间戳可跨进程、跨文件比较
+_EPOCH_OFFSET_NS = time.time_ns() - time.perf_counter_ns()
+
+
+class Trace:
+    """一次被采样的命令调用，收集其中所有span的事件"""
+
+    __slots__ = ("trace_id", "events", "dropped", "closed")
+
+    def __init__(self, trace_id: int):
+        self.trace_id = trace_id
+        self.events: List[Dict[str, Any]] = []
+        self.dropped = 0
+        self.closed = False
+
+    def record(self, span: "Span", end_ns: int) -> None:
+        # 命令结束后才完成的span（如其中创建的后台任务）不再记录
+        if self.closed:
+            return
+        if len(self.events) >= MAX_SPANS:
+            self.dropped += 1
+            return
+        event = {
+            "name": span.name,
+            "cat": "akasha",
+            "ph": "X",
+            "ts": (span.start_ns + _EPOCH_OFFSET_NS) / 1000,
+            "dur": (end_ns - span.start_ns) / 1000,
+            "pid": os.getpid(),
+            "tid": self.trace_id,
+        }
+        if span.args:
+            event["args"] = span.args
+        self.events.append(event)
+
+
+class Span:
+    """
+    追踪中的一段耗时，用作上下文管理器\n
+    进入时成为当前span（其中创建的span和任务都归属同一追踪），退出时记录耗时
+    """
+
+    __slots__ = ("trace", "name", "args", "start_ns", "_token")
+
+    def __init__(self, trace: Trace, name: str, args: Dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.args = args
+        self.start_ns = time.perf_counter_ns()
+        self._token = None
+
+    def set(self, **args: Any) -> None:
+        """补充span的属性"""
+        self.args.update(args)
+
+    def finish(self, error: Optional[str] = None) -> None:
+        if error:
+            self.args["error"] = error
+        self.trace.record(self, time.perf_counter_ns())
+
+    def __enter__(self) -> "Span":
+        self.start_ns = time.perf_counter_ns()
+        self._token = current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        current_span.reset(self._token)
+        self.finish(exc_type.__name__ if exc_type else None)
+
+
+class _NoopSpan:
+    """未在追踪中时返回的空span"""
+
+    __slots__ = ()
+
+    def set(self, **args: Any) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+# 当前span，由tracked_command在被采样命令的每步执行时设置
+current_span: ContextVar[Optional[Span]] = ContextVar("akasha_current_span", default=None)
+
+
+class Tracer:
+    """
+    命令调用追踪\n
+    - 按 performance_system.trace_sample_rate 对命令调用采样，未采样时span为空操作\n
+    - 每个span导出为一条 Chrome Trace Event（完整事件 ph=X），每行一个JSON对象，
+      同一追踪的事件使用相同的tid；可用 tools.trace_view 转换后在 chrome://tracing 或 Perfetto 中查看\n
+    - 追踪文件超过大小上限时轮转，只保留配置的文件数
+    """
+
+    def __init__(self):
+        self._ids = itertools.count(1)
+        # 轮转与追加写入在线程池中进行，用锁保证顺序
+        self._write_lock = threading.Lock()
+        self._pending: Set[asyncio.Future] = set()
+        self._trace_dir: Optional[Path] = None
+        self.traces = 0
+        self.dropped_spans = 0
+
+    @property
+    def trace_dir(self) -> Path:
+        if self._trace_dir is None:
+            # 延迟导入，避免 utils <-> tracing 循环导入
+            from .utils import PLUGIN_DATA_DIR
+
+            self._trace_dir = PLUGIN_DATA_DIR / "traces"
+        return self._trace_dir
+
+    def span(self, name: str, **args: Any) -> Any:
+        """在当前追踪中创建子span（当前不在追踪中时返回空span）"""
+        parent = current_span.get()
+        if parent is None:
+            return _NOOP_SPAN
+        return Span(parent.trace, name, args)
+
+    def child(self, parent: Span, name: str, **args: Any) -> Span:
+        """在指定span的追踪中创建子span（不改变current_span，结束时调用finish）"""
+        return Span(parent.trace, name, args)
+
+    def traced(self, name: Optional[str] = None) -> Callable:
+        """把函数（普通函数或协程函数）的每次调用记录为span，默认以限定名命名"""
+
+        def decorate(func: Callable) -> Callable:
+            label = name or func.__qualname__
+
+            if inspect.iscoroutinefunction(func):
+
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    if current_span.get() is None:
+                        return await func(*args, **kwargs)
+                    with self.span(label):
+                        return await func(*args, **kwargs)
+
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if current_span.get() is None:
+                    return func(*args, **kwargs)
+                with self.span(label):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorate
+
+    def begin(self, name: str, **args: Any) -> Optional[Span]:
+        """按采样率决定是否追踪本次命令调用，返回根span（由调用方设置为current_span）"""
+        rate = config_service.snapshot.performance.trace_sample_rate
+        if rate <= 0 or (rate < 1 and random.random() >= rate):
+            return None
+        return Span(Trace(next(self._ids)), name, args)
+
+    def end(self, root: Span, error: bool = False) -> None:
+        """命令调用结束：记录根span并导出整个追踪"""
+        trace = root.trace
+        root.finish("error" if error else None)
+        trace.closed = True
+        self.traces += 1
+        self.dropped_spans += trace.dropped
+        # 元数据事件：在查看器中以「命令 #编号」命名该追踪所在的行
+        lines = [
+            json.dumps(
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": os.getpid(),
+                    "tid": trace.trace_id,
+                    "args": {"name": f"{root.name} #{trace.trace_id}"},
+                },
+                ensure_ascii=False,
+            )
+        ]
+        lines.extend(json.dumps(event, ensure_ascii=False) for event in trace.events)
+        if trace.dropped:
+            logger.warning(f"追踪 #{trace.trace_id} 超过{MAX_SPANS}个span，丢弃{trace.dropped}个")
+        data = "\n".join(lines) + "\n"
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._write(data)
+            return
+        future = loop.run_in_executor(io_executor, self._write, data)
+        self._pending.add(future)
+        future.add_done_callback(self._pending.discard)
+
+    def _write(self, data: str) -> None:
+        """追加写入追踪文件，超过大小上限时先轮转"""
+        performance = config_service.snapshot.performance
+        max_bytes = performance.trace_file_max_kb * 1024
+        encoded = data.encode("utf-8")
+        try:
+            with self._write_lock:
+                self.trace_dir.mkdir(parents=True, exist_ok=True)
+                path = self.trace_dir / TRACE_FILE
+                if path.exists() and path.stat().st_size + len(encoded) > max_bytes:
+                    self._rotate(performance.trace_max_files)
+                with open(path, "ab") as f:
+                    f.write(encoded)
+        except Exception as e:
+            logger.error(f"写入追踪文件失败: {str(e)}")
+
+    def _rotate(self, max_files: int) -> None:
+        """traces.jsonl -> traces.1.jsonl -> traces.2.jsonl …，超出保留数的文件删除"""
+        stem, suffix = TRACE_FILE.split(".", 1)
+        files = [self.trace_dir / TRACE_FILE] + [
+            self.trace_dir / f"{stem}.{i}.{suffix}" for i in range(1, max(max_files, 1))
+        ]
+        if files[-1].exists():
+            files[-1].unlink()
+        for older, newer in zip(reversed(files), reversed(files[:-1])):
+            if newer.exists():
+                os.replace(newer, older)
+
+    async def flush(self) -> None:
+        """等待排队中的追踪写入完成（在插件terminate中调用）"""
+        if self._pending:
+            await asyncio.gather(*list(self._pending), return_exceptions=True)
+
+
+# 全局追踪器
+tracer = Tracer()
+span = tracer.span
+traced = tracer.traced
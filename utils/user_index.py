@@ -0,0 +1,188 @@
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from astrbot.api import logger
+
+from .data_layout import locate_user_file
+from .io_executor import io_executor
+from .utils import PLUGIN_DATA_DIR, BatchedJsonStore, iter_user_ids, read_json_sync
+
+# 用户列表的排序方式：名称 -> (排序字段, 是否倒序)
+SORT_KEYS = {
+    "注册": ("created_at", False),
+    "活跃": ("last_active", True),
+    "昵称": ("nickname", False),
+    "id": ("id", False),
+}
+
+
+class UserIndex:
+    """
+    用户索引 {user_id: {nickname, created_at, last_active}}\n
+    - 用户数据写入时顺带更新，合并延迟写入 user_index.json\n
+    - 索引文件不存在时扫描一次用户目录重建\n
+    - 列表查询只读内存中的索引，排序结果按索引版本缓存\n
+    - 多实例时写入前持有索引租约，把本进程修改过的用户合并到磁盘上的索引
+    """
+
+    def __init__(self, file_path=None, user_data_dir=None):
+        self.file_path = file_path or PLUGIN_DATA_DIR / "user_index.json"
+        self.user_data_dir = user_data_dir or PLUGIN_DATA_DIR / "user_data"
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._loaded = False
+        # 索引版本号，每次变化时递增（用于排序缓存失效）
+        self.version = 0
+        # {排序方式: (索引版本, 排好序的用户id)}
+        self._sorted: Dict[str, Tuple[int, List[str]]] = {}
+        # 上次写入后修改过的用户（多实例时只把这些用户合并到其他进程写入的索引中）
+        self._changed: Set[str] = set()
+        self._store = BatchedJsonStore(self.file_path, self._dump, merge=self._merge)
+
+    def _read(self) -> Tuple[Dict[str, Dict[str, Any]], bool]:
+        """读取索引文件，缺失时扫描用户目录重建，返回(索引, 是否重建)（不修改实例状态，可在线程中执行）"""
+        if self.file_path.exists():
+            return read_json_sync(self.file_path), False
+        return self._scan(), True
+
+    def _scan(self) -> Dict[str, Dict[str, Any]]:
+        """扫描用户目录重建索引（仅在索引文件缺失时执行一次）"""
+        started = time.perf_counter()
+        entries = {}
+        for user_id in iter_user_ids(self.user_data_dir):
+            # 扫描期间文件可能被迁移到分层目录
+            path = locate_user_file(self.user_data_dir, user_id)
+            try:
+                mtime = path.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            user = read_json_sync(path).get("user") or {}
+            entries[user_id] = {
+                "nickname": user.get("nickname", ""),
+                "created_at": user.get("created_at", mtime),
+                "last_active": mtime,
+            }
+        logger.info(
+            f"用户索引已重建: {len(entries)}个用户，耗时{time.perf_counter() - started:.2f}秒"
+        )
+        return entries
+
+    def _install(self, entries: Dict[str, Dict[str, Any]], rebuilt: bool) -> None:
+        self._entries = entries
+        self._loaded = True
+        self.version += 1
+        if rebuilt:
+            self._changed.update(entries)
+            self._store.mark_dirty()
+
+    def _mark_changed(self, user_id: str) -> None:
+        self.version += 1
+        self._changed.add(user_id)
+        self._store.mark_dirty()
+
+    def _dump(self) -> Dict[str, Dict[str, Any]]:
+        self._changed.clear()
+        return self._entries
+
+    def _merge(self, stored: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """多实例：把本进程修改过的用户合并到磁盘上的索引，并采用合并结果（含其他进程的修改）"""
+        for user_id in self._changed:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                stored.pop(user_id, None)
+            else:
+                stored[user_id] = entry
+        self._changed.clear()
+        self._entries = stored
+        self.version += 1
+        return stored
+
+    async def load(self) -> None:
+        """在读写线程池中加载或重建索引（在插件initialize中调用，避免首个命令在事件循环中扫描用户目录）"""
+        if self._loaded:
+            return
+        entries, rebuilt = await asyncio.get_running_loop().run_in_executor(
+            io_executor, self._read
+        )
+        if not self._loaded:
+            self._install(entries, rebuilt)
+
+    def _ensure_loaded(self) -> None:
+        """未经load()加载时（如离线工具中）在首次使用时同步加载"""
+        if not self._loaded:
+            self._install(*self._read())
+
+    def touch(self, user_id: str, user_data: Optional[Dict[str, Any]] = None) -> None:
+        """记录用户活跃，user_data不为None时同步昵称与注册时间"""
+        self._ensure_loaded()
+        user_id = str(user_id)
+        now = time.time()
+        entry = self._entries.get(user_id)
+        if entry is None:
+            entry = self._entries[user_id] = {
+                "nickname": "",
+                "created_at": now,
+                "last_active": now,
+            }
+        entry["last_active"] = now
+        user = (user_data or {}).get("user") or {}
+        if user.get("nickname"):
+            entry["nickname"] = user["nickname"]
+        if user.get("created_at"):
+            entry["created_at"] = user["created_at"]
+        self._mark_changed(user_id)
+
+    def remove(self, user_id: str) -> None:
+        self._ensure_loaded()
+        user_id = str(user_id)
+        if self._entries.pop(user_id, None) is not None:
+            self._mark_changed(user_id)
+
+    def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        self._ensure_loaded()
+        return self._entries.get(str(user_id))
+
+    def __len__(self) -> int:
+        self._ensure_loaded()
+        return len(self._entries)
+
+    def inactive_since(self, cutoff: float) -> List[str]:
+        """最近活跃时间早于cutoff的用户id"""
+        self._ensure_loaded()
+        return [
+            uid
+            for uid, entry in self._entries.items()
+            if (entry.get("last_active") or 0) < cutoff
+        ]
+
+    def page(
+        self, page: int = 1, page_size: int = 20, sort: str = "注册"
+    ) -> Tuple[List[Tuple[str, Dict[str, Any]]], int]:
+        """分页查询，返回(当前页的[(user_id, 索引项)], 总页数)，页码越界时取最近的有效页"""
+        self._ensure_loaded()
+        field, reverse = SORT_KEYS.get(sort, SORT_KEYS["注册"])
+        cached = self._sorted.get(sort)
+        if cached is None or cached[0] != self.version:
+            if field == "id":
+                # QQ号按数值大小排序
+                order = sorted(self._entries, key=lambda uid: (len(uid), uid))
+            else:
+                default = "" if field == "nickname" else 0
+                order = sorted(
+                    self._entries,
+                    key=lambda uid: self._entries[uid].get(field) or default,
+                    reverse=reverse,
+                )
+            cached = self._sorted[sort] = (self.version, order)
+        order = cached[1]
+        pages = max(1, -(-len(order) // page_size))
+        page = min(max(page, 1), pages)
+        start = (page - 1) * page_size
+        return [(uid, self._entries[uid]) for uid in order[start : start + page_size]], pages
+
+    async def flush(self) -> None:
+        await self._store.flush()
+
+
+# 全局用户索引
+user_index = UserIndex()
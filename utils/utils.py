@@ -1,11 +1,12 @@
 import asyncio
+import contextvars
 import json
 import os
 import sys
 import tempfile
 import time
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Callable, Dict, Iterator, List, Optional
 
 if sys.platform.startswith("win"):
     import msvcrt
@@ -19,6 +20,12 @@ from astrbot.core.platform.sources.aiocqhttp.aiocqhttp_message_event import (
     AiocqhttpMessageEvent,
 )
 
+from .data_layout import iter_user_files, user_path
+from .io_executor import io_executor
+from .leases import LeaseTimeout, lease_manager, shard_of
+from .metrics import command_metrics
+from .tracing import span, traced
+
 # 文件路径
 PLUGIN_DATA_DIR = Path(StarTools.get_data_dir("astrbot_plugin_akasha_terminal"))
 PLUGIN_DIR = Path(__file__).resolve().parent.parent
@@ -106,8 +113,14 @@ def read_json_sync(file_path: Path, encoding_config: str = "utf-8") -> Dict[str,
         with open(file_path, "r", encoding=encoding_config) as f:
             try:
                 # 加共享锁（允许多个读操作同时进行）
+                started = time.perf_counter_ns()
                 _lock_file(f.fileno(), exclusive=False)
-                return json.load(f)
+                lock_ns = time.perf_counter_ns() - started
+                data = json.load(f)
+                command_metrics.record_io(
+                    reads=1, read_bytes=f.buffer.tell(), lock_ns=lock_ns
+                )
+                return data
             finally:
                 # 确保解锁
                 _unlock_file(f.fileno())
@@ -125,6 +138,8 @@ def write_json_sync(
     """同步原子写入JSON文件（无.lock文件）"""
 
     def write_json_atomic() -> None:
+        # 用户文件位于分层子目录中，新用户的子目录可能尚不存在
+        file_path.parent.mkdir(parents=True, exist_ok=True)
         # 生成临时文件
         with tempfile.NamedTemporaryFile(
             "w",
@@ -135,16 +150,25 @@ def write_json_sync(
         ) as tmp_file:
             json.dump(data, tmp_file, ensure_ascii=False)
             tmp_file.flush()
+            started = time.perf_counter_ns()
             os.fsync(tmp_file.fileno())
+            fsync_ns = time.perf_counter_ns() - started
+            written = tmp_file.buffer.tell()
             temp_name = tmp_file.name
 
         # 对目标文件加排他锁（防止写入时被读取）
+        lock_ns = 0
         if file_path.exists():
             with open(file_path, "r+") as f:
+                started = time.perf_counter_ns()
                 _lock_file(f.fileno(), exclusive=True)
+                lock_ns = time.perf_counter_ns() - started
 
         # 原子替换临时文件到目标文件
         os.replace(temp_name, file_path)
+        command_metrics.record_io(
+            writes=1, write_bytes=written, fsync_ns=fsync_ns, lock_ns=lock_ns
+        )
 
     try:
         write_json_atomic()
@@ -160,8 +184,12 @@ async def read_json(file_path: Path, encoding_config: str = "utf-8") -> Dict[str
         return {}
 
     loop = asyncio.get_running_loop()
-    # 复用同步读取逻辑（通过线程池执行）
-    return await loop.run_in_executor(None, read_json_sync, file_path, encoding_config)
+    # 复用同步读取逻辑（在JSON读写线程池执行，带上当前上下文以便I/O统计归属到命令）
+    context = contextvars.copy_context()
+    with span("read_json", file=file_path.name):
+        return await loop.run_in_executor(
+            io_executor, context.run, read_json_sync, file_path, encoding_config
+        )
 
 
 async def write_json(
@@ -169,10 +197,89 @@ async def write_json(
 ) -> bool:
     """异步原子写入JSON文件（无.lock文件）"""
     loop = asyncio.get_running_loop()
-    # 复用同步写入逻辑（通过线程池执行）
-    return await loop.run_in_executor(
-        None, write_json_sync, file_path, data, encoding_config
-    )
+    # 复用同步写入逻辑（在JSON读写线程池执行，带上当前上下文以便I/O统计归属到命令）
+    context = contextvars.copy_context()
+    with span("write_json", file=file_path.name):
+        return await loop.run_in_executor(
+            io_executor, context.run, write_json_sync, file_path, data, encoding_config
+        )
+
+
+class BatchedJsonStore:
+    """
+    延迟合并写入的JSON文件\n
+    数据由调用方保存在内存中，修改后调用mark_dirty()，delay秒内的多次修改只写一次文件\n
+    多实例时若提供了merge，写入前持有索引租约，读取其他进程写入的文件并合并本进程的修改
+    """
+
+    def __init__(
+        self,
+        file_path: Path,
+        snapshot: Callable[[], Dict[str, Any]],
+        delay: float = 1.0,
+        merge: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None,
+    ):
+        self.file_path = file_path
+        # 返回待写入数据的函数（在写入时调用，保证写入的是最新状态）
+        self._snapshot = snapshot
+        self.delay = delay
+        # merge(磁盘上的数据) -> 待写入数据：把本进程的修改合并到磁盘上的数据，并采用合并结果
+        self._merge = merge
+        self._dirty = False
+        self._task: Optional[asyncio.Task] = None
+
+    def mark_dirty(self) -> None:
+        """标记数据已修改，安排一次延迟写入（无事件循环时立即同步写入）"""
+        self._dirty = True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush_sync()
+            return
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.delay)
+        await self.flush()
+
+    async def flush(self) -> None:
+        """立即写入所有未保存的修改"""
+        if self._merge is not None and lease_manager.enabled:
+            await self._flush_shared()
+            return
+        while self._dirty:
+            self._dirty = False
+            # 在事件循环中取快照，避免写入线程读到修改中的数据
+            data = json.loads(json.dumps(self._snapshot(), ensure_ascii=False))
+            if not await write_json(self.file_path, data):
+                self._dirty = True
+                return
+
+    async def _flush_shared(self) -> None:
+        """多实例：持有索引租约期间读取磁盘上的文件，合并本进程的修改后写回"""
+        if not self._dirty:
+            return
+        try:
+            async with lease_manager.hold((), resources=("indexes",)):
+                while self._dirty:
+                    self._dirty = False
+                    merged = self._merge(await read_json(self.file_path))
+                    data = json.loads(json.dumps(merged, ensure_ascii=False))
+                    if not await write_json(self.file_path, data):
+                        self._dirty = True
+                        return
+        except LeaseTimeout as e:
+            # 保留修改，下次写入时重试
+            self._dirty = True
+            logger.warning(f"写入 {self.file_path.name} 失败: {str(e)}")
+
+    def flush_sync(self) -> None:
+        """同步写入所有未保存的修改"""
+        if self._dirty:
+            self._dirty = False
+            if not write_json_sync(self.file_path, self._snapshot()):
+                self._dirty = True
 
 
 # 以下函数内容不变
@@ -252,13 +359,14 @@ async def create_user_data(user_id: str, user_data_path: Path) -> bool:
         }
 
         user_data_path.mkdir(parents=True, exist_ok=True)
-        await write_json(user_data_path / f"{user_id}.json", default_user_data)
+        await save_user_data(user_id, default_user_data)
         return True
     except Exception as e:
         logger.error(f"创建用户数据失败: {str(e)}")
         return False
 
 
+@traced()
 async def get_user_data_and_backpack(
     user_id: str, only_data_or_backpack: str | None = None
 ) -> dict | tuple[dict, dict]:
@@ -271,13 +379,17 @@ async def get_user_data_and_backpack(
     user_data = None
     user_backpack = None
     if only_data_or_backpack in (None, "user_data"):
-        user_data_file = user_data_path / f"{user_id}.json"
+        user_data_file = await user_path(user_data_path, user_id)
         if not user_data_file.exists():
             await create_user_data(user_id, user_data_path)
         user_data = await read_json(user_data_file)
+        # 余额以经济账本为准（延迟导入，避免循环依赖）
+        from ..core.ledger import economy_ledger
+
+        economy_ledger.attach(user_id, user_data)
 
     if only_data_or_backpack in (None, "user_backpack"):
-        user_backpack = await read_json(backpack_path / f"{user_id}.json") or {}
+        user_backpack = await read_json(await user_path(backpack_path, user_id)) or {}
         if "weapon" not in user_backpack:
             user_backpack["weapon"] = {
                 "纠缠之缘": 0,
@@ -298,6 +410,79 @@ async def get_user_data_and_backpack(
     return user_data, user_backpack
 
 
+def iter_user_ids(directory: Path) -> Iterator[str]:
+    """逐个产出目录中的用户id（文件名去掉.json），不一次性列出整个目录"""
+    for path in iter_user_files(directory):
+        yield path.name[:-5]
+
+
+# 用户数据/背包写入后的回调 {"user_data"|"user_backpack": [callback(user_id, 数据)]}
+_save_listeners: Dict[str, List[Callable[[str, Dict[str, Any]], Any]]] = {
+    "user_data": [],
+    "user_backpack": [],
+}
+
+
+def on_user_save(kind: str, callback: Callable[[str, Dict[str, Any]], Any]) -> None:
+    """注册写入回调，kind为"user_data"或"user_backpack"，重复注册只保留一次"""
+    if callback not in _save_listeners[kind]:
+        _save_listeners[kind].append(callback)
+
+
+def _notify_save(kind: str, user_id: str, data: Dict[str, Any]) -> None:
+    for callback in _save_listeners[kind]:
+        try:
+            callback(user_id, data)
+        except Exception as e:
+            logger.error(f"执行写入回调失败: {str(e)}")
+
+
+async def save_user_data(user_id: str, user_data: Dict[str, Any]) -> bool:
+    """写入用户数据并更新用户索引（所有用户数据写入都应经过此函数）"""
+    # 延迟导入，避免与user_index的循环依赖
+    from .user_index import user_index
+
+    user_id = str(user_id)
+    user_index.touch(user_id, user_data)
+    _notify_save("user_data", user_id, user_data)
+    return await write_json(
+        await user_path(PLUGIN_DATA_DIR / "user_data", user_id), user_data
+    )
+
+
+# 用户背包版本号 {user_id: 版本}，每次经save_user_backpack写入时递增（用于展示缓存失效）
+_backpack_versions: Dict[str, int] = {}
+# 分片代数：其他进程接手分片后递增，使该分片所有用户的背包版本号变化
+_shard_generations: Dict[int, int] = {}
+
+
+def get_backpack_version(user_id: str) -> int:
+    """获取用户背包的当前版本号"""
+    user_id = str(user_id)
+    return _backpack_versions.get(user_id, 0) + _shard_generations.get(shard_of(user_id), 0)
+
+
+def invalidate_backpack(user_id: str) -> None:
+    """背包文件被删除等非写入变化时递增版本号"""
+    user_id = str(user_id)
+    _backpack_versions[user_id] = _backpack_versions.get(user_id, 0) + 1
+
+
+def invalidate_shard(shard: int) -> None:
+    """分片中的用户文件可能已被其他进程修改（租约接手回调）"""
+    _shard_generations[shard] = _shard_generations.get(shard, 0) + 1
+
+
+async def save_user_backpack(user_id: str, backpack: Dict[str, Any]) -> bool:
+    """写入用户背包并递增其版本号（所有背包写入都应经过此函数）"""
+    user_id = str(user_id)
+    _backpack_versions[user_id] = _backpack_versions.get(user_id, 0) + 1
+    _notify_save("user_backpack", user_id, backpack)
+    return await write_json(
+        await user_path(PLUGIN_DATA_DIR / "user_backpack", user_id), backpack
+    )
+
+
 async def get_referenced_msg_id(event: AiocqhttpMessageEvent) -> str | None:
     """获取被引用消息者的id"""
     for seg in event.get_messages():
@@ -307,11 +492,10 @@ async def get_referenced_msg_id(event: AiocqhttpMessageEvent) -> str | None:
 
 async def get_nickname(event: AiocqhttpMessageEvent, user_id) -> str:
     """获取群用户的群昵称或QQ名"""
-    client = event.bot
-    group_id = event.get_group_id()
-    all_info = await client.get_group_member_info(
-        group_id=int(group_id), user_id=int(user_id)
-    )
+    # 延迟导入，避免与api_queue的循环依赖
+    from .api_queue import api_queue
+
+    all_info = await api_queue.get_group_member_info(event, user_id)
     return all_info.get("card") or all_info.get("nickname")
 
 
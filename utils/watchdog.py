@@ -0,0 +1,177 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from pathlib import Path
+from types import FrameType
+from typing import Deque, Optional
+
+from astrbot.api import logger
+
+from .config import config_service
+from .io_executor import io_executor
+from .metrics import command_metrics
+
+# 心跳间隔（秒）
+INTERVAL = 0.5
+# 保留的心跳样本数（约最近5分钟）
+MAX_SAMPLES = 600
+# 监控线程检查心跳的间隔（秒）
+CHECK_INTERVAL = 0.1
+# 插件源码目录，用于在调用栈中定位插件自身的代码
+PLUGIN_ROOT = str(Path(__file__).resolve().parent.parent)
+
+
+class LoopWatchdog:
+    """
+    事件循环监控\n
+    - 事件循环中的心跳任务按固定间隔唤醒，记录实际唤醒时间的延迟，并采样JSON读写线程池的排队深度\n
+    - 独立的监控线程检查心跳，超过阈值未更新时说明事件循环被同步调用阻塞，
+      此时抓取事件循环线程的调用栈写入日志（每次阻塞只记录一次）\n
+    - 统计摘要附加在 /性能统计 报告末尾
+    """
+
+    def __init__(self):
+        self._lags: Deque[float] = deque(maxlen=MAX_SAMPLES)
+        self._pending: Deque[int] = deque(maxlen=MAX_SAMPLES)
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._loop_thread_id: Optional[int] = None
+        self._beat = time.monotonic()
+        # 当前阻塞是否已记录（心跳恢复后清除）
+        self._stalled = False
+        self.stalls = 0
+        self.last_stall_at = 0.0
+        self.last_stall_ms = 0.0
+        self.last_stall_where = ""
+
+    @property
+    def enabled(self) -> bool:
+        return config_service.snapshot.performance.watchdog_enabled
+
+    @staticmethod
+    def threshold() -> float:
+        """阻塞阈值（秒）"""
+        return config_service.snapshot.performance.loop_lag_threshold_ms / 1000
+
+    def start(self) -> None:
+        """启动心跳任务与监控线程（在插件initialize中调用）"""
+        self._loop_thread_id = threading.get_ident()
+        command_metrics.add_section(self.format_summary)
+        self._beat = time.monotonic()
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._monitor, name="akasha-watchdog", daemon=True
+            )
+            self._thread.start()
+
+    async def stop(self) -> None:
+        """停止心跳任务与监控线程（在插件terminate中调用）"""
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._thread is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self._thread.join)
+            self._thread = None
+
+    async def _heartbeat(self) -> None:
+        while True:
+            expected = time.monotonic() + INTERVAL
+            await asyncio.sleep(INTERVAL)
+            now = time.monotonic()
+            self._beat = now
+            if not self.enabled:
+                self._stalled = False
+                continue
+            lag = max(0.0, now - expected)
+            self._lags.append(lag)
+            self._pending.append(io_executor.pending)
+            if self._stalled:
+                # 阻塞结束，此次心跳的延迟即阻塞时长
+                self.last_stall_ms = lag * 1000
+                self._stalled = False
+
+    def _monitor(self) -> None:
+        """监控线程：心跳超时即抓取事件循环线程的调用栈"""
+        while not self._stop.wait(CHECK_INTERVAL):
+            if self._stalled or not self.enabled:
+                continue
+            blocked = time.monotonic() - self._beat - INTERVAL
+            if blocked > self.threshold():
+                self._stalled = True
+                self._report(blocked)
+
+    def _report(self, blocked: float) -> None:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return
+        self.stalls += 1
+        self.last_stall_at = time.time()
+        self.last_stall_ms = blocked * 1000
+        self.last_stall_where = self._locate(frame)
+        stack = "".join(traceback.format_stack(frame))
+        logger.warning(
+            f"事件循环已阻塞{blocked * 1000:.0f}毫秒，阻塞位置: {self.last_stall_where}\n{stack}"
+        )
+
+    @staticmethod
+    def _locate(frame: Optional[FrameType]) -> str:
+        """调用栈中最内层的插件代码位置"""
+        innermost = frame
+        while frame is not None:
+            if frame.f_code.co_filename.startswith(PLUGIN_ROOT):
+                break
+            frame = frame.f_back
+        frame = frame or innermost
+        if frame is None:
+            return "未知"
+        code = frame.f_code
+        return f"{code.co_name}（{os.path.basename(code.co_filename)}:{frame.f_lineno}）"
+
+    def format_summary(self) -> str:
+        """事件循环延迟与读写线程池排队的统计摘要"""
+        if not self.enabled:
+            return "事件循环监控: 已关闭"
+        lines = []
+        lags = sorted(self._lags)
+        if lags:
+            p50 = lags[len(lags) // 2] * 1000
+            p99 = lags[min(len(lags) - 1, int(len(lags) * 0.99))] * 1000
+            lines.append(
+                f"⏱️ 事件循环延迟 p50/p99/最大: {p50:.1f}/{p99:.1f}/{lags[-1] * 1000:.1f}毫秒"
+                f"（最近{len(lags)}次心跳）"
+            )
+        else:
+            lines.append("⏱️ 事件循环延迟: 暂无采样")
+        if self.stalls:
+            at = time.strftime("%H:%M:%S", time.localtime(self.last_stall_at))
+            lines.append(
+                f"- 阻塞超过{self.threshold() * 1000:.0f}毫秒{self.stalls}次，"
+                f"最近一次 {at} {self.last_stall_ms:.0f}毫秒，位于{self.last_stall_where}"
+            )
+        stats = io_executor.stats()
+        pending = self._pending
+        avg_pending = sum(pending) / len(pending) if pending else 0.0
+        lines.append(
+            f"📂 读写线程池: 执行中{stats['active']}/{stats['workers']}，"
+            f"排队{stats['pending']}（采样平均{avg_pending:.1f}，峰值{stats['peak_pending']}），"
+            f"已完成{stats['completed']}，排队等待 平均/最长 "
+            f"{stats['avg_wait_ms']:.2f}/{stats['max_wait_ms']:.2f}毫秒"
+        )
+        return "\n".join(lines)
+
+
+# 全局事件循环监控
+loop_watchdog = LoopWatchdog()